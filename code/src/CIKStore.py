@@ -0,0 +1,293 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+CIKStore.py: Embedded SQLite store for broker-dealer metadata, mapping
+CIK numbers to company names (with name history), the first and last
+quarter a filing was observed, when the name was last refreshed and the
+latest filing ingested (watermark) for incremental re-runs
+"""
+
+##################################
+# LIBRARY/PACKAGE IMPORTS
+##################################
+
+import os
+import json
+import time
+import sqlite3
+
+
+##################################
+# USER DEFINED CLASSES
+##################################
+
+class CIKStore:
+    """
+    Key-value store of broker-dealer information backed by a local SQLite
+    file, supporting point lookups (store[cik]) and per-entry TTL refresh.
+    The store can be shared with worker processes as it re-connects to
+    the SQLite file when un-pickled
+
+    Parameters
+    ----------
+    path : str
+        The local file path of the SQLite database e.g. CIKandDealers.db
+
+    ttl : float
+        Time-to-live of company names in seconds, names refreshed prior
+        to this period are considered stale (default 30 days)
+    """
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS dealers (
+            cik TEXT PRIMARY KEY,
+            name TEXT,
+            first_quarter TEXT,
+            last_quarter TEXT,
+            refreshed REAL
+        );
+        CREATE TABLE IF NOT EXISTS names (
+            cik TEXT,
+            name TEXT,
+            first_seen REAL,
+            PRIMARY KEY (cik, name)
+        );
+        CREATE TABLE IF NOT EXISTS coverage (
+            quarter TEXT PRIMARY KEY
+        );
+        CREATE TABLE IF NOT EXISTS watermarks (
+            cik TEXT PRIMARY KEY,
+            filing_date TEXT,
+            accession TEXT,
+            updated REAL
+        );
+    """
+
+    def __init__(self, path:str='CIKandDealers.db', ttl:float=30*86400):
+        self.path = path
+        self.ttl = ttl
+        self.connect()
+
+    def connect(self):
+        self.conn = sqlite3.connect(self.path)
+        self.conn.executescript(self.schema)
+
+    def close(self):
+        self.conn.close()
+
+    def __getstate__(self):
+        return {'path': self.path, 'ttl': self.ttl}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.connect()
+
+    # ---------------------------------------------------------------
+    # Point lookups (dictionary interface)
+    # ---------------------------------------------------------------
+
+    def __getitem__(self, cik:str) -> str:
+        row = self.conn.execute('SELECT name FROM dealers WHERE cik = ?', (str(cik),)).fetchone()
+        if row is None: raise KeyError(cik)
+        return row[0]
+
+    def __setitem__(self, cik:str, name:str):
+        self.update_name(cik, name)
+
+    def __contains__(self, cik:str) -> bool:
+        return self.conn.execute('SELECT 1 FROM dealers WHERE cik = ?', (str(cik),)).fetchone() is not None
+
+    def __len__(self) -> int:
+        return self.conn.execute('SELECT COUNT(*) FROM dealers').fetchone()[0]
+
+    def keys(self) -> list:
+        return [row[0] for row in self.conn.execute('SELECT cik FROM dealers ORDER BY cik')]
+
+    def get(self, cik:str) -> dict:
+        """
+        Returns all information stored for a CIK, None if not present
+        """
+        row = self.conn.execute('SELECT cik, name, first_quarter, last_quarter, refreshed '
+                                'FROM dealers WHERE cik = ?', (str(cik),)).fetchone()
+        if row is None: return None
+        return dict(zip(['cik', 'name', 'first-quarter', 'last-quarter', 'refreshed'], row))
+
+    def name_history(self, cik:str) -> list:
+        """
+        Returns all names reported by a CIK ordered by when they were first seen
+        """
+        return [row[0] for row in self.conn.execute(
+            'SELECT name FROM names WHERE cik = ? ORDER BY first_seen', (str(cik),))]
+
+    # ---------------------------------------------------------------
+    # Updates
+    # ---------------------------------------------------------------
+
+    def update_name(self, cik:str, name:str):
+        """
+        Stores the current company name for a CIK, marking it as refreshed.
+        A name of None (failed lookup e.g. 429 or timeout) keeps the CIK stale,
+        such that the lookup is retried on the next run
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.execute('INSERT OR IGNORE INTO dealers (cik) VALUES (?)', (str(cik),))
+            if name is None: return
+
+            self.conn.execute('UPDATE dealers SET name = ?, refreshed = ? WHERE cik = ?', (name, now, str(cik)))
+
+            # we keep track of all names reported historically by the broker-dealer
+            self.conn.execute('INSERT OR IGNORE INTO names VALUES (?, ?, ?)', (str(cik), name, now))
+
+    def observe(self, ciks:list, quarter:str):
+        """
+        Records the quarter (e.g. 2020/QTR1) in which a list of CIKs filed
+        an X-17A-5, updating the first and last quarter observed per CIK
+        """
+        rows = [(str(cik),) for cik in set(ciks)]
+        with self.conn:
+            self.conn.executemany('INSERT OR IGNORE INTO dealers (cik) VALUES (?)', rows)
+            self.conn.executemany(
+                """UPDATE dealers SET
+                       first_quarter = CASE WHEN first_quarter IS NULL OR first_quarter > ?1 THEN ?1 ELSE first_quarter END,
+                       last_quarter = CASE WHEN last_quarter IS NULL OR last_quarter < ?1 THEN ?1 ELSE last_quarter END
+                   WHERE cik = ?2""", [(quarter, cik) for (cik,) in rows])
+
+    def stale(self, ciks:list=None) -> list:
+        """
+        Returns the CIKs whose names were never resolved or were refreshed
+        prior to the time-to-live, for all CIKs if none are provided
+        """
+        cutoff = time.time() - self.ttl
+        rows = self.conn.execute('SELECT cik FROM dealers WHERE refreshed IS NULL OR refreshed < ?', (cutoff,))
+        stale_ciks = [row[0] for row in rows]
+
+        if ciks is None: return stale_ciks
+
+        selected = set(str(cik) for cik in ciks)
+        return [cik for cik in stale_ciks if cik in selected]
+
+    def years_covered(self) -> list:
+        return [row[0] for row in self.conn.execute('SELECT quarter FROM coverage ORDER BY quarter')]
+
+    def add_coverage(self, quarter:str):
+        with self.conn:
+            self.conn.execute('INSERT OR IGNORE INTO coverage VALUES (?)', (quarter,))
+
+    # ---------------------------------------------------------------
+    # Per-CIK watermarks (latest filing ingested)
+    # ---------------------------------------------------------------
+
+    def watermarks(self) -> dict:
+        """
+        Returns the latest filing ingested per CIK as (filing date, accession)
+        e.g. {'1904': ('2020-02-26', '0000001904-20-000001')}
+        """
+        rows = self.conn.execute('SELECT cik, filing_date, accession FROM watermarks')
+        return {cik: (date, accession) for cik, date, accession in rows}
+
+    def set_watermark(self, cik:str, filing_date:str, accession:str=None):
+        """
+        Advances the watermark of a CIK, older filings never move the watermark back
+        """
+        current = self.conn.execute('SELECT filing_date, accession FROM watermarks WHERE cik = ?',
+                                    (str(cik),)).fetchone()
+        if current is not None and (filing_date, accession or '') <= (current[0], current[1] or ''):
+            return
+
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?, ?)',
+                              (str(cik), filing_date, accession, time.time()))
+
+    def seed_watermarks(self, paths:list):
+        """
+        Seeds watermarks from the names of previously downloaded filings
+        e.g. input/X-17A-5/1904-2020-02-26.pdf -> ('1904', '2020-02-26')
+        """
+        latest = {}
+        for path in paths:
+            base_file = path.split('/')[-1].split('.')[0]
+            if base_file.count('-') != 3: continue
+
+            cik, date = base_file.split('-', 1)
+            latest[cik] = max(latest.get(cik, date), date)
+
+        for cik, date in latest.items():
+            self.set_watermark(cik, date)
+
+    # ---------------------------------------------------------------
+    # Conversion from (and to) the former CIKandDealers.json format
+    # ---------------------------------------------------------------
+
+    def load_dict(self, cik2brokers:dict):
+        """
+        Migrates a dictionary of the CIKandDealers.json format into the store
+        e.g. {'years-covered':['2020/QTR1'], 'broker-dealers':{'1904': 'ABRAHAM SECURITIES CORPORATION'}}
+        """
+        for quarter in cik2brokers.get('years-covered', []):
+            self.add_coverage(quarter)
+
+        with self.conn:
+            for cik, name in cik2brokers.get('broker-dealers', {}).items():
+                self.conn.execute('INSERT OR IGNORE INTO dealers (cik, name) VALUES (?, ?)', (str(cik), name))
+                if name is not None:
+                    self.conn.execute('INSERT OR IGNORE INTO names VALUES (?, ?, ?)', (str(cik), name, 0))
+
+    def to_dict(self) -> dict:
+        return {'years-covered': self.years_covered(),
+                'broker-dealers': dict(self.conn.execute('SELECT cik, name FROM dealers ORDER BY cik'))}
+
+
+##################################
+# USER DEFINED FUNCTIONS
+##################################
+
+def openStore(s3_bucket:str, s3_pointer, temp_folder:str, path:str='CIKandDealers.db',
+              fresh:bool=False) -> CIKStore:
+    """
+    Opens the CIK store, downloading the SQLite file from the s3 bucket if
+    no local copy exists. If neither exist, but a CIKandDealers.json file is
+    present on the s3 bucket, the JSON contents are migrated to the store
+
+    Parameters
+    ----------
+    s3_bucket : str
+        The s3 bucket where all data is stored
+    s3_pointer : boto3.client
+        The s3 client used to download files from the bucket
+    temp_folder : str
+        The s3 folder where the CIK store (and legacy JSON file) is kept
+    path : str
+        The local file path of the SQLite database
+    fresh : bool
+        If True we start from an empty store, ignoring existing copies
+    """
+
+    if fresh and os.path.isfile(path):
+        os.remove(path)
+
+    if not (fresh or os.path.isfile(path)):
+        try:
+            s3_pointer.download_file(s3_bucket, temp_folder + os.path.basename(path), path)
+        except Exception:
+            store = CIKStore(path)
+
+            # migrate broker-dealer information from the legacy JSON file (if present)
+            try:
+                s3_pointer.download_file(s3_bucket, temp_folder + 'CIKandDealers.json', 'temp.json')
+                with open('temp.json', 'r') as f: store.load_dict(json.loads(f.read()))
+                os.remove('temp.json')
+            except Exception:
+                pass
+
+            return store
+
+    return CIKStore(path)
+
+def saveStore(store:CIKStore, s3_bucket:str, s3_pointer, temp_folder:str):
+    """
+    Uploads the local SQLite file of the CIK store to the s3 bucket
+    """
+    store.conn.commit()
+    s3_pointer.upload_file(store.path, s3_bucket, temp_folder + os.path.basename(store.path))
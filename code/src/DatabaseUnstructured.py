@@ -277,7 +277,7 @@ def unstructured_data(df:pd.DataFrame, filing_d:str, fiscal_y:str, cik:str, cik2
         The CIK number for a broker dealer e.g. 887767
         
     cik2name : dict
-        A dictionary that maps CIK to broker dealer names 
+        A dictionary (or CIKStore) that maps CIK to broker dealer names 
     """
     
     # intialize the first column (line items)
@@ -294,7 +294,7 @@ def unstructured_data(df:pd.DataFrame, filing_d:str, fiscal_y:str, cik:str, cik2
         row['CIK'] = cik                                  # CIK number for firm 
         row['Filing Date'] = filing_d                     # Filing Date for firm filing
         row['Filing Year'] = fiscal_y                     # Year for balance sheet filing
-        row['Name'] = cik2name['broker-dealers'][cik]     # returns the name of associated with the CIK
+        row['Name'] = cik2name[cik]                       # returns the name of associated with the CIK
         
         return row
     
@@ -13,16 +13,25 @@ accompaning CIK code from archived dealer data dating back to 1993 in the SEC
 # console and directory access
 import os
 import re
-import time
+import json
+import asyncio
 import datetime
 
+from concurrent.futures import ThreadPoolExecutor
+
 # structured data reading
 import pandas as pd
 
 # parsing SEC website for data  
-import requests 
+import aiohttp
 from bs4 import BeautifulSoup
 
+# shared client for SEC requests (rate limit, backoff and request counters)
+from SECRequests import SECClient, sec_client, secGet
+
+# store for CIK to company name information
+from CIKStore import CIKStore
+
 
 ##################################
 # USER DEFINED FUNCTIONS
@@ -46,21 +55,30 @@ def companyName(cik:str, company_email:str) -> str:
     current_year = datetime.datetime.today().year
     url = baseURL+'CIK={}&type=X-17A-5&dateb={}1231'.format(cik, current_year)
     
-    # we try requesting the URL and break only if response object returns status of 200 (i.e. success)
-    for _ in range(20):
-        res = requests.get(url, headers={'User-Agent': 'Company Name ' + company_email},
-                           stream=True, allow_redirects=True)
-        time.sleep(1)
-        if res.status_code == 200: 
-            break
-    
-    # last check to see if response object is "problematic" e.g. 403 after 10 tries
-    if res.status_code != 200:
-        print('\t\tERROR: Unable to retrieve response from %s, response object %d' % (cik, res.status_code))
+    # request the URL through the shared SEC client (retries on throttling and server errors)
+    res = secGet(url, company_email)
+    
+    # last check to see if response object is "problematic" e.g. 403
+    if res is None or res.status_code != 200:
+        print('\t\tERROR: Unable to retrieve response from %s, response object %s' % (cik, getattr(res, 'status_code', None)))
         return None
     
+    return parseCompanyName(res.text, cik)
+
+def parseCompanyName(html:str, cik:str) -> str:
+    """
+    Parses the company name from the EDGAR search page of a given CIK
+    
+    Parameters
+    ----------
+    html : str
+        The HTML body of the EDGAR search page for a broker dealer
+    cik : str
+        The CIK number for a broker dealer e.g. 887767
+    """
+    
     # parse HTML through BeautifulSoup object
-    s1 = BeautifulSoup(res.text, 'html.parser')
+    s1 = BeautifulSoup(html, 'html.parser')
     
     # select the company information from the SEC website for a particular CIK
     for val in s1.find_all('span', attrs={"class":"companyName"}):
@@ -71,13 +89,339 @@ def companyName(cik:str, company_email:str) -> str:
         
         return comp_name
 
-def dealerData(years:list, company_email:str,
-               quarters:list=['QTR1', 'QTR2', 'QTR3', 'QTR4'], 
-               cik2brokers:dict={'years-covered':[], 'broker-dealers':{}}
-               ) -> dict:
+async def companyNameAsync(session:aiohttp.ClientSession, cik:str, company_email:str, 
+                           client:SECClient=sec_client) -> tuple:
+    """
+    Asynchronous counterpart to companyName(), every request is made 
+    through the shared SEC client (rate limit, backoff and request 
+    counters, see SECClient.get_async), returns a (CIK, name) tuple
+    
+    Parameters
+    ----------
+    session : aiohttp.ClientSession
+        The client session shared across all concurrent requests
+    cik : str
+        The CIK number for a broker dealer e.g. 887767
+    company_email : str
+        The company email belonging to the user e.g. mathias.andler@ny.frb.org
+    client : SECClient
+        The client shared across requests made to the SEC
+    """
+    
+    # establishing base-url for company name search
+    baseURL = 'https://www.sec.gov/cgi-bin/browse-edgar?action=getcompany&'
+    current_year = datetime.datetime.today().year
+    url = baseURL+'CIK={}&type=X-17A-5&dateb={}1231'.format(cik, current_year)
+    
+    status, text = await client.get_async(session, url, company_email)
+    if status == 200:
+        return cik, parseCompanyName(text, cik)
+    
+    print('\t\tERROR: Unable to retrieve response from %s, response object %s' % (cik, status))
+    return cik, None
+
+async def companyNamesAsync(ciks:list, company_email:str, cik2name:dict=None, 
+                            client:SECClient=sec_client, max_concurrency:int=20) -> dict:
+    """
+    Asynchronous counterpart to companyNames(), to be awaited from code already 
+    running inside an event loop (e.g. a Jupyter notebook), returns the 
+    updated dictionary
+    
+    Parameters
+    ----------
+    ciks : list
+        A list of CIK numbers for broker dealers e.g. ['887767', '1904']
+    company_email : str
+        The company email belonging to the user e.g. mathias.andler@ny.frb.org
+    cik2name : dict
+        A dictionary (or CIKStore) mapping CIK to company names, to be 
+        updated in place
+    client : SECClient
+        The client shared across requests made to the SEC (rate limit and counters)
+    max_concurrency : int
+        The maximum number of requests open at any given time
+    """
+    
+    if cik2name is None: cik2name = {}
+    unique_ciks = list(dict.fromkeys(ciks))
+    semaphore = asyncio.Semaphore(max_concurrency)
+    
+    async def bounded(session, cik):
+        async with semaphore:
+            return await companyNameAsync(session, cik, company_email, client)
+    
+    print('\tResolving company names for %d CIKs' % len(unique_ciks))
+    
+    timeout = aiohttp.ClientTimeout(total=client.timeout)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        tasks = [bounded(session, cik) for cik in unique_ciks]
+        
+        # stream results into the dictionary in order of completion
+        for task in asyncio.as_completed(tasks):
+            cik, name = await task
+            cik2name[cik] = name
+    
+    return cik2name
+
+def companyNames(ciks:list, company_email:str, cik2name:dict=None, 
+                 client:SECClient=sec_client, max_concurrency:int=20) -> dict:
+    """
+    Resolves company names for a list of CIKs concurrently, de-duplicating
+    the CIKs and streaming each result into the provided dictionary as 
+    soon as it is retrieved, returns the updated dictionary. If called from 
+    a running event loop (e.g. a Jupyter notebook) the requests are made 
+    from a worker thread with its own loop (see companyNamesAsync), and
+    the names are written into the dictionary once all are resolved
+    
+    Parameters
+    ----------
+    ciks : list
+        A list of CIK numbers for broker dealers e.g. ['887767', '1904']
+    company_email : str
+        The company email belonging to the user e.g. mathias.andler@ny.frb.org
+    cik2name : dict
+        A dictionary (or CIKStore) mapping CIK to company names, to be 
+        updated in place
+    client : SECClient
+        The client shared across requests made to the SEC (rate limit and counters)
+    max_concurrency : int
+        The maximum number of requests open at any given time
+    """
+    
+    if cik2name is None: cik2name = {}
+    
+    def resolve(names):
+        return asyncio.run(companyNamesAsync(ciks, company_email, names, client, max_concurrency))
+    
+    # asyncio.run cannot be called while an event loop is running in this thread
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return resolve(cik2name)
+    
+    # names are resolved into a plain dictionary by the worker thread, as a CIKStore 
+    # (SQLite connection) can only be written from the thread that opened it
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        names = executor.submit(resolve, {}).result()
+    
+    for cik, name in names.items():
+        cik2name[cik] = name
+    
+    return cik2name
+
+def quarterClosed(coverage:str) -> bool:
     """
-    Retrieve dealer data from archived SEC directory, returns 
-    a dictionary of CIK to Company Name mappings
+    Determines whether an archived quarter has ended before the current
+    quarter, in which case its EDGAR form index no longer changes
+    
+    Parameters
+    ----------
+    coverage : str
+        The year and quarter of the archived index e.g. 2020/QTR1
+    """
+    
+    year, quarter = coverage.split('/')
+    today = datetime.datetime.today()
+    
+    # compare (year, quarter) pairs against the current calendar quarter
+    current = (today.year, (today.month - 1) // 3 + 1)
+    return (int(year), int(quarter[-1])) < current
+
+def parseFormIndex(lines, form_regex:str='^x-17a'):
+    """
+    Streams through the lines of a quarterly EDGAR form index, yielding 
+    the fixed-width fields (form type, company name, CIK, filing date, 
+    file name) for rows whose form type matches the provided regex
+    
+    Parameters
+    ----------
+    lines : iterable
+        An iterable of decoded lines from a form.idx file, e.g. the 
+        return of requests.Response.iter_lines(decode_unicode=True)
+        
+    form_regex : str
+        The regular expression to match form types against, ignoring
+        case sensitivity (default X-17A-5 filings)
+    """
+    
+    form_check = re.compile(form_regex, flags=re.IGNORECASE)
+    
+    for line in lines:
+        
+        # select only matching rows, the header and dashes ('---') never match the form regex
+        if not line or not form_check.match(line): continue
+        
+        # form type is the leading token, the CIK, date and file name are the trailing tokens
+        # e.g. X-17A-5   ABRAHAM SECURITIES CORP   1904   2020-02-26   edgar/data/1904/0000001904-20-000001.txt
+        form_type, rest = line.split(None, 1)
+        company, cik, date, file_name = rest.rsplit(None, 3)
+        
+        # older indexes report filing dates as yyyyMMdd, we normalize to yyyy-MM-dd
+        if len(date) == 8: date = '%s-%s-%s' % (date[:4], date[4:6], date[6:])
+        
+        yield (form_type, company.strip(), cik, date, file_name)
+
+def formIndex(coverage:str, company_email:str, cache_folder:str='form_idx_cache/') -> pd.DataFrame:
+    """
+    Retrieves the quarterly EDGAR form index for a given coverage period
+    and returns all X-17A-5 filings listed within it, returns None if the
+    index could not be retrieved. Parsed indexes are cached on disk with
+    the Last-Modified/ETag headers of the response, closed quarters are 
+    read from the cache while open quarters are refreshed conditionally
+
+    Parameters
+    ----------
+    coverage : str
+        The year and quarter of the archived index e.g. 2020/QTR1
+
+    company_email : str
+        The company email belonging to the user e.g. mathias.andler@ny.frb.org
+        
+    cache_folder : str
+        The local folder where parsed quarterly indexes are stored, 
+        e.g. form_idx_cache/2020-QTR1.csv.gz with meta information 
+        in form_idx_cache/2020-QTR1.json
+    """
+
+    # archived data website for broker dealer data
+    baseURL = 'https://www.sec.gov/Archives/edgar/full-index'
+    searchURL = '%s/%s/form.idx' % (baseURL, coverage)
+    
+    # cached index and response headers for the given quarter (e.g. 2020-QTR1)
+    os.makedirs(cache_folder, exist_ok=True)
+    cache_file = cache_folder + coverage.replace('/', '-') + '.csv.gz'
+    meta_file = cache_folder + coverage.replace('/', '-') + '.json'
+    
+    headers = {}
+    
+    if os.path.isfile(cache_file) and os.path.isfile(meta_file):
+        with open(meta_file, 'r') as f: meta = json.loads(f.read())
+        
+        # quarters that were closed when cached never change, we read these directly from the cache
+        if meta.get('Closed'):
+            return pd.read_csv(cache_file, dtype=str)
+        
+        # open quarters are only downloaded again if the index has changed
+        if meta.get('ETag'): headers['If-None-Match'] = meta['ETag']
+        if meta.get('Last-Modified'): headers['If-Modified-Since'] = meta['Last-Modified']
+
+    # request the URL through the shared SEC client, a 304 response indicates the index is not modified
+    response = secGet(searchURL, company_email, headers=headers, stream=True)
+    
+    if response is not None and response.status_code == 304:
+        print('\nNo changes to %s, reading from cache' % searchURL)
+        
+        # a quarter cached while open is flagged once it has closed, such that it is no longer requested
+        if quarterClosed(coverage):
+            meta['Closed'] = True
+            with open(meta_file, 'w') as file: json.dump(meta, file)
+        
+        return pd.read_csv(cache_file, dtype=str)
+
+    # if reponse type is not active we flag the error (status code other than 200)
+    if response is None or response.status_code != 200:
+        print('\t\tERROR: Unable to retrieve %s, response object %s' % (searchURL, getattr(response, 'status_code', None)))
+        return None
+
+    print('\nSearching for broker dealers at %s' % searchURL)
+    
+    # stream the index body line by line, keeping only X-17A-5 rows (less than 1% of the index)
+    if response.encoding is None: response.encoding = 'latin-1'
+    records = list(parseFormIndex(response.iter_lines(decode_unicode=True)))
+    
+    x17Index = pd.DataFrame.from_records(records, columns=['Form Type', 'Company Name', 'CIK', 
+                                                           'Filing Date', 'File Name'])
+    
+    # store the parsed index with the response headers used for conditional refreshes
+    x17Index.to_csv(cache_file, index=False, compression='gzip')
+    with open(meta_file, 'w') as file:
+        json.dump({'ETag': response.headers.get('ETag'), 
+                   'Last-Modified': response.headers.get('Last-Modified'),
+                   'Closed': quarterClosed(coverage)}, file)
+    
+    return x17Index
+
+def filingManifest(years:list, company_email:str,
+                   quarters:list=['QTR1', 'QTR2', 'QTR3', 'QTR4']) -> pd.DataFrame:
+    """
+    Builds the full manifest of X-17A-5 filings (CIK, filing date, accession)
+    directly from the quarterly EDGAR form indexes, returning for each filing
+    the filing-detail URL that is expected by fileExtract()
+
+    Parameters
+    ----------
+    years : list
+        A list of years to check for X-17A-5 filings e.g. [1993, 1994, 2000]
+
+    company_email : str
+        The company email belonging to the user e.g. mathias.andler@ny.frb.org
+
+    quarters : list
+        A list of quarters to check for X-17A-5 filings, string must be
+        of the form "QTRX", where X is an integer from 1-4 inclusive
+    """
+
+    archiveDates = ['{}/{}'.format(yt, qt) for yt in years for qt in quarters]
+
+    print('BUILDING X-17A-5 FILING MANIFEST')
+    indexes = [formIndex(coverage, company_email) for coverage in archiveDates]
+    indexes = [idx for idx in indexes if idx is not None]
+
+    if len(indexes) == 0:
+        return pd.DataFrame(columns=['CIK', 'Filing Date', 'Accession', 'Archive URL'])
+
+    manifest = pd.concat(indexes, ignore_index=True)
+
+    # the accession number is the base name of the file listed in the index
+    # e.g. edgar/data/886475/0001019056-10-000046.txt -> 0001019056-10-000046
+    manifest['Accession'] = manifest['File Name'].apply(lambda x: x.split('/')[-1].split('.')[0])
+
+    # filing detail page for the accession, this is the same page linked from the EDGAR search
+    # e.g. https://www.sec.gov/Archives/edgar/data/886475/000101905610000046/0001019056-10-000046-index.htm
+    manifest['Archive URL'] = manifest.apply(
+        lambda x: 'https://www.sec.gov/Archives/edgar/data/{}/{}/{}-index.htm'.format(
+            x['CIK'], x['Accession'].replace('-', ''), x['Accession']), axis=1)
+
+    # order filings from most recent to oldest (matching the EDGAR search ordering)
+    manifest = manifest.drop_duplicates(subset=['Accession'])
+    manifest = manifest.sort_values(['CIK', 'Filing Date'], ascending=[True, False])
+
+    print('\tFound %d X-17A-5 filings for %d broker-dealers' % (manifest.shape[0], manifest['CIK'].nunique()))
+
+    return manifest[['CIK', 'Filing Date', 'Accession', 'Archive URL']].reset_index(drop=True)
+
+def newFilings(manifest:pd.DataFrame, watermarks:dict) -> pd.DataFrame:
+    """
+    Selects the filings from a manifest that are more recent than the 
+    watermark (latest filing ingested) of their CIK
+    
+    Parameters
+    ----------
+    manifest : pandas.DataFrame
+        The manifest of X-17A-5 filings as returned by filingManifest()
+        
+    watermarks : dict
+        The latest filing ingested per CIK as (filing date, accession)
+        e.g. {'1904': ('2020-02-26', '0000001904-20-000001')}
+    """
+    
+    wm_date = manifest['CIK'].map(lambda x: watermarks.get(x, (None, None))[0])
+    wm_accession = manifest['CIK'].map(lambda x: watermarks.get(x, (None, None))[1])
+    
+    # filings are new if no watermark exists, or if they were filed after the watermark
+    # (for filings on the watermark date we compare accession numbers, when known)
+    new_check = (wm_date.isnull() | (manifest['Filing Date'] > wm_date) | 
+                 ((manifest['Filing Date'] == wm_date) & wm_accession.notnull() & 
+                  (manifest['Accession'] > wm_accession)))
+    
+    return manifest[new_check.values]
+
+def dealerData(years:list, company_email:str, cik_store:CIKStore,
+               quarters:list=['QTR1', 'QTR2', 'QTR3', 'QTR4']
+               ) -> CIKStore:
+    """
+    Retrieve dealer data from archived SEC directory, updating and 
+    returning the store of CIK to Company Name mappings
     
     Parameters
     ----------
@@ -89,27 +433,23 @@ def dealerData(years:list, company_email:str,
     company_email : str
         The company email belonging to the user e.g. mathias.andler@ny.frb.org
         
+    cik_store : CIKStore
+        The store of broker-dealer data as well as the years covered 
+        from the archive e.g. years_covered() -> ['2020/QTR1', '2020/QTR2'], 
+        cik_store['782124'] -> 'J.P. MORGAN SECURITIES LLC'. 
+        
     quarters : list
         A list of quarters to check for additional dealer data, 
         string must be of the form "QTRX", where X is an integer
         from 1-4 inclusive default = [QTR1, QTR2, QTR3, QTR4]. 
-        
-    cik2brokers : dict
-        A nested dictionary for storing the broker-dealer data as 
-        well as the years covered from the archive, we provide default
-        template in the event no  
-        e.g. {'years-reported':['2020/QTR1', '2020/QTR2'], 
-        'broker-dealers':{782124: 'J.P. MORGAN SECURITIES LLC'}}. 
-        
-   
     """
     
-    # archived data website for broker dealer data
-    baseURL = 'https://www.sec.gov/Archives/edgar/full-index'
-    
-    # extract all the years covered from json form (we want to avoid uneccesary re-runs) 
+    # extract all the years covered from the store (we want to avoid uneccesary re-runs) 
     archiveDates = ['{}/{}'.format(yt, qt) for yt in years for qt in quarters]
-    years_covered = cik2brokers['years-covered']
+    years_covered = cik_store.years_covered()
+    
+    # CIKs are collected across all quarters, such that each CIK is resolved only once
+    new_ciks = []
     
     print('EXTRACTING BROKER-DEALER INFORMATION')
     # iterate through years and quarters for archival search
@@ -120,87 +460,47 @@ def dealerData(years:list, company_email:str,
             pass
 
         else:
-            searchURL = '%s/%s/form.idx' % (baseURL, coverage)
-             
-            # we try requesting the URL and break only if response object returns status of 200
-            for _ in range(20):
-                response = requests.get(searchURL, headers={'User-Agent': 'Company Name ' + company_email},
-                       stream=True, allow_redirects=True)
-                 
-                time.sleep(1)
-                if response.status_code == 200: break
+            x17File = formIndex(coverage, company_email)
             
-            # if reponse type is active we return object with status code 200 (else error)
-            if response.status_code == 200:
-                print('\nSearching for broker dealers at %s' % searchURL)
+            # if reponse type is active we return object with filings (else error)
+            if x17File is not None:
                 
                 # append the coverage year for the cik in question
-                cik2brokers['years-covered'].append(coverage)
+                cik_store.add_coverage(coverage)
                 print('  Adding coverage for %s' % coverage)
 
-                # extract only main text from body, selecting terms below dashes '---' 
-                # we use triple dashes to avoid improper splits that exist locally with company names
-                data = response.text.split('---')[-1]   
-
-                # write contents to a temporary file to read information
-                with open('main.txt', 'w') as file: file.write(data)
-                
-                # convert text data to dataframe object using a fixed-width-file convention
-                df = pd.read_fwf('main.txt', header=None)
-                cleanDf = df[~pd.isnull(df[0])]            # strip away rows with NaN from the Form Type column   
-
-                # check to see if first column contains information on X-17A-5 filings (use regex for x-17a flag)
-                x17_check = cleanDf[0].str.contains('^x-17a', 
-                                                    regex=True, 
-                                                    flags=re.IGNORECASE)
-                x17File = cleanDf[x17_check]
-
                 print('\tFound %d X-17A-5 filings in %s' % (x17File.shape[0], coverage))
 
-                if not x17File.empty:
-
-                    # CIK number is taken from the last column of the rows splitting url string by row 
-                    # e.g. edgar/data/886475/0001019056-10-000046.txt -> 886475
-                    last_column = x17File.columns[-1]
-                    cikNumbers = x17File[last_column].apply(lambda x: x.split('/')[2]).values
-                    
-                    # compute dictionary mapping for the CIK and company name for each broker-dealer
-                    try:
-                        dictionary_update = dict(map(lambda x: (x, companyName(x,company_email)), 
-                                                     cikNumbers))
-                        cik2brokers['broker-dealers'].update(dictionary_update)
-                        
-                    except Exception as e:
-                        print(e)
-                        time.sleep(600)
-                        dictionary_update = dict(map(lambda x: (x, companyName(x,company_email)), 
-                                                     cikNumbers))
-                        
-                        cik2brokers['broker-dealers'].update(dictionary_update)
-                
-                os.remove('main.txt')
+                # CIK numbers are parsed from the file name column of the index
+                cik_store.observe(x17File['CIK'].values, coverage)
+                new_ciks.extend(x17File['CIK'].values)
+    
+    # compute mapping for the CIK and company name, only re-querying names that are stale
+    companyNames(cik_store.stale(new_ciks), company_email, cik2name=cik_store)
                 
-    return cik2brokers
+    return cik_store
 
-def update_dealer_names(cik2broker:dict) -> dict:
+def update_dealer_names(cik_store:CIKStore, company_email:str, 
+                        stale_only:bool=False) -> CIKStore:
     """
     Updates all the company names present within the 
-    broker-dealer dictionary of CIK : Company Names
+    broker-dealer store of CIK : Company Names
     
     Parameters
     ----------
-    cik2brokers : dict
-        A nested dictionary for storing the broker-dealer 
-        data as well as the years covered from the archive 
-        e.g. {'years-reported':['2020/QTR1', '2020/QTR2'],
-        'broker-dealers':{1904: 'ABRAHAM SECURITIES CORPORATION'}}.
+    cik_store : CIKStore
+        The store of broker-dealer data as well as the years covered 
+        from the archive e.g. cik_store['1904'] -> 'ABRAHAM SECURITIES CORPORATION'
+    company_email : str
+        The company email belonging to the user e.g. mathias.andler@ny.frb.org
+    stale_only : bool
+        If True we only update names older than the store time-to-live
     """
     
-    cik = cik2broker['broker-dealers']
+    cik = cik_store.stale() if stale_only else cik_store.keys()
     print('\nUpdating all company names for %.d CIKs' % len(cik))
     
-    # update the company names for existing CIKs from the broker dealer dictionary
-    updated_names = dict(map(lambda x: (x, companyName(x)), cik))
-    cik2broker['broker-dealers'] = updated_names
+    # update the company names for existing CIKs from the broker dealer store
+    companyNames(cik, company_email, cik2name=cik_store)
 
-    return cik2broker
+    return cik_store
@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+FilingPipeline.py: Staged download pipeline for X-17A-5 filings, running
+attachment fetch, pdf merge (CPU) and upload (storage sink) in separate worker pools
+connected by bounded queues. Queue bounds provide backpressure, such that
+only a limited number of filings are held in memory at any given time,
+while every SEC request goes through the shared rate limiter
+"""
+
+##################################
+# LIBRARY/PACKAGE IMPORTS
+##################################
+
+import os
+import queue
+import threading
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from FocusReportExtract import fileExtract, fetchPdfs, mergeBuffers
+from FocusReportSlicing import sliceBuffer, subsetKey, subsetMetadata
+
+
+##################################
+# USER DEFINED FUNCTIONS
+##################################
+
+def runStage(worker, n_workers:int, inbox:queue.Queue, outbox:queue.Queue=None) -> list:
+    """
+    Starts a pool of threads that apply a worker function to every item
+    of the inbox queue, forwarding the (non-None) returns to the outbox
+
+    Parameters
+    ----------
+    worker : function
+        Function applied to each item, returning the item for the next
+        stage or None if the item does not continue down the pipeline
+    n_workers : int
+        The number of threads running the worker function
+    inbox : queue.Queue
+        The queue from which items are read, a None item stops a thread
+    outbox : queue.Queue
+        The (bounded) queue to which results are written
+    """
+
+    def loop():
+        while True:
+            item = inbox.get()
+            if item is None: break
+
+            result = worker(item)
+            if result is not None and outbox is not None:
+                outbox.put(result)
+
+    threads = [threading.Thread(target=loop, daemon=True) for _ in range(n_workers)]
+    for thread in threads: thread.start()
+
+    return threads
+
+def downloadFilings(filings:list, company_email:str, sink, on_merged:list=[],
+                    fetch_workers:int=4, merge_workers:int=None, upload_workers:int=4,
+                    queue_size:int=16) -> list:
+    """
+    Downloads, merges and uploads X-17A-5 filings to a storage sink through
+    a staged pipeline, returns the list of filings with their status
+    (i.e. 'uploaded', 'no-files' or 'error: ...') recorded under 'status'.
+    Merged pdfs are never written to the local disk, the in-memory contents
+    are streamed to the sink and handed to each of the on_merged functions
+
+    Parameters
+    ----------
+    filings : list
+        A list of dictionaries describing each filing, with the filing
+        detail URL under 'url' and the s3 key to be written under 'key'
+        e.g. {'cik': '1904', 'date': '2020-02-26', 'url': 'https://...-index.htm',
+              'key': 'input/X-17A-5/1904-2020-02-26.pdf'}
+    company_email : str
+        The company email belonging to the user e.g. mathias.andler@ny.frb.org
+    sink : StorageSink.S3Sink
+        The storage sink to which merged pdfs are written (e.g. S3Sink, LocalSink)
+    on_merged : list
+        Functions called with (filing, content) once the merged pdf has been
+        written, used to process the same in-memory contents in a single pass
+    fetch_workers : int
+        The number of threads downloading attachments from the SEC
+    merge_workers : int
+        The number of processes merging pdfs (default number of cores)
+    upload_workers : int
+        The number of threads writing merged pdfs to the sink
+    queue_size : int
+        The maximum number of filings waiting between two stages
+    """
+
+    merge_workers = merge_workers or os.cpu_count()
+
+    fetch_queue = queue.Queue()
+    merge_queue = queue.Queue(maxsize=queue_size)
+    upload_queue = queue.Queue(maxsize=queue_size)
+
+    lock = threading.Lock()
+    completed = []
+
+    def finish(filing, status):
+        filing['status'] = status
+        with lock:
+            completed.append(filing)
+            print('\t(%d out of %d) %s - %s' % (len(completed), len(filings), filing['key'], status))
+
+    # ---------------------------------------------------------------
+    # Stage 1: retrieve attachments from the filing detail page
+    # ---------------------------------------------------------------
+
+    def fetch(filing):
+        try:
+            pdf_files = fileExtract(filing['url'], company_email)
+            buffers = fetchPdfs(pdf_files, company_email) if len(pdf_files) > 0 else []
+        except Exception as e:
+            return finish(filing, 'error: %s' % e)
+
+        if len(buffers) == 0:
+            return finish(filing, 'no-files')
+
+        return filing, buffers
+
+    # ---------------------------------------------------------------
+    # Stage 2: merge attachments into one pdf (CPU, process pool)
+    # ---------------------------------------------------------------
+
+    pool = ProcessPoolExecutor(max_workers=merge_workers)
+
+    def merge(item):
+        filing, buffers = item
+        try:
+            return filing, pool.submit(mergeBuffers, buffers).result()
+        except Exception as e:
+            return finish(filing, 'error: %s' % e)
+
+    # ---------------------------------------------------------------
+    # Stage 3: write merged pdfs to the sink (and downstream consumers)
+    # ---------------------------------------------------------------
+
+    def upload(item):
+        filing, content = item
+        try:
+            sink.put(filing['key'], content)
+            for consumer in on_merged: consumer(filing, content)
+        except Exception as e:
+            return finish(filing, 'error: %s' % e)
+
+        return finish(filing, 'uploaded')
+
+    fetch_threads = runStage(fetch, fetch_workers, fetch_queue, merge_queue)
+    merge_threads = runStage(merge, merge_workers, merge_queue, upload_queue)
+    upload_threads = runStage(upload, upload_workers, upload_queue)
+
+    for filing in filings: fetch_queue.put(filing)
+
+    # stop each stage once the previous stage has drained
+    for threads, inbox in [(fetch_threads, fetch_queue), (merge_threads, merge_queue),
+                           (upload_threads, upload_queue)]:
+        for _ in threads: inbox.put(None)
+        for thread in threads: thread.join()
+
+    pool.shutdown()
+
+    return completed
+
+def backfillSubsets(paths:list, sink, export_folder:str, pages:list=range(20), top_k:int=None,
+                    io_workers:int=8, slice_workers:int=None) -> list:
+    """
+    Slices filings already stored in the sink (e.g. legacy filings ingested
+    before subsets were produced during download), reading and writing in
+    a thread pool while pdfs are sliced in a process pool. Returns the list
+    of (path, status) pairs, where status is 'sliced', 'rejected' or 'error: ...'
+    
+    Parameters
+    ----------
+    paths : list
+        The keys of the full X-17A-5 filings e.g. ['input/X-17A-5/1904-2020-02-26.pdf']
+    sink : StorageSink.S3Sink
+        The storage sink from which filings are read and subsets are written
+    export_folder : str
+        The folder where subset pdfs are stored e.g. 'pdf/'
+    pages : list
+        The page numbers to be selected from each filing (first twenty pages)
+    top_k : int
+        If provided, only the top-k balance sheet candidates are selected
+    io_workers : int
+        The number of threads reading and writing to the sink
+    slice_workers : int
+        The number of processes slicing pdfs (default number of cores)
+    """
+
+    lock = threading.Lock()
+    completed = []
+
+    def finish(path, status):
+        with lock:
+            completed.append((path, status))
+            print('\t(%d out of %d) %s - %s' % (len(completed), len(paths), path, status))
+
+    pool = ProcessPoolExecutor(max_workers=slice_workers or os.cpu_count())
+
+    def backfill(path):
+        try:
+            result = pool.submit(sliceBuffer, sink.get(path), pages, top_k).result()
+            if result is None:
+                return finish(path, 'rejected')
+
+            subset, n_pages, selected = result
+            sink.put(subsetKey(path, export_folder), subset, metadata=subsetMetadata(n_pages, selected, subset))
+        except Exception as e:
+            return finish(path, 'error: %s' % e)
+
+        finish(path, 'sliced')
+
+    with ThreadPoolExecutor(max_workers=io_workers) as executor:
+        list(executor.map(backfill, paths))
+
+    pool.shutdown()
+
+    return completed
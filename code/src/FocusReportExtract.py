@@ -11,25 +11,21 @@ from registered broker-dealers in the SEC's history
 ##################################
 
 # console and directory access
-import os
+import io
 import re
-import time
-import urllib
 import datetime
 
+from contextlib import ExitStack
+
 # structured data reading 
-import pandas as pd
 import numpy as np
 
 # parsing SEC website for data  
-import requests
 from bs4 import BeautifulSoup
+from SECRequests import secGet
 
-# pdf manipulation
-from PyPDF2 import PdfFileReader, PdfFileWriter, utils
-
-# module that deals with encryption error
-from pikepdf import Pdf
+# pdf manipulation (native qpdf backend, also deals with encryption errors)
+from pikepdf import Pdf, PdfError
 
 
 ##################################
@@ -60,10 +56,49 @@ def searchURL(cik:str, file_type:str='X-17A-5') -> str:
     
     return url
 
-def edgarParse(url:str, company_email:str):
+def parseFilingTable(html:str) -> tuple:
+    """
+    Parses an EDGAR search page in a single walk of the filings table, 
+    returning a tuple of filing dates, archived filings URLs and a flag
+    indicating whether a next page of results exists
+    
+    Parameters
+    ----------
+    html : str 
+        The HTML body of an EDGAR search page for a given CIK 
+    """
+    
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    filing_dates = []
+    archives = []
+    
+    # the filings are stored in the table 'tableFile2' with columns 
+    # Filings | Format | Description | Filing Date | File/Film Number
+    table = soup.find('table', attrs={'class': 'tableFile2'})
+    
+    if table is not None:
+        for row in table.find_all('tr'):
+            cells = row.find_all('td')
+            if len(cells) < 4: continue         # header row is constructed from <th> tags
+            
+            # the Format column holds the link to the filing detail page (archived contents)
+            link = cells[1].find('a', attrs={'id': 'documentsbutton'}) or cells[1].find('a')
+            if link is None or 'Archives' not in link.get('href', ''): continue
+            
+            filing_dates.append(cells[3].text.strip())
+            archives.append('https://www.sec.gov' + link.get('href'))
+    
+    # pagination buttons are rendered as inputs e.g. <input type="button" value="Next 40" ...>
+    has_next = soup.find('input', attrs={'value': re.compile('^Next')}) is not None
+    
+    return filing_dates, archives, has_next
+
+def edgarParse(url:str, company_email:str, count:int=100):
     """
     Parses the EDGAR webpage of a provided URL and returns 
-    a tuple of filings dates and archived filings URLs
+    a tuple of filings dates and archived filings URLs, following
+    the result pages until all filings have been retrieved
     
     Parameters
     ----------
@@ -72,56 +107,38 @@ def edgarParse(url:str, company_email:str):
         pointing to a CIK for X-17A-5 filings
     company_email : str
         The company email belonging to the user e.g. mathias.andler@ny.frb.org
+    count : int
+        The number of filings requested per result page (EDGAR allows at most 100)
     """
     
-    response = requests.Response()
+    filing_dates = []
+    archives = []
+    start = 0
     
-    # we try requesting the URL and break only if response object returns status of 200
-    for _ in range(20): 
-        response = requests.get(url, headers={'User-Agent': 'Company Name ' + company_email},
-                           stream=True, allow_redirects=True)
+    while True:
+        # request each result page once through the shared SEC client
+        # (e.g. https://www.sec.gov/cgi-bin/browse-edgar?action=getcompany&CIK=1904&type=X-17A-5&dateb=20201231&start=0&count=100)
+        response = secGet(url + '&start={}&count={}'.format(start, count), company_email)
         
-        time.sleep(1)
-        if response.status_code == 200: break
-    
-    # last check to see if response object is "problematic" e.g. 403 after 10 tries
-    if response.status_code != 200: return None
-    
-    # parse the HTML doc string from the response object
-    soup = BeautifulSoup(response.text, 'html.parser') 
-    
-    # read in HTML tables from the url link provided 
-    try:
-        # due to web-scrapping non-constant behavior (check against few tries)
-        for _ in range(20):
-            try: 
-                #filings = pd.read_html(url) 
-                r = requests.get(url, headers={'User-Agent': 'Company Name ' + company_email})
-                filings = pd.read_html(r.text)
-
-                break
-            except urllib.error.HTTPError: print('HTTPError: Unable to read URL %s' % url)
+        # last check to see if response object is "problematic" e.g. 403
+        if response is None or response.status_code != 200: return None
         
-        # case handle in the event we return nothing
-        try:
-            filing_table = filings[2]                           # select the filings (raises IndexError Flag)
-            filing_dates = filing_table['Filing Date'].values   # select the filing dates columns
-
-            # parse the html-doc string for all instance of < a href= > from the URL 
-            href = [link.get('href') for link in soup.find_all('a')]
-
-            # search for all links with Archive in handle, these are the search links for the X-17A-5 filings
-            archives = ['https://www.sec.gov' + link for link in href if str.find(link, 'Archives') > 0]
-
-            # return a tuple of vectors, the filings dates and the corresponding urls
-            return filing_dates, archives
-        except UnboundedLocalError:
-            return None
+        page_dates, page_archives, has_next = parseFilingTable(response.text)
+        filing_dates.extend(page_dates)
+        archives.extend(page_archives)
         
+        # stop once the result pages are exhausted (rows without a filing link are left out
+        # of page_dates, so a full page may parse to fewer than count filings)
+        if not has_next: break
+        start += count
+    
     # if there exists no active reports for a given CIK, we flag the error
-    except IndexError:
+    if len(filing_dates) == 0:
         print('Currently no filings are present for the firm\n')
         return None
+    
+    # return a tuple of vectors, the filings dates and the corresponding urls
+    return np.array(filing_dates), archives
 
 def fileExtract(archive:str, company_email:str) -> list:
     """
@@ -138,17 +155,11 @@ def fileExtract(archive:str, company_email:str) -> list:
         The company email belonging to the user e.g. mathias.andler@ny.frb.org
     """
     
-    pdf_storage = requests.Response()
-    
-    # we try requesting the URL and break only if response object returns status of 200
-    for _ in range(20):
-        pdf_storage = requests.get(archive, headers={'User-Agent': 'Company Name ' + company_email},
-                           stream=True, allow_redirects=True)
-        time.sleep(1)
-        if pdf_storage.status_code == 200: break
+    # request the URL through the shared SEC client (retries on throttling and server errors)
+    pdf_storage = secGet(archive, company_email)
         
     # last check to see if response object is "problamatic" e.g. 403
-    if pdf_storage.status_code != 200: 
+    if pdf_storage is None or pdf_storage.status_code != 200: 
         return []
 
     # table from filing detail Edgar table 
@@ -162,10 +173,10 @@ def fileExtract(archive:str, company_email:str) -> list:
 
     return pdf_files
 
-def mergePdfs(files:list, company_email:str,second_pass=False) -> PdfFileWriter:
+def fetchPdfs(files:list, company_email:str) -> list:
     """
-    Combines pdfs files iteratively by page for 
-    each of the accompanying SEC filings 
+    Downloads the pdf attachments of a SEC filing, returning
+    a list of the raw pdf contents (bytes) in the order given
     
     Parameters
     ----------
@@ -174,48 +185,72 @@ def mergePdfs(files:list, company_email:str,second_pass=False) -> PdfFileWriter:
         for each broker-detal in Edgar's website
     company_email : str
         The company email belonging to the user e.g. mathias.andler@ny.frb.org
-    second_pass: Boolean
-        Some recent (2020) pdfs make the code break right after mergePdf is called (I believe it's some encryption issue)
-        If second_pass == True, we pass the pdf through pikepdf to solve this issue (in the except catch)
     """
     
-    # initialize a pdf object to be store pdf pages
-    pdfWriter = PdfFileWriter()
+    buffers = []
     
     for pdf in files:
-        pdf_file = 'https://www.sec.gov' + pdf 
+        # request the URL through the shared SEC client (retries on throttling and server errors)
+        pdf_storage = secGet('https://www.sec.gov' + pdf, company_email)
         
-        # we try requesting the URL and break only if response object returns status of 200
-        for _ in range(20):
-            pdf_storage = requests.get(pdf_file, headers={'User-Agent': 'Company Name ' + company_email},
-                           stream=True, allow_redirects=True)
-            time.sleep(1)
-            if pdf_storage.status_code == 200: break
-
         # last check to see if response object is "problematic" e.g. 403
-        if pdf_storage.status_code != 200: 
+        if pdf_storage is None or pdf_storage.status_code != 200: 
             continue
-            
-        # save PDF contents to local file location 
-        open('temp.pdf', 'wb').write(pdf_storage.content)
-        # read pdf file as PyPDF2 object
-        try:
-            pdf = PdfFileReader('temp.pdf', strict=False) 
-            nPages = pdf.getNumPages()
-            if second_pass:
-                raise
-        except:
-            with Pdf.open('temp.pdf', allow_overwriting_input=True) as pdf:
-                pdf.save('temp.pdf')
-            
-            pdf = PdfFileReader('temp.pdf', strict=False) 
-            nPages = pdf.getNumPages()
         
-        # add the pages from the document as specified 
-        for page_num in np.arange(nPages):
-            pdfWriter.addPage(pdf.getPage(page_num))
+        buffers.append(pdf_storage.content)
     
-    if os.path.isfile('./temp.pdf'): os.remove('temp.pdf')
+    return buffers
+
+def mergeBuffers(buffers:list) -> bytes:
+    """
+    Concatenates in-memory pdf files using pikepdf (qpdf) and returns 
+    the merged pdf contents (bytes), without writing to any temporary 
+    file. Attachments that cannot be read are skipped, a ValueError
+    is raised if none of them can be read (nothing to ingest)
+    
+    Parameters
+    ----------
+    buffers : list
+        A list of raw pdf contents (bytes) e.g. as returned by fetchPdfs()
+    """
+    
+    merged = Pdf.new()
+    
+    # source documents are kept open until the merged document is saved
+    with ExitStack() as stack:
+        for content in buffers:
+            try:
+                # pikepdf opens pdfs with an empty user password (encrypted filings) and repairs damaged files
+                pdf = stack.enter_context(Pdf.open(io.BytesIO(content)))
+            except PdfError as e:
+                print('\tUnable to read pdf attachment (%s)' % e)
+                continue
+            
+            # add all pages from the document to the merged document
+            merged.pages.extend(pdf.pages)
+        
+        # an empty pdf would be recorded as ingested (and move the watermark past the filing)
+        if len(merged.pages) == 0:
+            raise ValueError('unreadable, no pdf attachment could be opened')
+        
+        output = io.BytesIO()
+        merged.save(output)
     
-    return pdfWriter
+    return output.getvalue()
 
+def mergePdfs(files:list, company_email:str) -> bytes:
+    """
+    Combines pdfs files iteratively by page for 
+    each of the accompanying SEC filings, returning
+    the merged pdf contents (bytes)
+    
+    Parameters
+    ----------
+    files : list
+        A list of pdfs retrieved from filing details 
+        for each broker-detal in Edgar's website
+    company_email : str
+        The company email belonging to the user e.g. mathias.andler@ny.frb.org
+    """
+    
+    return mergeBuffers(fetchPdfs(files, company_email))
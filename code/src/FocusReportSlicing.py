@@ -10,9 +10,14 @@ to be easily read by AWS Textract, due to file constraints
 # LIBRARY/PACKAGE IMPORTS
 ##################################:
 
+import io
+import re
+import fitz
+import hashlib
 import numpy as np 
 
 from PyPDF2 import PdfFileReader, PdfFileWriter, utils
+from pikepdf import Pdf, PdfError
 
 
 ##################################
@@ -110,6 +115,165 @@ def extractSubset(pages:list, export_file:str):
         
      
     
+def scorePage(text:str) -> float:
+    """
+    Scores the likelihood that a page holds the balance sheet (statement of 
+    financial condition) from its text layer, mirroring the keyword and 
+    dollar-sign assumptions of OCRTextract.get_balance_sheet
+    
+    Parameters
+    ----------
+    text : str
+        The text extracted from the text layer of a pdf page
+    """
+    
+    # statement titles are the strongest signal for the balance sheet
+    score = 10.0 * len(re.findall('statement[s]? of financial condition|balance sheet', text, flags=re.IGNORECASE))
+    
+    # line items found in the first column of the balance sheet (see get_balance_sheet)
+    score += 2.0 * len(re.findall(r'^\s*cash|total assets|total liabilities', text, flags=re.IGNORECASE | re.MULTILINE))
+    score += 1.0 * len(re.findall('asset|liabilit|equity|subordinated|receivable|payable', text, flags=re.IGNORECASE))
+    
+    # dollar signs followed by characters (see check_dollar_sign), capped to avoid favoring schedules 
+    score += min(len(re.findall(r'\$[^\]]+', text)), 10)
+    
+    # the table of contents and notes mention the same terms without the figures 
+    if re.search('table of contents|notes to (the )?financial statements', text, flags=re.IGNORECASE):
+        score /= 4
+    
+    return score
+
+def rankPages(content:bytes, top_k:int=3, window:list=range(20), min_chars:int=200) -> list:
+    """
+    Ranks the pages of an in-memory pdf by their balance sheet score and 
+    returns the top-k candidates in page order. If the pdf has no text 
+    layer (e.g. scanned filings) we fall back to the provided page window
+    
+    Parameters
+    ----------
+    content : bytes
+        The contents of a pdf file (e.g. a merged X-17A-5 filing)
+        
+    top_k : int   
+        The number of candidate pages returned
+        
+    window : list
+        The page numbers returned when no text layer is present (first twenty pages)
+        
+    min_chars : int
+        The minimum number of characters extracted from the text layer
+        of the window for the text layer to be considered present
+    """
+    
+    with fitz.open(stream=content, filetype='pdf') as doc:
+        texts = [page.getText() for page in doc]
+    
+    n_window = sum(len(texts[p].strip()) for p in window if p < len(texts))
+    if n_window < min_chars:
+        return list(window)
+    
+    scores = np.array([scorePage(text) for text in texts])
+    
+    # only pages with a positive score are kept, ties are broken by page order 
+    ranked = [p for p in np.argsort(-scores, kind='stable')[:top_k] if scores[p] > 0]
+    if len(ranked) == 0:
+        return list(window)
+    
+    return sorted(int(p) for p in ranked)
+
+def sliceBuffer(content:bytes, pages:list, top_k:int=None) -> tuple:
+    """
+    Extracts a subset of pages from an in-memory pdf, returns the subset
+    pdf contents along with the total number of pages in the original pdf
+    and the page numbers selected, None if the pdf could not be read
+    
+    Parameters
+    ----------
+    content : bytes
+        The contents of a pdf file (e.g. a merged X-17A-5 filing)
+        
+    pages : list   
+        The page numbers to be selected from the pdf (e.g. range(20)), 
+        pages beyond the length of the document are ignored
+        
+    top_k : int
+        If provided, only the top-k balance sheet candidates are selected
+        (see rankPages), with pages used as the fallback window
+    """
+    
+    try:
+        if top_k is not None:
+            pages = rankPages(content, top_k=top_k, window=pages)
+        
+        with Pdf.open(io.BytesIO(content)) as pdf:
+            n_pages = len(pdf.pages)
+            selected = [p for p in pages if p < n_pages]
+            
+            subset = Pdf.new()
+            subset.pages.extend(pdf.pages[p] for p in selected)
+            
+            # a fixed trailer /ID keeps the subset of a filing byte-identical across re-runs (see TextractCache.py)
+            buffer = io.BytesIO()
+            subset.save(buffer, deterministic_id=True)
+            
+    except (PdfError, RuntimeError):
+        return None
+    
+    return buffer.getvalue(), n_pages, selected
+
+def subsetMetadata(n_pages:int, selected:list, subset:bytes=None) -> dict:
+    """
+    Page-count metadata stored alongside each subset pdf, along with the
+    SHA-256 of the subset contents (if given) such that the Textract cache
+    key is found without reading the subset back
+    e.g. {'pages': 40, 'subset-pages': 3, 'selected': '4,5,6', 'sha256': '9f86d08...'}
+    """
+    metadata = {'pages': n_pages, 'subset-pages': len(selected), 
+                'selected': ','.join(str(p) for p in selected)}
+    if subset is not None: metadata['sha256'] = hashlib.sha256(subset).hexdigest()
+    return metadata
+
+def subsetKey(path:str, export_folder:str) -> str:
+    """
+    Returns the s3 key of the subset pdf corresponding to a filing 
+    e.g. input/X-17A-5/1904-2020-02-26.pdf -> <export_folder>1904-2020-02-26-subset.pdf
+    """
+    base_file = path.split('/')[-1].split('.')[0]
+    return export_folder + base_file + '-subset.pdf'
+
+def subsetWriter(sink, export_folder:str, pages:list=range(20), top_k:int=None):
+    """
+    Returns a function (filing, content) that slices an in-memory filing 
+    and writes the subset pdf to the storage sink, with the total and 
+    selected page counts recorded as metadata. Used as an on_merged 
+    consumer of FilingPipeline.downloadFilings
+    
+    Parameters
+    ----------
+    sink : StorageSink.S3Sink
+        The storage sink to which subset pdfs are written
+        
+    export_folder : str   
+        The folder where subset pdfs are stored e.g. 'pdf/'
+        
+    pages : list
+        The page numbers to be selected from each filing (first twenty pages)
+        
+    top_k : int
+        If provided, only the top-k balance sheet candidates are selected
+    """
+    
+    def writeSubset(filing:dict, content:bytes):
+        result = sliceBuffer(content, pages, top_k)
+        if result is None:
+            print('EOF marker not found - reject %s' % filing['key'])
+            return
+        
+        subset, n_pages, selected = result
+        sink.put(subsetKey(filing['key'], export_folder), subset, metadata=subsetMetadata(n_pages, selected, subset))
+    
+    return writeSubset
+
 def to_png(pil_path,base_file,idx):
     """
     Takes a pil path to convert to PNGs
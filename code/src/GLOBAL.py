@@ -13,6 +13,8 @@ mapping conventions for s3 directories
 import boto3
 from sagemaker.session import Session
 
+from TextractGateway import textract_gateway
+
 
 ##################################
 # GLOBAL VARIABLES
@@ -24,8 +26,8 @@ class GlobVars:
     s3_pointer = boto3.client('s3')
     s3_session = Session()
 
-    # Amazon Textract client
-    textract = boto3.client('textract')
+    # Amazon Textract gateway (pooled client, retries and metrics) shared by every OCR entry point
+    textract = textract_gateway
 
     # folder & directory information
     temp_folder ='temp/'
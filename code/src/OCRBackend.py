@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+OCRBackend.py: Pluggable OCR backends returning the normalized document
+model of OCRModel.py, with an AWS Textract implementation (jobs scheduled
+by TextractScheduler.py) and a local Tesseract implementation for offline
+(or bulk) runs across all cores
+"""
+
+##################################
+# LIBRARY/PACKAGE IMPORTS
+##################################
+
+import io
+
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from OCRModel import OCRDocument
+from OCRTextract import jobDocument, TextractError
+from OCRTextLayer import layoutPage
+from PageRaster import renderPages
+
+
+##################################
+# USER DEFINED CLASSES
+##################################
+
+class OCRBackend(ABC):
+    """
+    Interface implemented by every OCR backend, reading documents stored
+    under s3 keys (e.g. 'pdf/1904-2020-02-26-subset.pdf') into OCRDocuments.
+    The reason a document could not be read is kept in errors, and the ID of
+    the remote job that read a document (if any) in job_ids (keyed by s3 key)
+    """
+
+    @abstractmethod
+    def analyze(self, key:str) -> OCRDocument:
+        """
+        Reads a single document, returns None if the document could not be read
+        """
+
+    def analyzeMany(self, keys:list) -> dict:
+        """
+        Reads many documents, returns a dictionary of OCRDocuments (None if
+        the document could not be read) keyed by the s3 key of each document
+        """
+        return {key: self.analyze(key) for key in keys}
+
+    def iterAnalyze(self, keys:list):
+        """
+        Reads many documents, yielding (key, OCRDocument) pairs as documents
+        are read (None if the document could not be read)
+        """
+        yield from self.analyzeMany(keys).items()
+
+    def report(self):
+        """
+        Prints a summary of the resources used by the backend (if any)
+        """
+
+class TextractBackend(OCRBackend):
+    """
+    OCR backend running asynchronous AWS Textract (TABLES) jobs, documents
+    found in the Textract cache are read without a job and the others are
+    yielded in completion order (see TextractScheduler.py). Result pages are 
+    streamed, such that pages are only fetched while the caller reads them
+
+    Parameters
+    ----------
+    scheduler : TextractScheduler.JobScheduler
+        The scheduler keeping Textract jobs in flight
+
+    cache : TextractCache
+        The cache of raw Textract responses (if None nothing is cached)
+
+    early_stop : bool
+        If True, result pages are no longer requested once the caller stops
+        reading pages of a document (see OCRTextract.jobDocument)
+
+    cache_partial : bool
+        If True, documents read partially are still cached (see OCRTextract.jobDocument)
+    """
+
+    def __init__(self, scheduler, cache=None, early_stop:bool=True, cache_partial:bool=False):
+        self.scheduler = scheduler
+        self.cache = cache
+        self.early_stop = early_stop
+        self.cache_partial = cache_partial
+        self.errors = {}
+        self.job_ids = {}
+
+    def analyze(self, key:str) -> OCRDocument:
+        return self.analyzeMany([key])[key]
+
+    def analyzeMany(self, keys:list) -> dict:
+
+        documents = {}
+
+        # every page of a document is read before the next document (such that complete jobs are cached)
+        for key, document in self.iterAnalyze(keys):
+            try:
+                documents[key] = OCRDocument(list(document.pages)) if document is not None else None
+            except TextractError as e:
+                self.errors[key] = 'Could not retrieve Textract results, %s' % e
+                documents[key] = None
+
+        return documents
+
+    def iterAnalyze(self, keys:list):
+        """
+        Yields (key, OCRDocument) pairs, each document is only valid until the
+        next pair is requested (its job is then cached, see OCRTextract.jobDocument)
+        """
+
+        # documents whose pdf (and feature set) were already read by Textract are read from the cache
+        digests = self.cache.digests(keys) if self.cache is not None else {}
+        cached = set(key for key, digest in digests.items() if digest in self.cache)
+        print('%d filings found in the Textract cache, %d sent to Textract\n' % (len(cached), len(keys) - len(cached)))
+
+        def jobs():
+            for key in keys:
+                if key in cached: yield key, None, 'SUCCEEDED'
+            yield from self.scheduler.run([key for key in keys if key not in cached])
+
+        for key, job_id, status in jobs():
+
+            # documents for which a job could not be started (or failed) are logged as errors
+            if key not in cached:
+                self.job_ids[key] = job_id
+                if job_id is None:
+                    self.errors[key] = 'Could not start Textract job, JOB FAILED'
+                    yield key, None
+                    continue
+
+            if status == 'FAILED':
+                self.errors[key] = 'Could not parse, JOB FAILED'
+                yield key, None
+                continue
+
+            # the job is fetched through the tracker it was scheduled with (no other status check), 
+            # Textract errors (e.g. an expired job ID or access denied) are logged for this document only
+            try:
+                with jobDocument(job_id, self.cache, digests.get(key), self.early_stop, 
+                                 self.scheduler.poller, self.cache_partial) as document:
+                    if document is None:
+                        self.errors[key] = 'Could not parse, JOB FAILED'
+                    yield key, document
+            except TextractError as e:
+                self.errors[key] = 'Could not retrieve Textract results, %s' % e
+                yield key, None
+
+    def report(self):
+        if self.scheduler.controller is not None: self.scheduler.controller.report()
+
+class TesseractBackend(OCRBackend):
+    """
+    Local OCR backend rendering pages (see PageRaster.py) and reading them
+    with Tesseract, tables are rebuilt from word coordinates (see OCRTextLayer.py)
+
+    Parameters
+    ----------
+    sink : StorageSink.S3Sink
+        The storage sink from which documents are read
+
+    dpi : int
+        The resolution at which pages are rendered for Tesseract
+
+    lang : str
+        The Tesseract language model e.g. 'eng'
+
+    io_workers : int
+        The number of threads reading documents from the sink
+
+    ocr_workers : int
+        The number of processes running Tesseract (default number of cores)
+    """
+
+    def __init__(self, sink, dpi:int=300, lang:str='eng', io_workers:int=8, ocr_workers:int=None):
+        self.sink = sink
+        self.dpi = dpi
+        self.lang = lang
+        self.io_workers = io_workers
+        self.ocr_workers = ocr_workers
+        self.errors = {}
+        self.job_ids = {}
+
+    def analyze(self, key:str) -> OCRDocument:
+        try:
+            return tesseractDocument(self.sink.get(key), self.dpi, self.lang)
+        except Exception as e:
+            print('\tTesseract could not read %s (%s)' % (key, e))
+            self.errors[key] = 'Could not parse, Tesseract failed'
+            return None
+
+    def analyzeMany(self, keys:list) -> dict:
+
+        with ProcessPoolExecutor(max_workers=self.ocr_workers) as pool:
+
+            def analyze(key):
+                try:
+                    return key, pool.submit(tesseractDocument, self.sink.get(key), self.dpi, self.lang).result()
+                except Exception as e:
+                    print('\tTesseract could not read %s (%s)' % (key, e))
+                    self.errors[key] = 'Could not parse, Tesseract failed'
+                    return key, None
+
+            with ThreadPoolExecutor(max_workers=self.io_workers) as executor:
+                return dict(executor.map(analyze, keys))
+
+
+##################################
+# USER DEFINED FUNCTIONS
+##################################
+
+def tesseractDocument(content:bytes, dpi:int=300, lang:str='eng') -> OCRDocument:
+    """
+    Reads every page of an in-memory pdf with Tesseract, returns an OCRDocument
+    with word coordinates expressed in pdf points
+
+    Parameters
+    ----------
+    content : bytes
+        The contents of a pdf file (e.g. a sliced X-17A-5 filing)
+
+    dpi : int
+        The resolution at which pages are rendered
+
+    lang : str
+        The Tesseract language model e.g. 'eng'
+    """
+    import pytesseract
+    from PIL import Image
+
+    scale = 72 / dpi
+    pages = []
+
+    for image in renderPages(content, dpi=dpi, grayscale=True):
+        data = pytesseract.image_to_data(Image.open(io.BytesIO(image)), lang=lang,
+                                         output_type=pytesseract.Output.DICT)
+
+        # empty detections (confidence of -1) are layout elements, not words
+        words = [(data['left'][i] * scale, data['top'][i] * scale,
+                  (data['left'][i] + data['width'][i]) * scale, (data['top'][i] + data['height'][i]) * scale,
+                  data['text'][i].strip(), float(data['conf'][i]))
+                 for i in range(len(data['text']))
+                 if data['text'][i].strip() != '' and float(data['conf'][i]) >= 0]
+
+        pages.append(layoutPage(words))
+
+    return OCRDocument(pages)
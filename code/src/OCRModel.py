@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+OCRModel.py: Normalized document model (pages of tables, lines and words)
+returned by every OCR backend (see OCRBackend.py), such that balance sheet
+extraction does not depend on the engine that read the document
+"""
+
+##################################
+# LIBRARY/PACKAGE IMPORTS
+##################################
+
+import numpy as np
+import pandas as pd
+
+
+##################################
+# USER DEFINED CLASSES
+##################################
+
+class OCRWord:
+    """
+    A word read from a page, with its bounding box in pdf points
+    (x0, y0, x1, y1) and prediction confidence (0-100)
+    """
+
+    def __init__(self, text:str, confidence:float, bbox:tuple):
+        self.text = text
+        self.confidence = confidence
+        self.bbox = bbox
+
+class OCRLine:
+    """
+    A line of text read from a page, with its prediction confidence (0-100)
+    """
+
+    def __init__(self, text:str, confidence:float, words:list=[]):
+        self.text = text
+        self.confidence = confidence
+        self.words = words
+
+class OCRTable:
+    """
+    A table read from a page, stored as a list of rows of cell text
+    e.g. [['Cash', '$ 1,234'], ['Total assets', '$ 10,725']] or as an
+    (N X M) numpy object matrix of stripped cell text
+    """
+
+    def __init__(self, rows:list):
+        self.rows = rows
+
+class OCRPage:
+    """
+    A page read by an OCR backend, the raw engine blocks are kept for
+    engine-specific extraction (e.g. Textract FORMS key-value pairs)
+    """
+
+    def __init__(self, lines:list=[], tables:list=[], words:list=[], blocks:list=[]):
+        self.lines = lines
+        self.tables = tables
+        self.words = words
+        self.blocks = blocks
+
+class OCRDocument:
+    """
+    A document read by an OCR backend, made up of pages in reading order
+    """
+
+    def __init__(self, pages:list):
+        self.pages = pages
+
+
+##################################
+# USER DEFINED FUNCTIONS
+##################################
+
+def table2df(table:OCRTable) -> pd.DataFrame:
+    """
+    Function designed to convert an OCR table into a dataframe object
+
+    Parameters
+    ----------
+    table : OCRTable
+        A table object read from a pdf by an OCR backend
+    """
+
+    # matrices built from Textract blocks (see TextractBlocks.py) hold stripped text already,
+    # empty columns are dropped at once and the column names are reset (0, 1, ...)
+    if isinstance(table.rows, np.ndarray):
+        return pd.DataFrame(table.rows[:, (table.rows != '').any(axis=0)])
+
+    df = pd.DataFrame([[str(cell).strip() for cell in row] for row in table.rows])
+
+    # remove columns that are completely empty
+    empty_cols = [col for col in df.columns if (df[col] == '').all()]
+    df = df.drop(empty_cols, axis=1)
+
+    # reset the column names (avoid the column names)
+    df.columns = np.arange(df.columns.size)
+
+    return df
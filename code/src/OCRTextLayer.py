@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+OCRTextLayer.py: Local balance sheet extraction from the text layer of
+born-digital FOCUS reports, rebuilding tables from word coordinates such
+that AWS Textract is only used for filings without a usable text layer
+"""
+
+##################################
+# LIBRARY/PACKAGE IMPORTS
+##################################
+
+import re
+import fitz
+
+import numpy as np
+import pandas as pd
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from OCRModel import OCRWord, OCRLine, OCRTable, OCRPage, OCRDocument
+from OCRTextract import documentParse
+
+
+##################################
+# USER DEFINED FUNCTIONS
+##################################
+
+# numeric cells found in balance sheets e.g. 1,234 or (1,234) or 12.5% or - (nil values)
+numeric_token = re.compile(r'^\(?\$?\(?[\d,]*\d(\.\d+)?\)?%?\)?$|^[-–—]+$')
+
+def clusterLines(words:list, tolerance:float=0.5) -> list:
+    """
+    Groups words into text lines by the vertical center of their bounding
+    box, returns a list of lines (each a list of words sorted left to right)
+
+    Parameters
+    ----------
+    words : list
+        Words as (x0, y0, x1, y1, text, confidence) tuples
+
+    tolerance : float
+        The maximum vertical distance between a word center and the center
+        of a line, as a fraction of the median word height
+    """
+
+    if len(words) == 0: return []
+
+    height = np.median([w[3] - w[1] for w in words]) * tolerance
+    words = sorted(words, key=lambda w: ((w[1] + w[3]) / 2, w[0]))
+
+    lines = [[words[0]]]
+    center = (words[0][1] + words[0][3]) / 2
+
+    for w in words[1:]:
+        w_center = (w[1] + w[3]) / 2
+
+        # words far from the current line center start a new line
+        if w_center - center > height:
+            lines.append([w])
+            center = w_center
+        else:
+            lines[-1].append(w)
+
+    return [sorted(line, key=lambda w: w[0]) for line in lines]
+
+def splitLine(line:list) -> tuple:
+    """
+    Splits a text line into its line item label and numeric value cells,
+    reading numeric tokens (and their $ signs) from the right of the line.
+    Returns the label and a list of (right edge, cell text) values
+
+    Parameters
+    ----------
+    line : list
+        The words of a text line as (x0, y0, x1, y1, text, confidence) tuples
+    """
+
+    values = []
+    idx = len(line)
+
+    while idx > 0:
+        x0, y0, x1, y1, text = line[idx-1][:5]
+
+        # years of dates (e.g. December 31, 2020) are part of the label
+        if re.match(r'^(19|20)\d\d$', text) and idx > 1 and line[idx-2][4].endswith(','):
+            break
+
+        if numeric_token.match(text):
+            values.insert(0, [x1, text])
+        elif text == '$' and len(values) > 0:
+            # a detached dollar sign belongs to the numeric cell on its right
+            values[0][1] = '$ ' + values[0][1]
+        else:
+            break
+        idx -= 1
+
+    # dot leaders between the line item and the figures are removed
+    label = ' '.join(w[4] for w in line[:idx])
+    label = re.sub(r'[\s.…_]+$', '', label).strip()
+
+    return label, [tuple(v) for v in values]
+
+def clusterColumns(edges:list, gap:float=15.0) -> list:
+    """
+    Groups the right edges of numeric cells into right-aligned columns,
+    returns the boundaries between consecutive columns
+
+    Parameters
+    ----------
+    edges : list
+        The right edges (x1) of all numeric cells found on a page
+
+    gap : float
+        The minimum horizontal distance (in points) between two columns
+    """
+
+    edges = np.sort(edges)
+    splits = np.where(np.diff(edges) > gap)[0]
+
+    # boundaries are placed halfway between neighbouring columns
+    return [(edges[i] + edges[i+1]) / 2 for i in splits]
+
+def pageTable(lines:list) -> pd.DataFrame:
+    """
+    Rebuilds the table of a page from the word coordinates of its lines,
+    returns a DataFrame with the line item in the first column followed 
+    by the numeric columns (as in table2df)
+
+    Parameters
+    ----------
+    lines : list
+        The text lines of a page, see clusterLines
+    """
+
+    rows = [splitLine(line) for line in lines]
+    edges = [x1 for label, values in rows for x1, _ in values]
+
+    if len(edges) == 0:
+        return pd.DataFrame()
+
+    bounds = clusterColumns(edges)
+
+    arr = []
+    for label, values in rows:
+
+        # lines without a label are headers (e.g. years) or page numbers
+        if label == '': continue
+
+        row = [label] + [''] * (len(bounds) + 1)
+        for x1, text in values:
+            col = 1 + int(np.searchsorted(bounds, x1))
+            row[col] = (row[col] + ' ' + text).strip()
+        arr.append(row)
+
+    # the table spans from the first to the last line item with figures
+    has_values = [i for i, row in enumerate(arr) if any(row[1:])]
+    if len(has_values) == 0:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(arr[has_values[0]:has_values[-1]+1])
+
+    # remove columns that are completely empty
+    empty_cols = [col for col in df.columns if (df[col] == '').all()]
+    df = df.drop(empty_cols, axis=1)
+
+    # reset the column names (avoid the column names)
+    df.columns = np.arange(df.columns.size)
+
+    return df
+
+def layoutPage(words:list) -> OCRPage:
+    """
+    Builds an OCR page from positioned words (e.g. from the pdf text layer 
+    or a local OCR engine), with text lines and the table rebuilt from 
+    word coordinates
+
+    Parameters
+    ----------
+    words : list
+        Words as (x0, y0, x1, y1, text, confidence) tuples
+    """
+
+    lines = clusterLines(words)
+
+    ocr_lines = []
+    for line in lines:
+        ocr_words = [OCRWord(w[4], w[5], w[:4]) for w in line]
+        ocr_lines.append(OCRLine(' '.join(w[4] for w in line), float(np.mean([w[5] for w in line])), ocr_words))
+
+    df = pageTable(lines)
+    tables = [OCRTable(df.values.tolist())] if df.columns.size > 0 else []
+
+    return OCRPage(lines=ocr_lines, tables=tables, words=[w for line in ocr_lines for w in line.words])
+
+def validTable(df:pd.DataFrame, min_rows:int=5, min_filled:float=0.5) -> bool:
+    """
+    Validates a balance sheet read from the text layer, requiring a
+    minimum number of line items with most carrying a figure
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        The balance sheet read from the text layer
+
+    min_rows : int
+        The minimum number of line items
+
+    min_filled : float
+        The minimum share of line items with a figure in some column
+    """
+
+    if df.shape[0] < min_rows or df.shape[1] < 2:
+        return False
+
+    filled = (df.iloc[:, 1:] != '').any(axis=1).mean()
+    return filled >= min_filled
+
+def textLayerParse(content:bytes, min_chars:int=200) -> tuple:
+    """
+    Reads the balance sheet of a filing from its pdf text layer, returning
+    the same (pdf_df, png_df, forms_data, text_data, error) tuple as
+    OCRTextract.textractParse_pdfs_parallel, such that results flow
+    through the same cleaning operations
+
+    Parameters
+    ----------
+    content : bytes
+        The contents of a pdf file (e.g. a sliced X-17A-5 filing)
+
+    min_chars : int
+        The minimum number of characters in the text layer for the
+        filing to be considered born-digital
+    """
+
+    try:
+        # words from the text layer carry no prediction uncertainty
+        with fitz.open(stream=content, filetype='pdf') as doc:
+            page_words = [[tuple(w[:5]) + (100.0,) for w in page.getTextWords()] for page in doc]
+    except RuntimeError as e:
+        return (None, None, None, None, 'Could not read text layer, %s' % e)
+
+    if sum(len(w[4]) for words in page_words for w in words) < min_chars:
+        return (None, None, None, None, 'No text layer')
+
+    # perform the balance sheet search used for Textract tables
+    return documentParse(OCRDocument([layoutPage(words) for words in page_words]), validate=validTable)
+
+def textLayerParse_parallel(pdf_paths:list, sink, io_workers:int=8, parse_workers:int=None) -> dict:
+    """
+    Reads the balance sheets of many filings from their pdf text layer,
+    downloading pdfs in a thread pool while parsing in a process pool.
+    Returns a dictionary of results (see textLayerParse) keyed by the
+    filing base name, only for filings that were read successfully
+
+    Parameters
+    ----------
+    pdf_paths : list
+        The keys of the sliced filings e.g. ['pdf/1904-2020-02-26-subset.pdf']
+
+    sink : StorageSink.S3Sink
+        The storage sink from which pdfs are read
+
+    io_workers : int
+        The number of threads reading pdfs from the sink
+
+    parse_workers : int
+        The number of processes parsing pdfs (default number of cores)
+    """
+
+    results = {}
+
+    with ProcessPoolExecutor(max_workers=parse_workers) as pool:
+
+        def parse(pdf_path):
+            try:
+                return pdf_path, pool.submit(textLayerParse, sink.get(pdf_path)).result()
+            except Exception as e:
+                return pdf_path, (None, None, None, None, str(e))
+
+        with ThreadPoolExecutor(max_workers=io_workers) as executor:
+            for pdf_path, result in executor.map(parse, pdf_paths):
+
+                # baseFile name e.g. 1224385-2004-03-01
+                basefile = pdf_path.split('/')[-1].split('-subset')[0]
+
+                if result[4] is None:
+                    results[basefile] = result
+                    print('\t%s read from text layer' % basefile)
+
+    return results
@@ -13,14 +13,44 @@ to be easily read by AWS Textract, due to file constraints
 import re
 import os
 import trp
-import time
-import boto3
+import itertools
 import minecart
 
 import numpy as np
 import pandas as pd
 
 from smart_open import open
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# shared Textract client (rate limit, retries, metrics) and completion poller for Textract jobs
+from TextractGateway import textract_gateway, TextractError
+from TextractPoller import JobPoller
+
+# normalized document model shared by all OCR backends, built directly from Textract blocks
+from OCRModel import OCRTable, OCRDocument, table2df
+from TextractBlocks import blocks2page, blocks2doc
+
+
+##################################
+# GLOBAL VARIABLES
+##################################
+
+# Textract features requested for every job, responses are cached per feature set (see TextractCache.py)
+textract_features = ['TABLES']
+
+# balance sheet assumptions (see detectBalanceSheets), asset and liability terms in the line items
+# and dollar signs followed by characters in any cell
+asset_regex = re.compile('^Cash|asset', flags=re.IGNORECASE)
+liability_regex = re.compile('liabilities|liability', flags=re.IGNORECASE)
+dollar_regex = re.compile(r'\$[^\]]+', flags=re.IGNORECASE)
+
+# single poller tracking the completion of every in-flight Textract job
+textract_poller = JobPoller(check=lambda jobId: jobStatus(jobId))
+
+# jobs read partially (early stop) may be read to the end in the background and cached (see waitCacheWrites)
+cache_writer = ThreadPoolExecutor(max_workers=4)
+cache_writes = []
 
 
 ##################################
@@ -36,86 +66,95 @@ refer to the following URL for greater granular detail on the functions
 https://docs.aws.amazon.com/textract/latest/dg/what-is.html
 """
 
-def startJob(s3BucketName:str, objectName:str) -> str:
+def startJob(s3BucketName:str, objectName:str, channel=None, retry:bool=True) -> str:
     """
-    Starts a Textract job on AWS server 
+    Starts a Textract job on AWS server, if a completion channel is given
+    (see TextractNotify.py) Textract publishes the job completion to it.
+    If retry is False a throttled submission raises TextractThrottled
     """
-    # initialize return and client object
+    # initialize return object
     response = None                         
-    client = boto3.client('textract')
+    
+    # completion is published to the SNS topic of the channel (the local stand-in has none)
+    notify = {}
+    if channel is not None and channel.notificationChannel() is not None:
+        notify['NotificationChannel'] = channel.notificationChannel()
     
     # issue response to AWS to start Textract job for table analysis 
-    response = client.start_document_analysis(
+    response = textract_gateway.call('start_document_analysis', retry,
         DocumentLocation={
             'S3Object': {
                 'Bucket': s3BucketName,     # location of data to be read from s3 bucket 
                 'Name': objectName}},       # file name to be read from Textract  
         # FeatureTypes=['FORMS', 'TABLES']    # selecting FORMS (key-values) and TABLES from the OCR
-        FeatureTypes=['TABLES']    # Due to cost we only use the OCR option 'Tables'
+        FeatureTypes=textract_features,   # Due to cost we only use the OCR option 'Tables'
+        **notify
     )
     
     # return response job ID for service
     return response["JobId"]
 
-def isJobComplete(jobId:str) -> str:
+def isJobComplete(jobId:str, pages:int=1, tracker=None) -> str:
     """
-    Tracks the completion status of the Textract job when queued
+    Waits for the Textract job to end (see TextractPoller.py), returns its final status.
+    The tracker is the poller (or notification listener) the job was scheduled with,
+    jobs it already resolved return immediately (the shared poller is used if None)
     """
-    # allow for interal sleep timer (efficiency)
-    time.sleep(1)                               
-    
-    client = boto3.client('textract')
-    response = client.get_document_analysis(JobId=jobId)
-    
-    # job-status of the response object 
-    status = response["JobStatus"]                        
+    tracker = tracker if tracker is not None else textract_poller
+    status = tracker.track(jobId, pages).result()
     print("Job status: {}".format(status))
     
-    # if job still running check current status every 5 seconds
-    while(status == "IN_PROGRESS"):
-        
-        # time lag before reporting status
-        time.sleep(5)                                         
-        response = client.get_document_analysis(JobId=jobId)
-        
-        # job-status of the response object
-        status = response["JobStatus"]                        
-        print("Job status: {}".format(status))
-    
     return status
 
-def getJobResults(jobId:str) -> list:
+def jobStatus(jobId:str) -> str:
+    """
+    Returns the status of a Textract job without retrieving its pages
+    (i.e. 'IN_PROGRESS', 'SUCCEEDED', 'PARTIAL_SUCCESS' or 'FAILED')
+    """
+    return textract_gateway.call('get_document_analysis', JobId=jobId, MaxResults=1)["JobStatus"]
+
+def getJobResults(jobId:str, tracker=None) -> list:
     """
     Returns the contents of the Textract job, after job status is completed
     """
-    # initialize list object to track pages read
-    pages = []                    
+    # return amalgamation of all page responses 
+    return list(iterJobResults(jobId, tracker))
+
+def iterJobResults(jobId:str, tracker=None):
+    """
+    Yields the result pages of the Textract job one at a time, after job status is 
+    completed, each page is only requested once the previous one has been consumed
+    (see isJobComplete for the tracker)
+    """
+    # initialize counter to track pages read
+    count = 0
+
+    # results are only requested once the job has ended (no partial IN_PROGRESS responses)
+    isJobComplete(jobId, tracker=tracker)
 
-    client = boto3.client('textract')
-    response = client.get_document_analysis(JobId=jobId)
+    response = textract_gateway.call('get_document_analysis', JobId=jobId)
     
-    # add first page response to list (length of pages will be arbitrary) 
-    pages.append(response)      
-    print("Resultset page received: {}".format(len(pages)))
+    # yield first page response (length of pages will be arbitrary) 
+    count += 1
+    print("Resultset page received: {}".format(count))
+    yield response
     
     # if NextToken present we have a pointer to page (e.g. Response -> Page) 
     nextToken = None
     if('NextToken' in response):
         nextToken = response['NextToken']
     
-    # iterate through the pages and append to response figure (assuming nextToken not None)
+    # iterate through the pages and yield each response (assuming nextToken not None)
     while(nextToken):
-        response = client.get_document_analysis(JobId=jobId, NextToken=nextToken)
-        pages.append(response)
-        print("Resultset page received: {}".format(len(pages)))
+        response = textract_gateway.call('get_document_analysis', JobId=jobId, NextToken=nextToken)
+        count += 1
+        print("Resultset page received: {}".format(count))
+        yield response
         
         # move along linked-list for presence of NextToken response
         nextToken = None
         if('NextToken' in response):
             nextToken = response['NextToken']
-    
-    # return amalgamation of all page responses 
-    return pages
 
 def runJob(bucket:str, key:str):
     """
@@ -237,6 +276,18 @@ def trp2df(table:trp.Table) -> pd.DataFrame:
         A trp table object parsed from a pdf using AWS Textract   
     """
 
+    return table2df(trp2table(table))
+
+def trp2table(table:trp.Table) -> OCRTable:
+    """
+    Function designed to convert a trp table into an OCR table object
+    
+    Parameters
+    ----------
+    table : trp.Table
+        A trp table object parsed from a pdf using AWS Textract   
+    """
+
     N = len(table.rows)               # number of rows in table
     M = len(table.rows[0].cells)      # number of columns in table
     arr = [0]*N                       # initialize matrix container
@@ -247,16 +298,55 @@ def trp2df(table:trp.Table) -> pd.DataFrame:
         # strip the text from the cell references to construct (N X M) matrix
         arr[row] = [table.rows[row].cells[col].text.strip() for col in np.arange(M)]    
     
-    df = pd.DataFrame(arr)
+    return OCRTable(arr)
+
+def textract2doc(response:list) -> OCRDocument:
+    """
+    Function designed to convert an AWS Textract response into the normalized
+    OCR document model (see OCRModel.py), keeping the raw blocks of each page
+    for FORMS (key-value) extraction
+    
+    Parameters
+    ----------
+    response : list
+        An AWS Textract response object corresponding to pages 
+        of a given document page  
+    """
     
-    # remove columns that are completely empty
-    empty_cols = [col for col in df.columns if (df[col] == '').all()]
-    df = df.drop(empty_cols, axis=1)
+    # blocks are converted directly (indexed by Id once), tables are built as object matrices
+    return blocks2doc(response)
 
-    # reset the column names (avoid the column names)
-    df.columns = np.arange(df.columns.size)
+def streamPages(responses):
+    """
+    Function designed to convert AWS Textract result pages into OCR pages as
+    blocks arrive, a document page is yielded as soon as the blocks of the 
+    next document page (or the end of the response) are reached, such that 
+    result pages are only fetched while the caller keeps consuming pages
+    
+    Parameters
+    ----------
+    responses : iterable
+        AWS Textract result pages (e.g. iterJobResults), Textract returns
+        blocks in page order and result pages may split a document page
+    """
+    
+    blocks = []         # blocks of the document page being assembled
+    current = None      # number of the document page being assembled
     
-    return df
+    for response in responses:
+        for block in response.get('Blocks', []):
+            
+            # a block of the next document page completes the current one (with all its tables and lines)
+            page = block.get('Page', 1)
+            if current is not None and page != current:
+                yield blocks2page(blocks)
+                blocks = []
+            
+            current = page
+            blocks.append(block)
+    
+    if len(blocks) > 0:
+        yield blocks2page(blocks)
 
 def check_dollar_sign(row:np.ndarray) -> bool:
     """
@@ -300,63 +390,123 @@ def get_balance_sheet(df:pd.DataFrame) -> tuple:
         read from a FOCUS report via AWS Textract
     """
     
-    # number of columns in dataframe
-    n = df.columns.size
+    return detectBalanceSheets([df])[0]
+
+def detectBalanceSheets(dfs:list) -> list:
+    """
+    Determines which of many read tables (e.g. every table of a document) are
+    balance sheet terms, returns a list with the (df, check1, check2) tuple of 
+    get_balance_sheet for each balance sheet table and None otherwise. Tables
+    are stacked such that each check is a single compiled-regex pass per column
+    
+    Parameters
+    ----------
+    dfs : list
+        DataFrame objects corresponding to tables read from 
+        a FOCUS report via AWS Textract (see table2df)
+    """
+    
+    results = [None] * len(dfs)
     
     ##############################################################
     #                           NOTES
     #         a 'good' dataframe should have 2-3 columns
     #      anything more or less is a reading error we ignore
     ##############################################################
+    
+    candidates = [i for i, df in enumerate(dfs) if 1 < df.columns.size <= 3 and df.shape[0] > 0]
+    if len(candidates) == 0:
+        return results
+    
+    # stack the candidate tables row-wise, keeping the first row of each table and the row position within it
+    lengths = np.array([dfs[i].shape[0] for i in candidates])
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    position = np.arange(lengths.sum()) - np.repeat(offsets, lengths)
+    
+    def stacked(col):
+        # column col of every candidate table (empty cells for 2-column tables)
+        return pd.Series(np.concatenate([dfs[i].iloc[:, col].to_numpy(dtype=object) if col < dfs[i].columns.size 
+                                         else np.full(dfs[i].shape[0], '', dtype=object) for i in candidates]))
+    
+    ##############################
+    # Balance Sheet Assummptions
+    ##############################
+    
+    # the first column should have all line items (e.g. Cash, Total Assets, Total Liabilites)
+    # check for the word "cash" or "asset" at the begining (asset check) and "liabilities" (liability check)
+    labels = stacked(0)
+    assetCheck = labels.str.contains(asset_regex, na=False).to_numpy()
+    debtCheck = labels.str.contains(liability_regex, na=False).to_numpy()
+    
+    # check for the presence of $ sign in any column, we assume the balance sheet items should have at least 
+    # one $ sign, this check is used to avoid reading the table of contents, which was flagged in prior reads
+    dollarCheck = np.zeros(lengths.sum(), dtype=bool)
+    for col in range(3):
+        dollarCheck |= stacked(col).str.contains(dollar_regex, na=False).to_numpy()
+    
+    ##############################
+    # Balance Sheet Determination
+    ##############################
+    
+    check1 = np.add.reduceat(assetCheck, offsets) == 0          # check for asset table
+    check2 = np.add.reduceat(debtCheck, offsets) == 0           # check for liability & equity table
+    check3 = np.add.reduceat(dollarCheck, offsets) == 0         # check for presence of '$' sign
+    
+    # make sure the cash term appears toward the top of the balance sheet (first row if no asset term)
+    first = np.minimum.reduceat(np.where(assetCheck, position, lengths.sum()), offsets)
+    first[check1] = 0
+    
+    # if either asset term or liability term is found, with a $ sign we append the dataframe
+    found = (first < lengths / 2) & (~check1 | ~check2) & ~check3
+    for k in np.flatnonzero(found):
+        results[candidates[k]] = (dfs[candidates[k]], bool(check1[k]), bool(check2[k]))
+    
+    return results
 
-    # if the dataframe has more than 3 columns then we most likley have an issue in parsing, avoid
-    if n > 3: 
-        return None
-
-    elif n > 1:
-
-        ##############################
-        # Balance Sheet Assummptions
-        ##############################
-
-        # this is the first column which should have all line items (e.g. Cash, Total Assets, Total Liabilites)
-        lineIndex = df.columns[0]
-
-        # check for the word "cash" or "asset" in a string at the begining, ignoring case sensitivity (asset check)
-        assetCheck = df[lineIndex].str.contains('^Cash|asset', regex=True, flags=re.IGNORECASE)
-
-        # check for the word "Liabilities" in a string at the end, ignoring case sensitivity (liability check)
-        debtCheck = df[lineIndex].str.contains('liabilities|liability', regex=True, flags=re.IGNORECASE)
-
-        # check for the presence of $ sign, we assume the balance sheet items should have at least one $ sign
-        # this check is used to avoid reading the table of contents, which was flagged in prior reads
-        dollarCheck = df.apply(check_dollar_sign, axis=1)
-
-        ##############################
-        # Balance Sheet Determination
-        ##############################
-
-        check1 = df[assetCheck == True].empty                  # check for asset table
-        check2 = df[debtCheck == True].empty                   # check for liability & equity table
-        check3 = df[dollarCheck == True].empty                 # check for presence of '$' sign  
-
-        # make sure the cash term appears toward the top of the balance sheet
-        if np.argmax(assetCheck==True) < assetCheck.shape[0]/2:
+def readTable(document:OCRDocument):
+    """
+    Function to transform an OCR document to a DataFrame, 
+    by searching for tables that match our balance sheet assumptions
+    
+    Parameters
+    ----------
+    document : OCRDocument
+        A document read by an OCR backend (e.g. textract2doc 
+        of an AWS Textract response object)
+    """
+    
+    # pages are searched one at a time (every table of a page in a single batch), such that no further
+    # tables are converted (or pages fetched, see streamPages) once the balance sheet is found
+    return findBalanceSheet((page, [table2df(table) for table in page.tables]) for page in document.pages)
 
-            # if either asset term or liability term is found, with a $ sign we append the dataframe
-            if (check1 == False or check2 == False) and (check3 == False):
-                return (df, check1, check2)
+def findBalanceSheet(pages) -> tuple:
+    """
+    Searches the tables of a document for those that match our balance 
+    sheet assumptions, returns the balance sheet DataFrame with the page 
+    objects and page numbers where it was found (None if not found)
+    
+    Parameters
+    ----------
+    pages : iterable
+        Pairs of (page object, tables) for each page of a document, where
+        tables are DataFrames of the table2df format 
+    """
+    
+    # every table of a page is checked in a single batch (see detectBalanceSheets)
+    return searchBalanceSheet((page, detectBalanceSheets(list(tables))) for page, tables in pages)
 
-def readTable(response:list):
+def searchBalanceSheet(pages) -> tuple:
     """
-    Function to transform AWS Textract object to a DataFrame, 
-    by searching for tables that match our balance sheet assumptions
+    Assembles the balance sheet from the tables flagged by detectBalanceSheets
+    (the asset and liability terms may be split across tables), returns the 
+    balance sheet DataFrame with the page objects and page numbers where it 
+    was found (None if not found)
     
     Parameters
     ----------
-    response : list
-        An AWS Textract response object corresponding to pages 
-        of a given document page  
+    pages : iterable
+        Pairs of (page object, detections) for each page of a document, 
+        where detections are the get_balance_sheet returns of each table
     """
     
     catDF = []          # in the event multiple tables detected on one page (concat them)
@@ -370,20 +520,11 @@ def readTable(response:list):
     prior_c1 = True     # keep track of previous asset flag 
     prior_c2 = True     # keep track of previous liability flag
     
-    # format the Textract response type 
-    doc = trp.Document(response)
-    
     # iterate through document pages
-    for page in doc.pages:
+    for page, detections in pages:
         
-        # itterate through page tables
-        for table in page.tables: 
-            
-            # convert trp-table into dataframe object
-            df = trp2df(table)
-            
-            # retrieve balance sheet from table (if possible)
-            balance_sheet = get_balance_sheet(df)
+        # itterate through page tables (balance sheet retrieved from each table if possible)
+        for balance_sheet in detections: 
             
             if type(balance_sheet) is tuple:
                 
@@ -479,7 +620,7 @@ def readPNG(pages:list, png_path:str, bucket=str):
             if res[0]['JobStatus'] != 'FAILED':
 
                 # format the Textract response type 
-                doc = trp.Document(res)
+                doc = blocks2doc(res)
 
                 # iterate through document pages
                 for page in doc.pages:
@@ -487,8 +628,8 @@ def readPNG(pages:list, png_path:str, bucket=str):
                     # itterate through page tables
                     for table in page.tables: 
                         
-                        # convert trp-table into dataframe object
-                        df = trp2df(table)
+                        # convert table matrix into dataframe object
+                        df = table2df(table)
                         
                         # retrieve balance sheet from table
                         balance_sheet = get_balance_sheet(df)
@@ -543,7 +684,7 @@ def readForm(doc_pages:list) -> dict:
     Parameters
     ----------
     doc_pages : list
-        TRP page(s) for a AWS Textract response object 
+        OCRPage(s) of a document read by AWS Textract (see textract2doc),
         corresponding to pages of a given document page   
     """
     
@@ -576,14 +717,14 @@ def readForm(doc_pages:list) -> dict:
 
 def readText(doc_pages:list) -> dict:
     """
-    Function to transform AWS Textract object to a dictionary 
+    Function to transform OCR pages to a dictionary 
     of text values and accompanying prediction confidence
     from FOCUS reports
     
     Parameters
     ----------
     doc_pages : list
-        TRP page(s) for a AWS Textract response object 
+        OCRPage(s) of a document read by an OCR backend
         corresponding to pages of a given document page
     """
     
@@ -593,17 +734,42 @@ def readText(doc_pages:list) -> dict:
     # iterate through document pages
     for page in doc_pages:
         
-        # itterate through page tables
-        for block in page.blocks: 
-            
-            # if our block type is a line, we map the line text and confidence
-            if block['BlockType'] == "LINE":
-                text_map[block['Text']] = block['Confidence']
+        # we map the text of each line to its confidence
+        for line in page.lines: 
+            text_map[line.text] = line.confidence
     
     # return completed text to confidence map
     return text_map
 
 
+def documentParse(document:OCRDocument, validate=None) -> tuple:
+    """
+    Function returns the balance sheet of a document read by any OCR 
+    backend, as a (pdf_df, png_df, forms_data, text_data, error) tuple
+    
+    Parameters
+    ----------
+    document : OCRDocument
+        A document read by an OCR backend
+        
+    validate : function
+        An optional check applied to the balance sheet DataFrame, 
+        balance sheets failing the check are reported as errors
+    """
+    
+    # perform OCR and return balance sheet with corresponding page object(s)
+    tb_response = readTable(document)
+    
+    if type(tb_response) is not tuple:
+        return (None, None, None, None, 'No Balance Sheet found, or parsing error')
+    
+    df, page_obj, page_num = tb_response
+    if (validate is not None) and (not validate(df)):
+        return (None, None, None, None, 'Balance Sheet failed validation')
+    
+    return (df, None, {}, readText(page_obj), None)
+
+
 """
 OCR Primary Function
 
@@ -640,7 +806,7 @@ def textractParse(pdf_path:str, png_path:str, bucket:str) -> dict:
     if res[0]['JobStatus'] != 'FAILED':
 
         # perform OCR and return balance sheet with corresponding page object(s)
-        tb_response = readTable(res)           
+        tb_response = readTable(textract2doc(res))           
         
         # checks for type of return, if none then we log an error
         if type(tb_response) == tuple:
@@ -674,7 +840,85 @@ def textractParse(pdf_path:str, png_path:str, bucket:str) -> dict:
     
     
 
-def textractParse_pdfs_parallel(pdf_path:str, bucket:str, job_id:str) -> dict:
+@contextmanager
+def jobDocument(job_id:str, cache=None, digest:str=None, early_stop:bool=True, tracker=None, 
+                cache_partial:bool=False):
+    """
+    Context manager yielding the OCRDocument of a Textract job (None if the job 
+    failed), read from the cache if present. Document pages are assembled as 
+    result pages arrive, and completed jobs are cached once the block exits. 
+    Textract errors on the first result page (e.g. an expired job ID) are raised 
+    as TextractError
+    
+    Parameters
+    ----------
+    job_id : str
+        The ID of a finished Textract job (may be None if the response 
+        is found in the cache)
+    cache : TextractCache
+        The cache of raw Textract responses, read first and 
+        written to once the job has succeeded
+    digest : str
+        The cache key of the pdf (see TextractCache.digest)
+    early_stop : bool
+        If True, result pages are fetched lazily and no longer requested once
+        the caller stops reading pages (fewer API calls, bytes and memory),
+        jobs read partially are not cached unless cache_partial is True
+    tracker : TextractPoller.JobPoller or TextractNotify.NotificationListener
+        The tracker the job was scheduled with (see TextractScheduler.py), such
+        that jobs it already resolved are fetched without another status check
+    cache_partial : bool
+        If True, jobs read partially (early stop) are read to the end in the 
+        background such that they are still cached (see waitCacheWrites), 
+        trading the savings of early stop for a complete cache
+    """
+    
+    # temporary data frame object for balance sheet information, read from the cache if present
+    res = cache.get(digest) if (cache is not None and digest is not None) else None
+    cached = res is not None
+    
+    # keep every result page fetched, such that completed jobs can be cached (an error
+    # while streaming leaves the response incomplete, such jobs are never cached)
+    fetched = []
+    failed = []
+    def fetch():
+        try:
+            for response in responses:
+                fetched.append(response)
+                yield response
+        except Exception:
+            failed.append(True)
+            raise
+    
+    # without early stop every result page is fetched before parsing
+    if (res is None) and (not early_stop):
+        res = getJobResults(job_id, tracker)
+    responses = iter(res) if res is not None else iterJobResults(job_id, tracker)
+    
+    stream = fetch()
+    first = next(stream)
+    
+    # if Textract job failed there is nothing to read
+    if first['JobStatus'] == 'FAILED':
+        yield None
+        return
+    
+    yield OCRDocument(streamPages(itertools.chain([first], stream)))
+    
+    # completed jobs are stored, such that parser changes can re-run without new OCR (jobs read
+    # partially are only read to the end in the background, and cached, if cache_partial is True)
+    if (not cached) and (cache is not None and digest is not None) and first['JobStatus'] == 'SUCCEEDED':
+        if len(failed) > 0:
+            return
+        elif res is not None:
+            cache.put(digest, res)
+        elif 'NextToken' not in fetched[-1]:
+            cache.put(digest, fetched)
+        elif cache_partial:
+            cache_writes.append(cache_writer.submit(cacheRemaining, stream, fetched, cache, digest))
+
+def textractParse_pdfs_parallel(pdf_path:str, bucket:str, job_id:str, cache=None, digest:str=None,
+                                early_stop:bool=True, tracker=None, cache_partial:bool=False) -> dict:
     """
     Function  Textract job and returns a DataFrame object
     that matches the conditions to determine a balance sheet
@@ -689,52 +933,76 @@ def textractParse_pdfs_parallel(pdf_path:str, bucket:str, job_id:str) -> dict:
     bucket : str
         The s3 bucket where all data is stored   
     job_id : str
-        Providing job_id that we already ran
+        Providing job_id that we already ran (may be None if the 
+        response is found in the cache)
+    cache : TextractCache
+        The cache of raw Textract responses, read first and 
+        written to once the job has succeeded
+    digest : str
+        The cache key of the pdf (see TextractCache.digest)
+    early_stop : bool
+        If True, result pages are no longer requested once the balance sheet 
+        has been found (see jobDocument)
+    tracker : TextractPoller.JobPoller or TextractNotify.NotificationListener
+        The tracker the job was scheduled with (see TextractScheduler.py)
+    cache_partial : bool
+        If True, jobs read partially are still cached (see jobDocument)
     """
-    errors = ''
     
-    # temporary data frame object for balance sheet information
-    res = getJobResults(job_id)
-    
-    # if Textract job did not fail we continue extraction
-    if res[0]['JobStatus'] != 'FAILED':
-
-        # perform OCR and return balance sheet with corresponding page object(s)
-        try:
-            tb_response = readTable(res)  
-        except Exception as e:
-            return (None, None, None, None, str(e))
-
-        
-        # checks for type of return, if none then we log an error
-        if type(tb_response) == tuple:
-            
-            # deconstruct the table response tuple into dataframe and page object parts
-            df1, page_obj, page_num = tb_response
-            print('\nPage number(s) for extraction in PNG are {}\n'.format(page_num))
-            
-            # try to extract from a PNG (we can still return a None here)
-            df2 = None
-            
-            # provided balance sheet page number we select FORM and TEXT data
-            forms_data = {}     
-            text_data = readText(page_obj)        
-            
-            print('\nTextract-PDF dataframe')
-            print(df1)
+    # Textract errors (e.g. an expired job ID or access denied) are logged for this filing only
+    try:
+        with jobDocument(job_id, cache, digest, early_stop, tracker, cache_partial) as document:
             
+            # if Textract job did not fail we continue extraction
+            if document is None:
+                return (None, None, None, None, 'Could not parse, JOB FAILED')
             
-            return (df1, df2, forms_data, text_data, None)
-        
-        else:
-            error = 'No Balance Sheet found, or parsing error'
-            return (None, None, None, None, error)
-    else:
-        error = 'Could not parse, JOB FAILED'
-        return (None, None, None, None, error)
+            # perform OCR and return balance sheet with corresponding page object(s), the search
+            # stops fetching result pages once the balance sheet is found
+            result = documentParse(document)
+    
+    except TextractError as e:
+        return (None, None, None, None, 'Could not retrieve Textract results, %s' % e)
+    except Exception as e:
+        return (None, None, None, None, str(e))
     
+    if result[-1] is None:
+        print('\nTextract-PDF dataframe')
+        print(result[0])
     
+    return result
     
+    
+    
+
+def cacheRemaining(stream, fetched:list, cache, digest:str):
+    """
+    Reads the remaining result pages of a job read partially (early stop)
+    and stores the complete response in the Textract cache
+    
+    Parameters
+    ----------
+    stream : generator
+        The result pages not yet fetched, each is appended to fetched
+    fetched : list
+        The result pages fetched so far
+    cache : TextractCache
+        The cache of raw Textract responses
+    digest : str
+        The cache key of the pdf (see TextractCache.digest)
+    """
+    try:
+        for _ in stream: pass
+        cache.put(digest, fetched)
+    except Exception as e:
+        print('\tWARNING: could not cache Textract response %s (%s)' % (digest, e))
+
+def waitCacheWrites():
+    """
+    Blocks until every background cache write (see cacheRemaining) has finished
+    """
+    wait(cache_writes)
+    cache_writes.clear()
 
 def readPNG_parallel(pages:list, li_jobids, bucket):
     """
@@ -773,15 +1041,15 @@ def readPNG_parallel(pages:list, li_jobids, bucket):
             if res[0]['JobStatus'] != 'FAILED':
 
                 # format the Textract response type 
-                doc = trp.Document(res)
+                doc = blocks2doc(res)
 
                 # iterate through document pages
                 for page in doc.pages:
                     # iterate through page tables
                     for table in page.tables: 
                         
-                        # convert trp-table into dataframe object
-                        df = trp2df(table)
+                        # convert table matrix into dataframe object
+                        df = table2df(table)
                         
                         # retrieve balance sheet from table
                         balance_sheet = get_balance_sheet(df)
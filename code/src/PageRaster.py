@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+PageRaster.py: Renders the balance sheet pages of X-17A-5 filings to PNG
+images in-process (PyMuPDF pixmaps), writing the PNG bytes directly to a
+storage sink with no intermediate image files
+"""
+
+##################################
+# LIBRARY/PACKAGE IMPORTS
+##################################
+
+import fitz
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from FocusReportSlicing import rankPages
+
+
+##################################
+# USER DEFINED FUNCTIONS
+##################################
+
+def renderPages(content:bytes, pages:list=None, dpi:int=300, grayscale:bool=True) -> list:
+    """
+    Renders pages of an in-memory pdf, returns the PNG contents of each page
+
+    Parameters
+    ----------
+    content : bytes
+        The contents of a pdf file (e.g. a sliced X-17A-5 filing)
+
+    pages : list
+        The page numbers to be rendered, all pages if None
+
+    dpi : int
+        The resolution of the rendered images (pdf pages are 72 dpi)
+
+    grayscale : bool
+        If True pages are rendered in grayscale, which is sufficient for
+        OCR and reduces the size of each image by about a third
+    """
+
+    zoom = fitz.Matrix(dpi / 72, dpi / 72)
+    colorspace = fitz.csGRAY if grayscale else fitz.csRGB
+
+    with fitz.open(stream=content, filetype='pdf') as doc:
+        if pages is None: pages = range(len(doc))
+
+        return [doc[p].getPixmap(matrix=zoom, colorspace=colorspace, alpha=False).getPNGData()
+                for p in pages if p < len(doc)]
+
+def renderCandidates(content:bytes, n_selected:int=None, top_k:int=3, dpi:int=300,
+                     grayscale:bool=True) -> list:
+    """
+    Renders the balance sheet candidates of a sliced filing, returns a list of
+    (page number, PNG contents) pairs with page numbers of the sliced filing
+    
+    Parameters
+    ----------
+    content : bytes
+        The contents of a sliced pdf file (see FocusReportSlicing.sliceBuffer)
+
+    n_selected : int
+        The number of pages selected when the filing was sliced (subset metadata),
+        subsets of at most top_k pages were already ranked and are rendered in full
+
+    top_k : int
+        The number of candidate pages rendered from subsets of the fixed page window
+        (see FocusReportSlicing.rankPages, every page is rendered without a text layer)
+
+    dpi : int
+        The resolution of the rendered images
+
+    grayscale : bool
+        If True pages are rendered in grayscale
+    """
+
+    if n_selected is None:
+        with fitz.open(stream=content, filetype='pdf') as doc: n_selected = len(doc)
+
+    pages = list(range(n_selected))
+    if n_selected > top_k:
+        pages = rankPages(content, top_k=top_k, window=pages)
+
+    return list(zip(pages, renderPages(content, pages, dpi, grayscale)))
+
+def pngKey(path:str, export_folder:str, idx:int) -> str:
+    """
+    Returns the s3 key of a page image corresponding to a filing
+    e.g. pdf/1904-2020-02-26-subset.pdf -> <export_folder>1904-2020-02-26/1904-2020-02-26-p0.png
+    """
+    base_file = path.split('/')[-1].split('.')[0].split('-subset')[0]
+    return export_folder + base_file + '/' + '{}-p{}.png'.format(base_file, idx)
+
+def rasterizeFilings(paths:list, sink, export_folder:str, dpi:int=300, grayscale:bool=True,
+                     top_k:int=3, io_workers:int=8, render_workers:int=None) -> list:
+    """
+    Renders the balance sheet pages of the provided (sliced) filings to PNG
+    images (see renderCandidates), reading and writing to the sink in a
+    thread pool while pages are rendered in a process pool. Returns the list
+    of (path, status) pairs, where status is 'rendered' or 'error: ...'
+
+    Parameters
+    ----------
+    paths : list
+        The keys of the sliced filings e.g. ['pdf/1904-2020-02-26-subset.pdf']
+
+    sink : StorageSink.S3Sink
+        The storage sink from which filings are read and images are written
+
+    export_folder : str
+        The folder where images are stored e.g. 'png/'
+
+    dpi : int
+        The resolution of the rendered images
+
+    grayscale : bool
+        If True pages are rendered in grayscale
+
+    top_k : int
+        The number of candidate pages rendered per filing
+
+    io_workers : int
+        The number of threads reading and writing to the sink
+
+    render_workers : int
+        The number of processes rendering pages (default number of cores)
+    """
+
+    completed = []
+
+    with ProcessPoolExecutor(max_workers=render_workers) as pool:
+
+        def rasterize(path):
+            try:
+                # pages selected when the filing was sliced (see FocusReportSlicing.subsetMetadata)
+                selected = sink.metadata(path).get('selected')
+                n_selected = len(selected.split(',')) if selected else None
+
+                images = pool.submit(renderCandidates, sink.get(path), n_selected, top_k, dpi, grayscale).result()
+                for idx, image in images:
+                    sink.put(pngKey(path, export_folder, idx), image)
+            except Exception as e:
+                return path, 'error: %s' % e
+
+            return path, 'rendered'
+
+        with ThreadPoolExecutor(max_workers=io_workers) as executor:
+            for counter, (path, status) in enumerate(executor.map(rasterize, paths)):
+                completed.append((path, status))
+                print('\t(%d out of %d) %s - %s' % (counter + 1, len(paths), path, status))
+
+    return completed
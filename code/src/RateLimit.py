@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+RateLimit.py: Token-bucket rate limiter shared by all requests made to
+external services (e.g. SEC EDGAR fair-access policy of 10 requests/second)
+and adaptive (AIMD) controller for the number of concurrent Textract jobs
+"""
+
+##################################
+# LIBRARY/PACKAGE IMPORTS
+##################################
+
+import time
+import asyncio
+import threading
+
+
+##################################
+# USER DEFINED CLASSES
+##################################
+
+class TokenBucket:
+    """
+    Token-bucket limiter that is safe to share between threads and
+    asyncio tasks, tokens refill continuously at `rate` per second up
+    to a maximum of `capacity` tokens (the permitted burst size)
+
+    Parameters
+    ----------
+    rate : float
+        The number of tokens (requests) added to the bucket per second
+
+    capacity : float
+        The maximum number of tokens held in the bucket, default is
+        equal to the rate (i.e. at most one second worth of burst)
+    """
+
+    def __init__(self, rate:float, capacity:float=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate:float, capacity:float=None):
+        """
+        Changes the refill rate (and capacity) of the bucket
+        """
+        with self.lock:
+            self.rate = float(rate)
+            self.capacity = float(capacity if capacity is not None else rate)
+            self.tokens = min(self.tokens, self.capacity)
+
+    def reserve(self, tokens:float=1) -> float:
+        """
+        Reserves tokens from the bucket and returns the number of
+        seconds the caller must wait before the reservation is valid
+        """
+        with self.lock:
+            now = time.monotonic()
+
+            # refill tokens for the time elapsed since the last reservation
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            # a negative balance represents reservations queued for the future
+            self.tokens -= tokens
+            if self.tokens >= 0: return 0.0
+            return -self.tokens / self.rate
+
+    def wait(self, tokens:float=1):
+        """
+        Blocks the current thread until tokens are available
+        """
+        delay = self.reserve(tokens)
+        if delay > 0: time.sleep(delay)
+
+    async def wait_async(self, tokens:float=1):
+        """
+        Suspends the current asyncio task until tokens are available
+        """
+        delay = self.reserve(tokens)
+        if delay > 0: await asyncio.sleep(delay)
+
+class AIMDController:
+    """
+    Additive-increase/multiplicative-decrease controller for the number of
+    concurrent jobs, the limit grows while submissions succeed and is cut
+    when the service reports its concurrency limit was exceeded (at most
+    once per cooldown, since one overshoot throttles several submissions)
+
+    Parameters
+    ----------
+    initial : int
+        The starting number of concurrent jobs
+
+    cap : int
+        The hard maximum number of concurrent jobs (e.g. the account limit)
+
+    floor : int
+        The minimum number of concurrent jobs
+
+    increase : float
+        The number of jobs added to the limit after a full window (i.e. `limit`
+        successive submissions) of successful submissions
+
+    decrease : float
+        The factor applied to the limit after a throttled submission
+
+    cooldown : float
+        The minimum number of seconds between two cuts of the limit
+    """
+
+    def __init__(self, initial:int=100, cap:int=300, floor:int=1, increase:float=1,
+                 decrease:float=0.5, cooldown:float=10):
+        self.cap = cap
+        self.floor = floor
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+
+        self.value = float(max(floor, min(cap, initial)))
+        self.peak = self.value
+        self.submitted = 0
+        self.throttled = 0
+        self.cut = -float('inf')
+        self.lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        with self.lock:
+            return int(self.value)
+
+    def success(self):
+        """
+        Records a successful submission, growing the limit additively
+        """
+        with self.lock:
+            self.submitted += 1
+            self.value = min(self.cap, self.value + self.increase / self.value)
+            self.peak = max(self.peak, self.value)
+
+    def throttle(self):
+        """
+        Records a throttled submission, cutting the limit multiplicatively
+        """
+        with self.lock:
+            self.throttled += 1
+
+            now = time.monotonic()
+            if now - self.cut < self.cooldown: return
+            self.cut = now
+
+            self.value = max(self.floor, self.value * self.decrease)
+            print('\tConcurrency limit exceeded, reducing concurrent jobs to %d' % self.value)
+
+    def metrics(self) -> dict:
+        """
+        Returns the current and peak limit, and the share of throttled submissions
+        """
+        with self.lock:
+            attempts = self.submitted + self.throttled
+            return {'limit': int(self.value), 'peak': int(self.peak), 'submitted': self.submitted,
+                    'throttled': self.throttled,
+                    'throttle rate': self.throttled / attempts if attempts > 0 else 0.0}
+
+    def report(self):
+        """
+        Prints the current and peak limit, and the share of throttled submissions
+        """
+        metrics = self.metrics()
+        metrics['throttle rate'] *= 100
+        print('\tConcurrent jobs: %(limit)d (peak %(peak)d), %(submitted)d submitted, '
+              'throttle rate %(throttle rate).1f%%' % metrics)
+
+
+##################################
+# GLOBAL VARIABLES
+##################################
+
+# SEC fair-access policy allows for at most 10 requests per second across all machines
+# https://www.sec.gov/os/accessing-edgar-data
+sec_limiter = TokenBucket(rate=10)
+
+# Textract API calls (job submission, status checks and result pages) share one budget
+# to avoid throttling, see https://docs.aws.amazon.com/textract/latest/dg/limits.html
+textract_limiter = TokenBucket(rate=5)
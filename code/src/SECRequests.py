@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+SECRequests.py: Shared HTTP client for all requests made to the SEC,
+providing keep-alive connection pooling, exponential backoff with jitter
+(on 429 and 5xx responses only), a global request-rate ceiling and
+per-request latency/bytes counters, for both blocking and asyncio requests
+"""
+
+##################################
+# LIBRARY/PACKAGE IMPORTS
+##################################
+
+import time
+import random
+import asyncio
+import threading
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+# shared rate limiter for SEC requests
+from RateLimit import TokenBucket, sec_limiter
+
+
+##################################
+# USER DEFINED CLASSES
+##################################
+
+class SECClient:
+    """
+    Pooled HTTP client for the SEC website and EDGAR archive, a single
+    instance is meant to be shared by every request made by the crawler
+
+    Parameters
+    ----------
+    limiter : TokenBucket
+        The rate limiter shared across requests (default SEC fair-access rate)
+
+    pool_size : int
+        The number of keep-alive connections kept open per host
+
+    max_tries : int
+        The number of attempts made on 429 and 5xx responses (or connection
+        errors) before the last response is returned
+
+    backoff : float
+        The base delay in seconds for exponential backoff, the delay for
+        attempt n is drawn uniformly from [0, min(max_backoff, backoff * 2^n)]
+
+    max_backoff : float
+        The maximum delay in seconds between two attempts
+
+    timeout : float
+        The number of seconds to wait for the server before giving up
+    """
+
+    retry_status = (429, 500, 502, 503, 504)
+
+    def __init__(self, limiter:TokenBucket=sec_limiter, pool_size:int=20, max_tries:int=8,
+                 backoff:float=0.5, max_backoff:float=60, timeout:float=60):
+        self.limiter = limiter
+        self.max_tries = max_tries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+
+        # keep-alive connections are re-used across requests (retries are handled by the client)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.lock = threading.Lock()
+        self.reset_metrics()
+
+    def reset_metrics(self):
+        with self.lock:
+            self.metrics = {'requests': 0, 'retries': 0, 'errors': 0, 'bytes': 0, 'latency': 0.0}
+
+    def report(self) -> dict:
+        """
+        Returns the request counters along with the average latency (seconds)
+        """
+        with self.lock:
+            report = dict(self.metrics)
+        report['mean-latency'] = report['latency'] / max(report['requests'], 1)
+        return report
+
+    def record(self, latency:float, nbytes:int=0, retry:bool=False, error:bool=False):
+        with self.lock:
+            self.metrics['requests'] += 1
+            self.metrics['latency'] += latency
+            self.metrics['bytes'] += nbytes
+            self.metrics['retries'] += int(retry)
+            self.metrics['errors'] += int(error)
+
+    def delay(self, attempt:int, response=None) -> float:
+        """
+        Computes the backoff delay for an attempt, honoring the Retry-After header
+        (of a requests or aiohttp response)
+        """
+        if response is not None and response.headers.get('Retry-After', '').isdigit():
+            return float(response.headers['Retry-After'])
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def get(self, url:str, company_email:str, headers:dict=None, stream:bool=False) -> requests.Response:
+        """
+        Requests a URL from the SEC, returns the response object (the last
+        response received if all attempts were exhausted) or None if no
+        response could be retrieved
+
+        Parameters
+        ----------
+        url : str
+            The SEC URL to request
+        company_email : str
+            The company email belonging to the user e.g. mathias.andler@ny.frb.org
+        headers : dict
+            Additional headers to send along with the User-Agent
+        stream : bool
+            If True the body is not downloaded until accessed
+        """
+
+        request_headers = {'User-Agent': 'Company Name ' + company_email}
+        if headers is not None: request_headers.update(headers)
+
+        response = None
+        for attempt in range(self.max_tries):
+            self.limiter.wait()
+            start = time.monotonic()
+
+            try:
+                response = self.session.get(url, headers=request_headers, stream=stream,
+                                            allow_redirects=True, timeout=self.timeout)
+            except requests.RequestException as e:
+                self.record(time.monotonic() - start, retry=attempt > 0, error=True)
+                print('\t\tWARNING: request to %s failed (%s)' % (url, e))
+                time.sleep(self.delay(attempt))
+                continue
+
+            # streamed bodies are not read yet, we rely on the reported content length
+            nbytes = int(response.headers.get('Content-Length', 0)) if stream else len(response.content)
+            self.record(time.monotonic() - start, nbytes, retry=attempt > 0,
+                        error=response.status_code >= 400)
+
+            # only throttling and server errors are retried, everything else is returned
+            if response.status_code not in self.retry_status:
+                return response
+
+            time.sleep(self.delay(attempt, response))
+
+        return response
+
+    async def get_async(self, session:aiohttp.ClientSession, url:str, company_email:str,
+                        headers:dict=None) -> tuple:
+        """
+        Asynchronous counterpart to get() made through an aiohttp session, sharing
+        the rate limiter, backoff policy and counters of the client. Returns the
+        (status, body text) of the last response received, (None, None) if no
+        response could be retrieved
+
+        Parameters
+        ----------
+        session : aiohttp.ClientSession
+            The client session shared across all concurrent requests
+        url : str
+            The SEC URL to request
+        company_email : str
+            The company email belonging to the user e.g. mathias.andler@ny.frb.org
+        headers : dict
+            Additional headers to send along with the User-Agent
+        """
+
+        request_headers = {'User-Agent': 'Company Name ' + company_email}
+        if headers is not None: request_headers.update(headers)
+
+        status, text = None, None
+        for attempt in range(self.max_tries):
+            await self.limiter.wait_async()
+            start = time.monotonic()
+
+            try:
+                async with session.get(url, headers=request_headers, allow_redirects=True) as response:
+                    status = response.status
+                    text = await response.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self.record(time.monotonic() - start, retry=attempt > 0, error=True)
+                print('\t\tWARNING: request to %s failed (%s)' % (url, e))
+                await asyncio.sleep(self.delay(attempt))
+                continue
+
+            self.record(time.monotonic() - start, len(text.encode()), retry=attempt > 0, error=status >= 400)
+
+            # only throttling and server errors are retried, everything else is returned
+            if status not in self.retry_status:
+                return status, text
+
+            await asyncio.sleep(self.delay(attempt, response))
+
+        return status, text
+
+
+##################################
+# GLOBAL VARIABLES
+##################################
+
+# client shared by every request made to the SEC website and EDGAR archive
+sec_client = SECClient()
+
+
+##################################
+# USER DEFINED FUNCTIONS
+##################################
+
+def secGet(url:str, company_email:str, headers:dict=None, stream:bool=False) -> requests.Response:
+    """
+    Requests a URL from the SEC through the shared client (see SECClient.get)
+    """
+    return sec_client.get(url, company_email, headers=headers, stream=stream)
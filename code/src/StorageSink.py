@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+StorageSink.py: Storage sinks that write in-memory file contents straight
+to their destination (an s3 bucket or a local folder) without staging
+files on the local disk
+"""
+
+##################################
+# LIBRARY/PACKAGE IMPORTS
+##################################
+
+import io
+import os
+import json
+
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+
+##################################
+# USER DEFINED CLASSES
+##################################
+
+class S3Sink:
+    """
+    Writes file contents to an s3 bucket, contents larger than the chunk
+    size are sent as a multipart upload reading at most max_concurrency
+    chunks at a time (bounding the memory used by each upload)
+
+    Parameters
+    ----------
+    s3_bucket : str
+        The s3 bucket where all data is stored
+
+    s3_pointer : boto3.client
+        The s3 client used to read and write files in the bucket
+
+    chunk_size : int
+        The size in bytes of each part of a multipart upload (default 8MB)
+
+    max_concurrency : int
+        The number of parts uploaded concurrently for a single file
+    """
+
+    def __init__(self, s3_bucket:str, s3_pointer, chunk_size:int=8*1024**2, max_concurrency:int=4):
+        self.s3_bucket = s3_bucket
+        self.s3_pointer = s3_pointer
+        self.config = TransferConfig(multipart_threshold=chunk_size, multipart_chunksize=chunk_size,
+                                     max_concurrency=max_concurrency)
+
+    def put(self, key:str, content, metadata:dict=None):
+        """
+        Writes contents (bytes or a readable file object) under the provided key,
+        metadata (e.g. {'pages': 40}) is stored as s3 object metadata
+        """
+        if isinstance(content, (bytes, bytearray)): content = io.BytesIO(content)
+        extra_args = {'Metadata': {k: str(v) for k, v in metadata.items()}} if metadata else None
+        self.s3_pointer.upload_fileobj(content, self.s3_bucket, key, ExtraArgs=extra_args, Config=self.config)
+
+    def get(self, key:str) -> bytes:
+        """
+        Reads the contents stored under the provided key
+        """
+        return self.s3_pointer.get_object(Bucket=self.s3_bucket, Key=key)['Body'].read()
+
+    def exists(self, key:str) -> bool:
+        """
+        Determines whether contents are stored under the provided key
+        """
+        try:
+            self.s3_pointer.head_object(Bucket=self.s3_bucket, Key=key)
+            return True
+        except ClientError:
+            return False
+
+    def metadata(self, key:str) -> dict:
+        """
+        Reads the metadata stored alongside the contents of the provided key
+        """
+        return self.s3_pointer.head_object(Bucket=self.s3_bucket, Key=key).get('Metadata', {})
+
+class LocalSink:
+    """
+    Writes file contents to a local folder, mirroring the s3 key structure
+    (e.g. for offline runs or testing)
+
+    Parameters
+    ----------
+    folder : str
+        The local folder under which all keys are written
+    """
+
+    def __init__(self, folder:str):
+        self.folder = folder
+
+    def put(self, key:str, content, metadata:dict=None):
+        """
+        Writes contents (bytes or a readable file object) under the provided key,
+        metadata (e.g. {'pages': 40}) is stored alongside as <key>.json
+        """
+        path = os.path.join(self.folder, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        if not isinstance(content, (bytes, bytearray)): content = content.read()
+        with open(path, 'wb') as f: f.write(content)
+
+        if metadata:
+            with open(path + '.json', 'w') as f: json.dump(metadata, f)
+
+    def get(self, key:str) -> bytes:
+        """
+        Reads the contents stored under the provided key
+        """
+        with open(os.path.join(self.folder, key), 'rb') as f: return f.read()
+
+    def exists(self, key:str) -> bool:
+        """
+        Determines whether contents are stored under the provided key
+        """
+        return os.path.isfile(os.path.join(self.folder, key))
+
+    def metadata(self, key:str) -> dict:
+        """
+        Reads the metadata stored alongside the contents of the provided key
+        """
+        path = os.path.join(self.folder, key) + '.json'
+        if not os.path.isfile(path): return {}
+        with open(path, 'r') as f: return json.load(f)
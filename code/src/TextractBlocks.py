@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+TextractBlocks.py: Direct converter from the AWS Textract block graph to the
+normalized document model of OCRModel.py, blocks are indexed by Id once and
+every TABLE is emitted as a numpy object matrix (replacing trp + trp2df)
+"""
+
+##################################
+# LIBRARY/PACKAGE IMPORTS
+##################################
+
+import numpy as np
+
+from OCRModel import OCRWord, OCRLine, OCRTable, OCRPage, OCRDocument
+
+
+##################################
+# USER DEFINED FUNCTIONS
+##################################
+
+def children(block:dict, block_map:dict) -> list:
+    """
+    Returns the CHILD blocks of a block (e.g. the CELLs of a TABLE)
+    """
+    return [block_map[cid] for rs in block.get('Relationships') or [] if rs['Type'] == 'CHILD'
+            for cid in rs['Ids'] if cid in block_map]
+
+def cellText(cell:dict, block_map:dict) -> str:
+    """
+    Returns the text of a CELL block, words are separated by spaces and
+    selection elements read as their status (same text as trp.Cell)
+    """
+    text = ''
+    for child in children(cell, block_map):
+        if child['BlockType'] == 'WORD':
+            text += child['Text'] + ' '
+        elif child['BlockType'] == 'SELECTION_ELEMENT':
+            text += child['SelectionStatus'] + ', '
+
+    return text.strip()
+
+def tableMatrix(table:dict, block_map:dict) -> np.ndarray:
+    """
+    Function designed to convert a TABLE block into an (N X M) object matrix
+    of stripped cell text, cells are placed by their RowIndex/ColumnIndex and
+    positions covered by a spanning cell are left empty
+
+    Parameters
+    ----------
+    table : dict
+        A TABLE block of an AWS Textract response
+
+    block_map : dict
+        Every block of the page (or document) keyed by Id
+    """
+
+    cells = [cell for cell in children(table, block_map) if cell['BlockType'] == 'CELL']
+    if len(cells) == 0:
+        return np.empty((0, 0), dtype=object)
+
+    # zero-based grid positions of every cell (with the last row/column each cell spans)
+    rows = np.array([cell['RowIndex'] for cell in cells]) - 1
+    cols = np.array([cell['ColumnIndex'] for cell in cells]) - 1
+    row_ends = rows + np.array([cell.get('RowSpan', 1) for cell in cells])
+    col_ends = cols + np.array([cell.get('ColumnSpan', 1) for cell in cells])
+
+    arr = np.full((row_ends.max(), col_ends.max()), '', dtype=object)
+    arr[rows, cols] = [cellText(cell, block_map) for cell in cells]
+
+    return arr
+
+def blocks2page(blocks:list, block_map:dict=None) -> OCRPage:
+    """
+    Function designed to convert the blocks of a single document page (the
+    PAGE block followed by its content) into an OCR page object
+
+    Parameters
+    ----------
+    blocks : list
+        The blocks of one page of an AWS Textract response
+
+    block_map : dict
+        Blocks keyed by Id, built from the page blocks if None
+    """
+
+    if block_map is None:
+        block_map = {block['Id']: block for block in blocks if 'Id' in block}
+
+    lines, tables = [], []
+    for block in blocks:
+
+        if block['BlockType'] == 'LINE':
+            # bounding boxes are reported as (left, top, right, bottom) ratios of the page size
+            words = [OCRWord(word['Text'], word['Confidence'],
+                             (word['Geometry']['BoundingBox']['Left'], word['Geometry']['BoundingBox']['Top'],
+                              word['Geometry']['BoundingBox']['Left'] + word['Geometry']['BoundingBox']['Width'],
+                              word['Geometry']['BoundingBox']['Top'] + word['Geometry']['BoundingBox']['Height']))
+                     for word in children(block, block_map) if word['BlockType'] == 'WORD']
+            lines.append(OCRLine(block['Text'], block['Confidence'], words))
+
+        elif block['BlockType'] == 'TABLE':
+            tables.append(OCRTable(tableMatrix(block, block_map)))
+
+    return OCRPage(lines=lines, tables=tables, words=[word for line in lines for word in line.words],
+                   blocks=blocks)
+
+def blocks2doc(response:list) -> OCRDocument:
+    """
+    Function designed to convert an AWS Textract response into an OCR document,
+    blocks are split into pages at each PAGE block (as trp.Document does)
+
+    Parameters
+    ----------
+    response : list
+        An AWS Textract response object corresponding to pages
+        of a given document page
+    """
+
+    # a single response may be passed instead of a list of result pages
+    if isinstance(response, dict): response = [response]
+
+    block_map = {}
+    pages = []
+    for result in response:
+        for block in result.get('Blocks', []):
+            block_map[block['Id']] = block
+
+            # blocks preceding the first PAGE block are ignored
+            if block['BlockType'] == 'PAGE':
+                pages.append([block])
+            elif len(pages) > 0:
+                pages[-1].append(block)
+
+    return OCRDocument([blocks2page(blocks, block_map) for blocks in pages])
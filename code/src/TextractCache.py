@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+TextractCache.py: Content-addressed cache of raw AWS Textract responses,
+keyed by the SHA-256 of the input pdf and the requested feature set, such
+that changes to the balance sheet parser re-run locally without new OCR.
+Subsets are sliced with a fixed /ID (see FocusReportSlicing.sliceBuffer)
+and carry their SHA-256 as metadata, such that re-sliced filings hit the cache
+"""
+
+##################################
+# LIBRARY/PACKAGE IMPORTS
+##################################
+
+import gzip
+import json
+import hashlib
+
+from concurrent.futures import ThreadPoolExecutor
+
+from OCRTextract import textract_features
+
+
+##################################
+# USER DEFINED CLASSES
+##################################
+
+class TextractCache:
+    """
+    Stores the pages returned by getJobResults as gzip-compressed JSON
+    under <folder><sha256>.json.gz in a storage sink
+
+    Parameters
+    ----------
+    sink : StorageSink.S3Sink
+        The storage sink where responses are stored
+
+    folder : str
+        The folder under which responses are stored e.g. 'temp/textract-cache/'
+
+    feature_types : list
+        The Textract features requested for each job (e.g. ['TABLES']),
+        responses for a different feature set are cached separately
+    """
+
+    def __init__(self, sink, folder:str, feature_types:list=textract_features):
+        self.sink = sink
+        self.folder = folder
+        self.feature_types = feature_types
+
+    def digest(self, content:bytes=None, sha256:str=None) -> str:
+        """
+        Returns the cache key of an input pdf for the cached feature set, from
+        its contents or the SHA-256 (hex) of its contents if already known
+        """
+        if sha256 is None: sha256 = hashlib.sha256(content).hexdigest()
+        return hashlib.sha256((sha256 + '|' + ','.join(sorted(self.feature_types))).encode()).hexdigest()
+
+    def path(self, digest:str) -> str:
+        return self.folder + digest + '.json.gz'
+
+    def __contains__(self, digest:str) -> bool:
+        return self.sink.exists(self.path(digest))
+
+    def get(self, digest:str) -> list:
+        """
+        Returns the cached Textract response, None if not present
+        """
+        try:
+            return json.loads(gzip.decompress(self.sink.get(self.path(digest))))
+        except Exception:
+            return None
+
+    def put(self, digest:str, response:list):
+        """
+        Stores a Textract response, only completed jobs should be cached
+        """
+        self.sink.put(self.path(digest), gzip.compress(json.dumps(response).encode()))
+
+    def digests(self, pdf_paths:list, workers:int=8) -> dict:
+        """
+        Returns the cache keys of pdfs stored in the sink, keyed by their path
+        (pdfs that could not be read are left out). The SHA-256 recorded in the
+        metadata of each subset is used, only legacy subsets are read and hashed
+        """
+
+        def digest(pdf_path):
+            try:
+                sha256 = self.sink.metadata(pdf_path).get('sha256')
+                if sha256 is not None: return pdf_path, self.digest(sha256=sha256)
+                return pdf_path, self.digest(self.sink.get(pdf_path))
+            except Exception:
+                return pdf_path, None
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return {path: d for path, d in executor.map(digest, pdf_paths) if d is not None}
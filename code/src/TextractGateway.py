@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+TextractGateway.py: Single entry point for every AWS Textract API call, holding
+one pooled client (with adaptive retries), classifying throttling, transient and fatal errors
+and recording call counts, latency histograms and billed pages per API
+"""
+
+##################################
+# LIBRARY/PACKAGE IMPORTS
+##################################
+
+import time
+import bisect
+import threading
+
+import boto3
+
+from botocore.config import Config
+from botocore.exceptions import ClientError, ConnectionError
+
+# shared API-call budget for Textract requests
+from RateLimit import TokenBucket, textract_limiter
+
+
+##################################
+# USER DEFINED CLASSES
+##################################
+
+class TextractError(Exception):
+    """
+    Fatal Textract error (e.g. invalid document or job ID), retrying will not help
+    """
+
+    def __init__(self, api:str, code:str, message:str):
+        super().__init__('%s failed with %s: %s' % (api, code, message))
+        self.api = api
+        self.code = code
+
+class TextractThrottled(TextractError):
+    """
+    Textract kept throttling for longer than the gateway waits
+    """
+
+class TextractUnavailable(TextractError):
+    """
+    Textract kept failing transiently (server errors) for longer than the gateway waits
+    """
+
+class TextractGateway:
+    """
+    Wraps a Textract client shared by every thread, each call draws from the
+    shared API budget, throttling errors are retried with exponential backoff
+    (on top of the botocore adaptive retry mode) and metrics are kept per API
+
+    Parameters
+    ----------
+    limiter : TokenBucket
+        The API-call budget shared by every Textract request
+
+    max_pool_connections : int
+        The number of HTTP connections kept open by the client (should be at
+        least the number of threads calling Textract concurrently)
+
+    max_attempts : int
+        The number of attempts made by botocore for each call (adaptive mode),
+        calls made with retry=False are attempted once by a separate client
+
+    max_wait : float
+        The number of seconds the gateway keeps retrying a throttled call
+        (after botocore gave up) before raising TextractThrottled (or
+        TextractUnavailable for transient server errors)
+    """
+
+    # errors worth retrying (throttling and transient server errors), anything else is fatal
+    # https://docs.aws.amazon.com/textract/latest/dg/handling-errors.html
+    throttling_errors = {'ThrottlingException', 'ProvisionedThroughputExceededException', 'LimitExceededException'}
+    transient_errors = {'InternalServerError', 'ServiceUnavailableException'}
+    retryable_errors = throttling_errors | transient_errors
+
+    # upper bounds (in seconds) of the latency histogram buckets
+    latency_buckets = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float('inf')]
+
+    def __init__(self, limiter:TokenBucket=textract_limiter, max_pool_connections:int=50,
+                 max_attempts:int=10, max_wait:float=600):
+        self.limiter = limiter
+        self.max_pool_connections = max_pool_connections
+        self.max_attempts = max_attempts
+        self.max_wait = max_wait
+
+        self.client_ = None
+        self.single_client_ = None
+        self.metrics = {}       # api -> {'calls', 'errors', 'throttled', 'transient', 'seconds', 'latency'}
+        self.billed = {}        # job_id -> pages analyzed by the job
+        self.lock = threading.Lock()
+
+    def configure(self, max_pool_connections:int=None, max_attempts:int=None, max_wait:float=None):
+        """
+        Changes the client settings, the client is rebuilt on the next call
+        """
+        with self.lock:
+            if max_pool_connections is not None: self.max_pool_connections = max_pool_connections
+            if max_attempts is not None: self.max_attempts = max_attempts
+            if max_wait is not None: self.max_wait = max_wait
+            self.client_ = None
+            self.single_client_ = None
+
+    @property
+    def client(self):
+        # boto3 clients are thread-safe, a single client (and connection pool) is shared
+        with self.lock:
+            if self.client_ is None:
+                config = Config(max_pool_connections=self.max_pool_connections,
+                                retries={'max_attempts': self.max_attempts, 'mode': 'adaptive'})
+                self.client_ = boto3.client('textract', config=config)
+            return self.client_
+
+    @property
+    def single_client(self):
+        # calls that must not be retried are attempted once, such that throttling reaches the caller
+        # right away (and the adaptive send rate of the shared client, used by polls, is left untouched)
+        with self.lock:
+            if self.single_client_ is None:
+                config = Config(max_pool_connections=self.max_pool_connections,
+                                retries={'max_attempts': 1, 'mode': 'standard'})
+                self.single_client_ = boto3.client('textract', config=config)
+            return self.single_client_
+
+    def record(self, api:str, seconds:float, error:str=None):
+        with self.lock:
+            if api not in self.metrics:
+                self.metrics[api] = {'calls': 0, 'errors': 0, 'throttled': 0, 'transient': 0, 'seconds': 0.0,
+                                     'latency': [0] * len(self.latency_buckets)}
+            metric = self.metrics[api]
+
+            metric['calls'] += 1
+            metric['seconds'] += seconds
+            metric['latency'][bisect.bisect_left(self.latency_buckets, seconds)] += 1
+
+            if error in self.throttling_errors: metric['throttled'] += 1
+            elif error in self.transient_errors: metric['transient'] += 1
+            elif error is not None: metric['errors'] += 1
+
+    def call(self, api:str, retry:bool=True, **kwargs) -> dict:
+        """
+        Calls a Textract API (e.g. 'start_document_analysis') with keyword
+        arguments, returns the response or raises TextractError. If retry is
+        False the call is attempted once and throttling raises TextractThrottled
+        (e.g. such that a caller adapts its concurrency, see RateLimit.AIMDController),
+        transient server errors raise TextractUnavailable once retries are exhausted
+        """
+        delay = 1
+        start = time.monotonic()
+        client = self.client if retry else self.single_client
+
+        while True:
+            self.limiter.wait()
+            tic = time.monotonic()
+
+            try:
+                response = getattr(client, api)(**kwargs)
+            except ClientError as e:
+                code = e.response['Error']['Code']
+                self.record(api, time.monotonic() - tic, code)
+
+                if code not in self.retryable_errors:
+                    raise TextractError(api, code, e.response['Error'].get('Message', '')) from e
+            except ConnectionError:
+                code = 'ServiceUnavailableException'
+                self.record(api, time.monotonic() - tic, code)
+            else:
+                self.record(api, time.monotonic() - tic)
+                break
+
+            # throttled (or transiently failing) calls are retried with exponential backoff until max_wait
+            if not retry or time.monotonic() - start + delay > self.max_wait:
+                if code in self.throttling_errors:
+                    raise TextractThrottled(api, code, 'still throttled after %d seconds' % (time.monotonic() - start))
+                raise TextractUnavailable(api, code, 'still failing after %d seconds' % (time.monotonic() - start))
+
+            time.sleep(delay)
+            delay = min(2 * delay, 60)
+
+        # every page analyzed by a finished job is billed once
+        if 'DocumentMetadata' in response and response.get('JobStatus') in ('SUCCEEDED', 'PARTIAL_SUCCESS'):
+            with self.lock:
+                self.billed[kwargs['JobId']] = response['DocumentMetadata']['Pages']
+
+        return response
+
+    def summary(self) -> dict:
+        """
+        Returns the metrics recorded for every API, with the latency histogram
+        keyed by bucket upper bound e.g. {'<=0.5s': 12, ...}
+        """
+        with self.lock:
+            summary = {}
+            for api, metric in self.metrics.items():
+                summary[api] = {'calls': metric['calls'], 'errors': metric['errors'],
+                                'throttled': metric['throttled'], 'transient': metric['transient'],
+                                'mean latency': metric['seconds'] / metric['calls'],
+                                'latency': {'<=%gs' % bound: n for bound, n
+                                            in zip(self.latency_buckets, metric['latency']) if n > 0}}
+
+            summary['billed pages'] = sum(self.billed.values())
+            return summary
+
+    def report(self):
+        """
+        Prints the metrics recorded for every API
+        """
+        summary = self.summary()
+        print('\nTextract API usage (%d billed pages)' % summary.pop('billed pages'))
+
+        for api, metric in summary.items():
+            print('\t%-25s %6d calls, %4d errors, %4d throttled, %4d transient, %.2fs mean latency' % (
+                api, metric['calls'], metric['errors'], metric['throttled'], metric['transient'],
+                metric['mean latency']))
+            print('\t%-25s %s' % ('', metric['latency']))
+
+
+##################################
+# GLOBAL VARIABLES
+##################################
+
+# gateway shared by every OCR entry point (see OCRTextract.py)
+textract_gateway = TextractGateway()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+TextractNotify.py: Notification-driven completion of asynchronous AWS Textract
+jobs, Textract publishes job completion to an SNS topic that is drained from
+an SQS queue (or an in-process queue when run offline), such that in-flight
+jobs are resolved exactly when they finish without polling each job
+"""
+
+##################################
+# LIBRARY/PACKAGE IMPORTS
+##################################
+
+import time
+import json
+import queue
+import asyncio
+import threading
+
+import boto3
+
+from concurrent.futures import Future
+
+
+##################################
+# USER DEFINED CLASSES
+##################################
+
+class SQSChannel:
+    """
+    Completion channel backed by AWS, Textract publishes to an SNS topic
+    to which the SQS queue is subscribed (raw or SNS-enveloped delivery)
+
+    Parameters
+    ----------
+    topic_arn : str
+        The SNS topic Textract publishes job completion to
+        e.g. 'arn:aws:sns:us-east-1:123456789012:AmazonTextract-X17A5'
+
+    role_arn : str
+        The IAM role allowing Textract to publish to the SNS topic
+
+    queue_url : str
+        The SQS queue subscribed to the SNS topic
+        e.g. 'https://sqs.us-east-1.amazonaws.com/123456789012/X17A5-textract'
+    """
+
+    def __init__(self, topic_arn:str, role_arn:str, queue_url:str):
+        self.topic_arn = topic_arn
+        self.role_arn = role_arn
+        self.queue_url = queue_url
+        self.client = boto3.client('sqs')
+
+    def notificationChannel(self) -> dict:
+        """
+        Returns the NotificationChannel argument of start_document_analysis
+        """
+        return {'SNSTopicArn': self.topic_arn, 'RoleArn': self.role_arn}
+
+    def receive(self, wait:int=20) -> list:
+        """
+        Long-polls the SQS queue for up to `wait` seconds, returns a list of
+        (job_id, status) for every completion message received (and deletes them)
+        """
+        response = self.client.receive_message(QueueUrl=self.queue_url, MaxNumberOfMessages=10,
+                                               WaitTimeSeconds=wait)
+        completed = []
+
+        for message in response.get('Messages', []):
+            body = json.loads(message['Body'])
+
+            # SNS-enveloped messages carry the Textract notification as a JSON string
+            if 'Message' in body:
+                body = json.loads(body['Message'])
+
+            if 'JobId' in body:
+                completed.append((body['JobId'], body['Status']))
+
+            self.client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=message['ReceiptHandle'])
+
+        return completed
+
+class LocalChannel:
+    """
+    In-process stand-in for the SNS/SQS channel, completions are published
+    by the caller (e.g. a fake Textract submit function) such that the whole
+    notification flow runs offline
+    """
+
+    def __init__(self):
+        self.messages = queue.Queue()
+
+    def notificationChannel(self) -> dict:
+        return None
+
+    def publish(self, job_id:str, status:str='SUCCEEDED'):
+        self.messages.put((job_id, status))
+
+    def receive(self, wait:int=20) -> list:
+        try:
+            completed = [self.messages.get(timeout=wait)]
+        except queue.Empty:
+            return []
+
+        while not self.messages.empty(): completed.append(self.messages.get())
+        return completed
+
+class NotificationListener:
+    """
+    Drop-in replacement for TextractPoller.JobPoller resolving tracked jobs
+    from a completion channel, drained by a single background thread
+
+    Parameters
+    ----------
+    channel : SQSChannel or LocalChannel
+        The channel on which job completions are received
+
+    fallback : TextractPoller.JobPoller
+        The poller to which jobs without a notification after `timeout`
+        seconds are handed (e.g. jobs resumed after their message was
+        consumed by a crashed run), such jobs never resolve if None
+
+    timeout : float
+        The number of seconds a job may run before it is handed to the fallback
+
+    wait : int
+        The number of seconds of each long poll of the channel
+    """
+
+    def __init__(self, channel, fallback=None, timeout:float=900, wait:int=20):
+        self.channel = channel
+        self.fallback = fallback
+        self.timeout = timeout
+        self.wait_time = wait
+
+        self.jobs = {}          # job_id -> {'future', 'callbacks', 'tracked', 'fallback'}
+        self.finished = {}      # job_id -> final status of jobs already resolved (or notified early)
+
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def track(self, job_id:str, pages:int=1, callback=None) -> Future:
+        """
+        Starts tracking a job, returns a future resolved with its final status.
+        The callback (if any) is called with (job_id, status) once the job ends
+        """
+        with self.lock:
+
+            # jobs that already ended (or were notified before being tracked) are resolved immediately
+            if job_id in self.finished:
+                future = Future()
+                future.set_result(self.finished[job_id])
+                if callback is not None: callback(job_id, self.finished[job_id])
+                return future
+
+            if job_id not in self.jobs:
+                self.jobs[job_id] = {'future': Future(), 'callbacks': [], 'pages': pages,
+                                     'tracked': time.monotonic(), 'fallback': False}
+
+            job = self.jobs[job_id]
+            if callback is not None: job['callbacks'].append(callback)
+
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.loop, daemon=True)
+                self.thread.start()
+
+            return job['future']
+
+    async def wait(self, job_id:str, pages:int=1) -> str:
+        """
+        Suspends the current asyncio task until the job ends, returns its final status
+        """
+        return await asyncio.wrap_future(self.track(job_id, pages))
+
+    def outstanding(self) -> int:
+        with self.lock:
+            return len(self.jobs)
+
+    def resolve(self, job_id:str, status:str):
+        with self.lock:
+            self.finished[job_id] = status
+            job = self.jobs.pop(job_id, None)
+
+        # notifications of jobs not (yet) tracked are kept in self.finished
+        if job is None or job['future'].done(): return
+
+        job['future'].set_result(status)
+        for callback in job['callbacks']: callback(job_id, status)
+
+    def loop(self):
+        while True:
+            with self.lock:
+
+                # the thread exits once no jobs are outstanding (restarted by track)
+                if len(self.jobs) == 0:
+                    self.thread = None
+                    return
+
+            try:
+                completed = self.channel.receive(self.wait_time)
+            except Exception as e:
+                print('\tWARNING: could not receive Textract notifications (%s)' % e)
+                time.sleep(self.wait_time)
+                completed = []
+
+            for job_id, status in completed:
+                self.resolve(job_id, status)
+
+            if self.fallback is None: continue
+
+            # jobs silent for too long are checked by the fallback poller instead
+            now = time.monotonic()
+            with self.lock:
+                stale = [(job_id, job) for job_id, job in self.jobs.items()
+                         if not job['fallback'] and now - job['tracked'] > self.timeout]
+                for job_id, job in stale: job['fallback'] = True
+
+            for job_id, job in stale:
+                print('\tNo notification for Textract job %s, polling instead' % job_id)
+                self.fallback.track(job_id, job['pages'], callback=self.resolve)
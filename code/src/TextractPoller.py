@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+TextractPoller.py: Single completion poller for all in-flight asynchronous
+AWS Textract jobs, checking each job with an adaptive backoff (based on its
+page count and age) while every status call draws from a shared API budget
+(enforced by TextractGateway.py, or by the poller itself if given a limiter)
+"""
+
+##################################
+# LIBRARY/PACKAGE IMPORTS
+##################################
+
+import time
+import heapq
+import asyncio
+import threading
+
+from concurrent.futures import Future
+
+# shared API-call budget for Textract requests
+from RateLimit import TokenBucket
+
+
+##################################
+# USER DEFINED CLASSES
+##################################
+
+class JobPoller:
+    """
+    Tracks outstanding job IDs from a single background thread, resolving
+    a future (and calling an optional callback) with the final job status
+    ('SUCCEEDED', 'PARTIAL_SUCCESS', 'FAILED', or 'EXPIRED' for unknown IDs)
+
+    Parameters
+    ----------
+    check : function
+        Returns the status of a job ID, 'IN_PROGRESS' while the job runs
+
+    limiter : TokenBucket
+        The API-call budget drawn from before each check, None if the check
+        function is already rate limited (e.g. calls through the Textract gateway)
+
+    page_delay : float
+        The expected number of seconds Textract takes per page, used to
+        schedule the first status check of a job
+
+    min_delay : float
+        The minimum number of seconds between two checks of a job
+
+    max_delay : float
+        The maximum number of seconds between two checks of a job
+
+    growth : float
+        The factor by which the delay grows after each unfinished check,
+        such that long-running jobs are checked less and less often
+    """
+
+    def __init__(self, check, limiter:TokenBucket=None, page_delay:float=1.5, min_delay:float=2,
+                 max_delay:float=60, growth:float=1.5):
+        self.check = check
+        self.limiter = limiter
+        self.page_delay = page_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.growth = growth
+
+        self.jobs = {}          # job_id -> {'future', 'callbacks', 'delay', 'submitted'}
+        self.schedule = []      # heap of (next check time, job_id)
+        self.finished = {}      # job_id -> final status of jobs already resolved
+
+        self.condition = threading.Condition()
+        self.thread = None
+
+    def track(self, job_id:str, pages:int=1, callback=None) -> Future:
+        """
+        Starts tracking a job, returns a future resolved with its final status.
+        The callback (if any) is called with (job_id, status) once the job ends
+        """
+        with self.condition:
+
+            # jobs that already ended are resolved immediately
+            if job_id in self.finished:
+                future = Future()
+                future.set_result(self.finished[job_id])
+                if callback is not None: callback(job_id, self.finished[job_id])
+                return future
+
+            if job_id not in self.jobs:
+                now = time.monotonic()
+                first = max(self.min_delay, self.page_delay * pages)
+
+                self.jobs[job_id] = {'future': Future(), 'callbacks': [], 'delay': first, 'submitted': now}
+                heapq.heappush(self.schedule, (now + first, job_id))
+
+            job = self.jobs[job_id]
+            if callback is not None: job['callbacks'].append(callback)
+
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.loop, daemon=True)
+                self.thread.start()
+
+            self.condition.notify()
+            return job['future']
+
+    async def wait(self, job_id:str, pages:int=1) -> str:
+        """
+        Suspends the current asyncio task until the job ends, returns its final status
+        """
+        return await asyncio.wrap_future(self.track(job_id, pages))
+
+    def outstanding(self) -> int:
+        with self.condition:
+            return len(self.jobs)
+
+    def resolve(self, job_id:str, status:str):
+        with self.condition:
+            job = self.jobs.pop(job_id)
+            self.finished[job_id] = status
+
+        job['future'].set_result(status)
+        for callback in job['callbacks']: callback(job_id, status)
+
+    def loop(self):
+        while True:
+            with self.condition:
+
+                # the thread exits once no jobs are outstanding (restarted by track)
+                if len(self.schedule) == 0:
+                    self.thread = None
+                    return
+
+                due, job_id = self.schedule[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self.condition.wait(timeout=wait)
+                    continue
+
+                heapq.heappop(self.schedule)
+
+            # every status call draws from the shared API budget
+            if self.limiter is not None: self.limiter.wait()
+
+            try:
+                status = self.check(job_id)
+            except Exception as e:
+                # expired (or unknown) job IDs can never complete
+                if 'InvalidJobId' in str(e):
+                    self.resolve(job_id, 'EXPIRED')
+                    continue
+
+                print('\tWARNING: could not check Textract job %s (%s)' % (job_id, e))
+                status = 'IN_PROGRESS'
+
+            if status != 'IN_PROGRESS':
+                self.resolve(job_id, status)
+                continue
+
+            # long-running jobs are checked less often (older jobs back off further)
+            with self.condition:
+                job = self.jobs[job_id]
+                job['delay'] = min(self.max_delay, max(self.min_delay, job['delay'] * self.growth))
+                heapq.heappush(self.schedule, (time.monotonic() + job['delay'], job_id))
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+TextractScheduler.py: Sliding-window scheduler for asynchronous AWS Textract
+jobs, keeping a fixed (or adaptive) number of jobs in flight (refilling a slot
+as soon as the poller reports any job finished) and harvesting jobs in completion order.
+Job state is persisted locally such that a crashed run resumes without resubmitting
+"""
+
+##################################
+# LIBRARY/PACKAGE IMPORTS
+##################################
+
+import os
+import json
+import time
+import queue
+
+from TextractGateway import TextractThrottled, TextractUnavailable
+
+
+##################################
+# USER DEFINED CLASSES
+##################################
+
+class JobScheduler:
+    """
+    Schedules one asynchronous job per document key, tracking every job
+    as {key: {'job_id': ..., 'status': ...}} in a local JSON state file
+
+    Parameters
+    ----------
+    submit : function
+        Starts a job for a document key and returns its job ID
+        e.g. lambda key: startJob(s3_bucket, key)
+
+    poller : TextractPoller.JobPoller
+        The poller notifying the scheduler when jobs end
+
+    state_path : str
+        The local JSON file where job state is persisted
+
+    max_in_flight : int
+        The number of concurrent jobs (Textract default is 100 per region)
+
+    pages : function
+        Returns the number of pages of a document key (used by the poller
+        to schedule status checks), every document counts as one page if None
+
+    controller : RateLimit.AIMDController
+        Adapts the number of concurrent jobs (replacing max_in_flight), the
+        submit function should then raise TextractThrottled when throttled
+        e.g. lambda key: startJob(s3_bucket, key, retry=False)
+    """
+
+    # errors raised when the account limit of concurrent jobs is reached
+    concurrency_errors = {'LimitExceededException', 'ProvisionedThroughputExceededException'}
+
+    def __init__(self, submit, poller, state_path:str='textract_jobs.json',
+                 max_in_flight:int=100, pages=None, controller=None):
+        self.submit = submit
+        self.poller = poller
+        self.state_path = state_path
+        self.max_in_flight = max_in_flight
+        self.pages = pages
+        self.controller = controller
+
+        # keys of jobs that ended, in completion order (filled by the poller thread)
+        self.completed = queue.Queue()
+
+        if os.path.isfile(state_path):
+            with open(state_path, 'r') as f: self.state = json.loads(f.read())
+        else:
+            self.state = {}
+
+    def save(self):
+        # write to a temporary file first, such that a crash never leaves a truncated state
+        with open(self.state_path + '.tmp', 'w') as f: json.dump(self.state, f)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    def job_ids(self) -> dict:
+        return {key: job['job_id'] for key, job in self.state.items()}
+
+    def capacity(self) -> int:
+        return self.controller.limit if self.controller is not None else self.max_in_flight
+
+    def start(self, key:str) -> str:
+        """
+        Submits the job of a document key, returns its status ('IN_PROGRESS',
+        'FAILED' or 'THROTTLED' if the job should be submitted again later)
+        """
+
+        # throttled submissions shrink the number of concurrent jobs (the job waits for a free slot),
+        # transient server errors are submitted again later without changing the number of jobs
+        try:
+            job_id = self.submit(key)
+        except (TextractThrottled, TextractUnavailable) as e:
+            if self.controller is not None and e.code in self.concurrency_errors: self.controller.throttle()
+            return 'THROTTLED'
+
+        # any other error is fatal (throttling without a controller is retried by TextractGateway.py)
+        except Exception as e:
+            print('\tCould not start job for %s (%s)' % (key, e))
+            self.state[key] = {'job_id': None, 'status': 'FAILED', 'submitted': time.time()}
+            self.save()
+            return 'FAILED'
+
+        if self.controller is not None: self.controller.success()
+
+        self.state[key] = {'job_id': job_id, 'status': 'IN_PROGRESS', 'submitted': time.time()}
+        self.save()
+        return 'IN_PROGRESS'
+
+    def track(self, key:str):
+        pages = self.pages(key) if self.pages is not None else 1
+        self.poller.track(self.state[key]['job_id'], pages, 
+                          callback=lambda job_id, status: self.completed.put((key, status)))
+
+    def run(self, keys:list):
+        """
+        Runs a job for every document key, yielding (key, job_id, status)
+        as jobs finish (job_id is None for jobs that could not be started). A job is only removed from the state file once the
+        caller has processed it (i.e. asks for the next job), jobs found in
+        the state file from a previous run are resumed, not resubmitted
+        """
+
+        keys = list(dict.fromkeys(keys))
+
+        # jobs of a previous run that finished but were not processed are yielded first
+        done = [key for key in keys if self.state.get(key, {}).get('status', 'IN_PROGRESS') != 'IN_PROGRESS']
+        in_flight = [key for key in keys if self.state.get(key, {}).get('status') == 'IN_PROGRESS']
+        waiting = [key for key in keys if key not in self.state]
+
+        if len(in_flight) > 0:
+            print('Resuming %d Textract jobs from %s' % (len(in_flight), self.state_path))
+            for key in in_flight: self.track(key)
+
+        while len(done) + len(in_flight) + len(waiting) > 0:
+
+            # refill every free slot before waiting on jobs
+            throttled = False
+            while len(waiting) > 0 and len(in_flight) < self.capacity():
+                key = waiting.pop(0)
+                status = self.start(key)
+
+                # throttled jobs are submitted again once a job ends (slots are freed)
+                if status == 'THROTTLED':
+                    waiting.insert(0, key)
+                    throttled = True
+                    break
+
+                # jobs that could not be started are yielded as failed (with no job ID)
+                if status == 'FAILED':
+                    done.append(key)
+                    continue
+
+                self.track(key)
+                in_flight.append(key)
+
+            # harvest finished jobs in completion order
+            for key in done:
+                job = self.state[key]
+                yield key, job['job_id'], job['status']
+
+                del self.state[key]
+                self.save()
+            done = []
+
+            if len(in_flight) == 0:
+                # throttled by jobs outside this run (no job of ours is in flight), wait before submitting again
+                if throttled: time.sleep(10)
+                continue
+
+            # block until any job ends, then collect every other job that ended meanwhile
+            finished = [self.completed.get()]
+            while not self.completed.empty(): finished.append(self.completed.get())
+
+            for key, status in finished:
+                in_flight.remove(key)
+
+                # expired job IDs (e.g. resumed after 7 days) are resubmitted
+                if status == 'EXPIRED':
+                    del self.state[key]
+                    waiting.insert(0, key)
+                    continue
+
+                self.state[key]['status'] = status
+                done.append(key)
+
+            self.save()
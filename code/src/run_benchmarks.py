@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+run_benchmarks.py: Script benchmarking the parsing of recorded AWS Textract
+responses (the gzip JSON files of the Textract cache, see TextractCache.py),
+checking that faster implementations return the same tables as before
+
+    1) Table building: trp + trp2df vs. TextractBlocks.py (blocks2doc + table2df)
+    2) Balance sheet detection: row-wise checks vs. detectBalanceSheets (batched per document)
+
+Recorded responses are read from a local copy of the cache e.g.
+    aws s3 sync s3://<bucket>/temp/textract-cache/ textract-cache/
+"""
+
+##################################
+# LIBRARY/PACKAGE IMPORTS
+##################################
+
+import os
+import re
+import glob
+import gzip
+import json
+import time
+
+import trp
+import numpy as np
+import pandas as pd
+
+from OCRModel import table2df
+from OCRTextract import trp2df, textract2doc, readTable, findBalanceSheet
+from OCRTextract import check_dollar_sign, get_balance_sheet, detectBalanceSheets
+
+
+##################################
+# USER DEFINED FUNCTIONS
+##################################
+
+def loadResponses(folder:str, limit:int=None) -> dict:
+    """
+    Reads recorded Textract responses (<sha256>.json.gz) from a local folder,
+    returns a dictionary of responses keyed by file name
+    """
+    responses = {}
+    for path in sorted(glob.glob(os.path.join(folder, '*.json.gz')))[:limit]:
+        with gzip.open(path, 'rt') as f: responses[os.path.basename(path)] = json.load(f)
+    return responses
+
+def timeit(func, responses:dict, repeat:int=3) -> tuple:
+    """
+    Runs a function on every response (best of `repeat` runs), returns the
+    number of seconds taken and the outputs keyed by response
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        tic = time.perf_counter()
+        outputs = {name: func(response) for name, response in responses.items()}
+        best = min(best, time.perf_counter() - tic)
+    return best, outputs
+
+def sameTables(a:list, b:list) -> bool:
+    return len(a) == len(b) and all(df1.equals(df2) for df1, df2 in zip(a, b))
+
+def benchTables(responses:dict, repeat:int=3):
+    """
+    Benchmarks building every table (and searching for the balance sheet)
+    with trp against the direct block converter of TextractBlocks.py
+    """
+
+    def trp_tables(response):
+        return [trp2df(table) for page in trp.Document(response).pages for table in page.tables]
+
+    def array_tables(response):
+        return [table2df(table) for page in textract2doc(response).pages for table in page.tables]
+
+    def trp_balance_sheet(response):
+        result = findBalanceSheet((page, (trp2df(table) for table in page.tables))
+                                  for page in trp.Document(response).pages)
+        return result[0] if type(result) is tuple else None
+
+    def array_balance_sheet(response):
+        result = readTable(textract2doc(response))
+        return result[0] if type(result) is tuple else None
+
+    print('\n1) Table building (%d responses, best of %d runs)' % (len(responses), repeat))
+
+    t_trp, trp_out = timeit(trp_tables, responses, repeat)
+    t_arr, arr_out = timeit(array_tables, responses, repeat)
+    mismatch = [name for name in responses if not sameTables(trp_out[name], arr_out[name])]
+    print('\tall tables      trp %.3fs, arrays %.3fs (%.1fx), %d mismatches' % (
+        t_trp, t_arr, t_trp / max(t_arr, 1e-9), len(mismatch)))
+
+    t_trp, trp_out = timeit(trp_balance_sheet, responses, repeat)
+    t_arr, arr_out = timeit(array_balance_sheet, responses, repeat)
+    different = [name for name in responses
+                 if not sameTables([df for df in [trp_out[name]] if df is not None],
+                                   [df for df in [arr_out[name]] if df is not None])]
+    print('\tbalance sheet   trp %.3fs, arrays %.3fs (%.1fx), %d mismatches' % (
+        t_trp, t_arr, t_trp / max(t_arr, 1e-9), len(different)))
+
+    mismatch += different
+
+    for name in sorted(set(mismatch)): print('\t\tdifferent tables for %s' % name)
+
+def rowwiseBalanceSheet(df:pd.DataFrame) -> tuple:
+    """
+    Balance sheet detector applying check_dollar_sign to every row (the
+    implementation of get_balance_sheet before detectBalanceSheets)
+    """
+    if not (1 < df.columns.size <= 3): return None
+
+    lineIndex = df.columns[0]
+    assetCheck = df[lineIndex].str.contains('^Cash|asset', regex=True, flags=re.IGNORECASE)
+    debtCheck = df[lineIndex].str.contains('liabilities|liability', regex=True, flags=re.IGNORECASE)
+    dollarCheck = df.apply(check_dollar_sign, axis=1)
+
+    check1 = df[assetCheck == True].empty
+    check2 = df[debtCheck == True].empty
+    check3 = df[dollarCheck == True].empty
+
+    if np.argmax(assetCheck==True) < assetCheck.shape[0]/2:
+        if (check1 == False or check2 == False) and (check3 == False):
+            return (df, check1, check2)
+
+def benchDetector(responses:dict, repeat:int=3):
+    """
+    Benchmarks balance sheet detection over every recorded table, row-wise
+    checks per table against the column-wise checks batched per document
+    """
+
+    # tables are built once, only the detection is timed
+    tables = {name: [table2df(table) for page in textract2doc(response).pages for table in page.tables]
+              for name, response in responses.items()}
+
+    def summary(results):
+        return [None if result is None else (result[1], result[2]) for result in results]
+
+    print('\n2) Balance sheet detection (%d tables, best of %d runs)' % (
+        sum(len(dfs) for dfs in tables.values()), repeat))
+
+    t_row, row_out = timeit(lambda dfs: summary([rowwiseBalanceSheet(df) for df in dfs]), tables, repeat)
+    t_one, one_out = timeit(lambda dfs: summary([get_balance_sheet(df) for df in dfs]), tables, repeat)
+    t_all, all_out = timeit(lambda dfs: summary(detectBalanceSheets(dfs)), tables, repeat)
+
+    mismatch = [name for name in tables if not (row_out[name] == one_out[name] == all_out[name])]
+    print('\trow-wise %.3fs, column-wise per table %.3fs (%.1fx), batched per document %.3fs (%.1fx), '
+          '%d mismatches' % (t_row, t_one, t_row / max(t_one, 1e-9), t_all, t_row / max(t_all, 1e-9), len(mismatch)))
+
+    for name in mismatch: print('\t\tdifferent detections for %s' % name)
+
+
+##################################
+# GLOBAL VARIABLES
+##################################
+
+class Parameters:
+
+    # local folder holding recorded Textract responses (a copy of temp/textract-cache/ on s3)
+    cache_folder = 'textract-cache/'
+
+    # number of responses benchmarked (None for every response) and number of timed runs
+    limit = None
+    repeat = 3
+
+
+##################################
+# MAIN CODE EXECUTION
+##################################
+
+if __name__ == "__main__":
+
+    # the benchmarks are run on the same recorded responses, such that timings are comparable
+    responses = loadResponses(Parameters.cache_folder, Parameters.limit)
+    print('Loaded %d recorded Textract responses from %s' % (len(responses), Parameters.cache_folder))
+
+    benchTables(responses, Parameters.repeat)
+    benchDetector(responses, Parameters.repeat)
@@ -15,7 +15,6 @@ aggregating individual balance sheets from broker-dealers.
 ##################################
 
 import os
-import json
 import botocore
 
 import pandas as pd
@@ -31,6 +30,7 @@ from DatabaseUnstructured import unstructured_wrapper, reorder_columns, extra_co
 from DatabaseStructured import structured_wrapper
 
 from run_file_extraction import brokerFilter
+from CIKStore import openStore
 
 
 ##################################
@@ -182,10 +182,8 @@ def main_p3(s3_bucket, s3_pointer, s3_session, input_folder, temp_folder, out_fo
     
     print('\n========\nStep 7: Creating Unstructured Database\n========\n')
     
-    # retrieving CIK-Dealers JSON file from s3 bucket
-    s3_pointer.download_file(s3_bucket, temp_folder + 'CIKandDealers.json', 'temp.json')
-    with open('temp.json', 'r') as f: cik2brokers = json.loads(f.read())
-    os.remove('temp.json')      
+    # retrieving CIK-Dealers store from s3 bucket (point lookups, if not present locally)
+    cik_store = openStore(s3_bucket, s3_pointer, temp_folder)
     
     # these functions are defined locally to reduce number of variables
     def paral_asset(csv_name_local, csv):
@@ -193,7 +191,7 @@ def main_p3(s3_bucket, s3_pointer, s3_session, input_folder, temp_folder, out_fo
         fileName, filing_date, fiscal_year, cik = extra_cols(csv)
 
         temp_df, total_flag, total_amt = totals_check(pdf_df)
-        export_df = unstructured_data(temp_df, filing_date, fiscal_year, cik, cik2brokers)
+        export_df = unstructured_data(temp_df, filing_date, fiscal_year, cik, cik_store)
         export_df["Total asset"] = total_amt
 
         return export_df
@@ -203,7 +201,7 @@ def main_p3(s3_bucket, s3_pointer, s3_session, input_folder, temp_folder, out_fo
         fileName, filing_date, fiscal_year, cik = extra_cols(csv)
         try:
             temp_df, total_flag, total_amt = totals_check(pdf_df)
-            export_df = unstructured_data(temp_df, filing_date, fiscal_year, cik, cik2brokers)
+            export_df = unstructured_data(temp_df, filing_date, fiscal_year, cik, cik_store)
             export_df["Total liabilities & shareholder's equity"] = total_amt
         except:
             return pd.DataFrame()
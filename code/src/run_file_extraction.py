@@ -15,26 +15,25 @@ from the SEC. We execute the following local scripts:
 # LIBRARY/PACKAGE IMPORTS
 ##################################
 
-import os
-import json
 import datetime
 import numpy as np
 import time
-from joblib import Parallel, delayed
-
-from pdf2image import convert_from_path, pdfinfo_from_path
-from ExtractBrokerDealers import dealerData
-from FocusReportExtract import searchURL, edgarParse, fileExtract, mergePdfs
-from FocusReportSlicing import selectPages, extractSubset, brokerFilter,  to_png
-
-from pdf2image.exceptions import PDFPageCountError, PDFInfoNotInstalledError
+from ExtractBrokerDealers import dealerData, filingManifest, newFilings
+from CIKStore import openStore, saveStore
+from SECRequests import sec_client
+from FocusReportExtract import searchURL, edgarParse
+from FilingPipeline import downloadFilings, backfillSubsets
+from StorageSink import S3Sink
+from PageRaster import rasterizeFilings, pngKey
+from FocusReportSlicing import brokerFilter, subsetKey, subsetWriter
 
 ##################################
 # MAIN CODE EXECUTION
 ##################################
 
 def main_p1(s3_bucket, s3_pointer, s3_session, temp_folder, input_raw, export_pdf, export_png,
-            parse_years, broker_dealers_list, rerun_job, company_email):
+            parse_years, broker_dealers_list, rerun_job, company_email, discovery_mode='index',
+            ocr_top_pages=None, png_dpi=None, png_grayscale=True):
     
     # ==============================================================================
     #                 STEP 1 (Gathering updated broker-dealer list)
@@ -42,38 +41,18 @@ def main_p1(s3_bucket, s3_pointer, s3_session, temp_folder, input_raw, export_pd
     
     print('\n========\nStep 1: Gathering Broker-Dealer Data\n========\n')
     
-    # all s3 files corresponding within folders 
-    temp_paths = s3_session.list_s3_files(s3_bucket, temp_folder)
-    
     # if no years are provided by the user, we default to the full sample
     if len(parse_years) == 0:
         parse_years = np.arange(1993, datetime.datetime.today().year+1)
     
-    # if rerun_job is 1 (previous True), we overwrite our current CIKandDealer information on s3
-    
-    if (temp_folder + 'CIKandDealers.json' in temp_paths) and (rerun_job > 1): 
+    # if rerun_job is 1 (previous True), we overwrite our current CIK store information on s3
+    cik_store = openStore(s3_bucket, s3_pointer, temp_folder, fresh=(rerun_job <= 1))
         
-        # retrieve old information from CIK and Dealers JSON file
-        s3_pointer.download_file(s3_bucket, temp_folder + 'CIKandDealers.json', 'temp.json')
-        with open('temp.json', 'r') as f: old_cik2brokers = json.loads(f.read())
-        
-        # re-assign contents with new additional information 
-        cik2brokers = dealerData(years=parse_years,company_email=company_email, cik2brokers=old_cik2brokers)   
-        os.remove('temp.json')
-        
-    else:
-        # start from scratch to create cik-broker dealer list
-        cik2brokers = dealerData(years=parse_years,company_email=company_email)
-        
-    # write to a local JSON file with accompanying meta information 
-    with open('CIKandDealers.json', 'w') as file:
-        json.dump(cik2brokers, file)
-        file.close()
+    # re-assign contents with new additional information 
+    cik_store = dealerData(years=parse_years, company_email=company_email, cik_store=cik_store)
     
     # save contents to AWS S3 bucket
-    with open('CIKandDealers.json', 'rb') as data:
-        s3_pointer.upload_fileobj(data, s3_bucket, temp_folder + 'CIKandDealers.json')
-    os.remove('CIKandDealers.json')
+    saveStore(cik_store, s3_bucket, s3_pointer, temp_folder)
     
     # ==============================================================================
     #                 STEP 2 (Gathering X-17A-5 Filings)
@@ -81,33 +60,69 @@ def main_p1(s3_bucket, s3_pointer, s3_session, temp_folder, input_raw, export_pd
     
     print('\n========\nStep 2: Gathering X-17A-5 Filings\n========\n')
    
-    input_paths = s3_session.list_s3_files(s3_bucket, input_raw)
-          
     # if no broker-dealers are provided by the user, we default to the full sample
     if len(broker_dealers_list) == 0:
-        broker_dealers_list = cik2brokers['broker-dealers'].keys()
+        broker_dealers_list = cik_store.keys()
+    
+    # if discovery_mode is 'index', we build every (CIK, filing date, accession) from the quarterly 
+    # EDGAR form indexes in one pass, rather than scraping the EDGAR search page for each CIK
+    if discovery_mode == 'index':
+        manifest = filingManifest(years=parse_years, company_email=company_email)
+        
+        # if rerun_job is > 2 we only download filings newer than the watermark of each CIK
+        # (watermarks are seeded once from the filings already present on the s3)
+        if rerun_job > 2:
+            if len(cik_store.watermarks()) == 0:
+                cik_store.seed_watermarks(s3_session.list_s3_files(s3_bucket, input_raw))
+            manifest = newFilings(manifest, cik_store.watermarks())
+        
+        # only broker-dealers with new index entries are visited 
+        cik2filings = dict(tuple(manifest.groupby('CIK')))
+        crawl_list = [cik_id for cik_id in broker_dealers_list if cik_id in cik2filings]
+        input_paths = []
+        
+        print('Found %d new X-17A-5 filings for %d broker-dealers' % (
+            sum(cik2filings[cik_id].shape[0] for cik_id in crawl_list), len(crawl_list)))
+    
+    else:
+        crawl_list = broker_dealers_list
+        input_paths = s3_session.list_s3_files(s3_bucket, input_raw)
 
-    for cik_id in broker_dealers_list:
-        companyName = cik2brokers['broker-dealers'][cik_id]
+    # filings to be downloaded by the pipeline (discovered per broker-dealer below)
+    filings = []
+    
+    for cik_id in crawl_list:
+        companyName = cik_store[cik_id]
         
-        # build lookup URLs to retrieve filing dates and archived url's
-        url = searchURL(cik_id)
-        response = edgarParse(url,company_email)
+        if discovery_mode == 'index':
+            # retrieve filing dates and archived url's from the manifest (most recent filings first)
+            url = 'EDGAR full-index manifest'
+            
+            if cik_id in cik2filings:
+                cik_filings = cik2filings[cik_id]
+                response = (cik_filings['Filing Date'].values, list(cik_filings['Archive URL']))
+            else:
+                response = None
         
-        if type(response) is type(None):
-            for tries in range(2):
-                time.sleep(10)
-                response = edgarParse(url,company_email)
-                if type(response) is not type(None):
-                    break
+        else:
+            # build lookup URLs to retrieve filing dates and archived url's
+            url = searchURL(cik_id)
+            response = edgarParse(url,company_email)
+            
+            if type(response) is type(None):
+                for tries in range(2):
+                    time.sleep(10)
+                    response = edgarParse(url,company_email)
+                    if type(response) is not type(None):
+                        break
         
         if type(response) is not type(None):
             filing_dates, archives = response
 
-            # logging info for when files are being downloaded
-            print('Downloading X-17A-5 files for %s - CIK (%s)' % (companyName, cik_id))
+            # logging info for when files are being queued for download
+            print('Queueing X-17A-5 files for %s - CIK (%s)' % (companyName, cik_id))
             print('\t%s' % url)
-
+            
             # iterate through each of the pdf URLs corresponding to archived contents
             for i, pdf_url in enumerate(archives):
 
@@ -123,37 +138,41 @@ def main_p1(s3_bucket, s3_pointer, s3_session, temp_folder, input_raw, export_pd
                 if (pdf_name in input_paths) and (rerun_job > 2): 
                     print('\tAll files for %s are downloaded' % companyName)
                     break
-
-                else:
-                    # extract all accompanying pdf files, merging all to one large pdf
-                    pdf_files = fileExtract(pdf_url,company_email)
-                    
-                    # make sure we don't return empty lists
-                    if len(pdf_files) > 0:
-                        print('\tExtracting FOCUS filing for %s' % date)
-                        concatPdf = mergePdfs(pdf_files,company_email)
-             
-                        # open file and save to local instance
-                        with open(file_name, 'wb') as f:
-                            try:
-                                concatPdf.write(f)
-                            except:
-                                concatPdf = mergePdfs(pdf_files,company_email, second_pass=True)
-                                concatPdf.write(f)
-                            f.close()
-
-                        # save contents to AWS S3 bucket
-                        with open(file_name, 'rb') as data:
-                            s3_pointer.upload_fileobj(data, s3_bucket, pdf_name)
-                        os.remove(file_name)
-                    
-                    else: print('\tNo files found for %s on %s' % (companyName, date))
+                
+                # accession from the filing detail page e.g. .../0000001904-20-000001-index.htm
+                accession = pdf_url.split('/')[-1].replace('-index.htm', '')
+                filings.append({'cik': cik_id, 'date': date, 'accession': accession, 
+                                'url': pdf_url, 'key': pdf_name})
         
         # identify error in the event edgar parse (web-scrapping returns None)
         else:
             print('WEB-SCRAPPING ERROR: Unable to download %s - CIK (%s), no filing' % (companyName, cik_id))
-            print('We tried %s times' %(tries+2))
-          
+            if discovery_mode != 'index':
+                print('We tried %s times' %(tries+2))
+    
+    # download, merge and upload all filings through the staged pipeline
+    print('\nExtracting %d FOCUS filings' % len(filings))
+    # each filing is sliced while the merged pdf is still in memory, keeping either the top balance
+    # sheet candidates (if ocr_top_pages is provided) or the first twenty pages
+    sink = S3Sink(s3_bucket, s3_pointer)
+    completed = downloadFilings(filings, company_email, sink, 
+                                on_merged=[subsetWriter(sink, export_pdf, pages=range(20), top_k=ocr_top_pages)])
+    sliced = set(filing['key'] for filing in completed if filing['status'] == 'uploaded')
+    
+    # the watermark of a broker-dealer is only advanced once all of its filings are processed
+    failed_ciks = set(filing['cik'] for filing in completed if filing['status'].startswith('error'))
+    for filing in completed:
+        if filing['cik'] not in failed_ciks:
+            cik_store.set_watermark(filing['cik'], filing['date'], filing['accession'])
+    
+    # save watermarks to AWS S3 bucket
+    saveStore(cik_store, s3_bucket, s3_pointer, temp_folder)
+    
+    # report on the requests made to the SEC (counts, retries, bytes and latency)
+    sec_report = sec_client.report()
+    print('\nSEC requests: %d (%d retries, %d errors), %.1f MB downloaded, mean latency %.2fs' % (
+        sec_report['requests'], sec_report['retries'], sec_report['errors'], 
+        sec_report['bytes'] / 1e6, sec_report['mean-latency']))
           
     # ==============================================================================
     #                 STEP 3 (Slice X-17A-5 Filings)
@@ -161,98 +180,47 @@ def main_p1(s3_bucket, s3_pointer, s3_session, temp_folder, input_raw, export_pd
     
     print('\n========\nStep 3: Slicing X-17A-5 Filings\n========\n')
     
-    # re-run input paths post file extraction to update directory
-    input_paths = s3_session.list_s3_files(s3_bucket, input_raw)
-    pdf_paths = s3_session.list_s3_files(s3_bucket, export_pdf)
-    png_paths = s3_session.list_s3_files(s3_bucket, export_png)
+    # if rerun_job is > 3 and the index manifest had no new filings, nothing was ingested and the
+    # subsets (and images) of earlier runs are complete, we skip the s3 listings of this step
+    unchanged = (discovery_mode == 'index') and (rerun_job > 3) and (len(filings) == 0)
     
-    # filter FOCUS reports from the s3 that correspond to list of broker-dealers 
-    raw_broker_dealer_pdfs = list(filter(lambda x: brokerFilter(broker_dealers_list, x), input_paths))
-    number_files = len(raw_broker_dealer_pdfs)
-   
-    for counter, path_name in enumerate(raw_broker_dealer_pdfs):
-        print('Slicing FOCUS report filing for %s' % path_name)
-        print('(%d out of %s)' % (counter,number_files))
+    if unchanged:
+        print('No new FOCUS report filings, skipping slicing')
+    else:
+        # re-run input paths post file extraction to update directory
+        input_paths = s3_session.list_s3_files(s3_bucket, input_raw)
+        pdf_paths = set(s3_session.list_s3_files(s3_bucket, export_pdf))
         
-        # check to see if values are downloaded to s3 sub-bin
-        base_file = path_name.split('/')[-1].split('.')[0]
-        pdf_look_up = export_pdf + base_file + '-subset.pdf'
-        png_look_up = export_png + base_file + '/' + base_file + '-p0.png'
+        # filter FOCUS reports from the s3 that correspond to list of broker-dealers 
+        raw_broker_dealer_pdfs = list(filter(lambda x: brokerFilter(broker_dealers_list, x), input_paths))
         
-        # ---------------------------------------------------------------
-        # PDF FILE DOWNLOAD
-        # ---------------------------------------------------------------
+        # filings ingested during Step 2 were already sliced in memory, only legacy filings are 
+        # backfilled (if rerun_job is > 3 we also skip filings whose subset is already on the s3)
+        legacy_pdfs = [path_name for path_name in raw_broker_dealer_pdfs 
+                       if (path_name not in sliced) and 
+                          not ((subsetKey(path_name, export_pdf) in pdf_paths) and (rerun_job > 3))]
         
-        if (pdf_look_up in pdf_paths) and (rerun_job > 3):
-            print('\t%s already saved pdf' % base_file)
-
-        else: 
-            # retrieving downloaded files from s3 bucket
-            s3_pointer.download_file(s3_bucket, path_name, 'temp.pdf')
-            
-            # run the subset function to save a local subset file (void-function)
-            export_name = base_file + '-subset.pdf'
-            extractSubset(range(20), export_name)        # first twenty pages
-            
-             # save contents to AWS S3 bucket as specified
-            with open(export_name, 'rb') as data:
-                s3_pointer.upload_fileobj(data, s3_bucket, export_pdf + export_name)
-                print('\tSaved pdf files for -> %s' % export_name)
-            
-            # remove local file after it has been created
-            os.remove('temp.pdf')
-            os.remove(export_name)
+        print('Slicing %d legacy FOCUS report filings (%d sliced on ingest)' % (len(legacy_pdfs), len(sliced)))
+        backfillSubsets(legacy_pdfs, sink, export_pdf, pages=range(20), top_k=ocr_top_pages)
+    
+    # ---------------------------------------------------------------
+    # PNG FILE RENDERING
+    # ---------------------------------------------------------------
+    
+    # balance sheet pages of the sliced filings are rendered in-process and written straight to the s3 
+    # (if png_dpi is None we skip this step, the newest version of this code does not use PNGs)
+    if (png_dpi is not None) and not unchanged:
+        # folders of the filings with images (only the balance sheet candidates of a filing are rendered)
+        png_folders = set(key.rsplit('/', 1)[0] for key in s3_session.list_s3_files(s3_bucket, export_png))
+        subset_pdfs = list(filter(lambda x: brokerFilter(broker_dealers_list, x), 
+                                  s3_session.list_s3_files(s3_bucket, export_pdf)))
         
-        # ---------------------------------------------------------------
-        # PNG FILE DOWNLOAD
-        # ---------------------------------------------------------------
+        # if rerun_job is > 3 we skip filings whose images are already on the s3
+        pending_pdfs = [path_name for path_name in subset_pdfs 
+                        if not ((pngKey(path_name, export_png, 0).rsplit('/', 1)[0] in png_folders) and (rerun_job > 3))]
         
-        if (png_look_up in png_paths) and (rerun_job > 3):
-            print('\t%s already saved png' % base_file)
-            
-        else: 
-            # the newest version of this code does not use PNGs. For that reason we do not need to run the time-consuming step of 
-            # converting PDFs to PNGs that is done below
-            continue
-             
-            # retrieving downloaded files from s3 bucket
-            s3_pointer.download_file(s3_bucket, path_name, 'temp.pdf')
-                               
-            try:
-                maxPages = pdfinfo_from_path('temp.pdf', userpw=None, poppler_path=None)["Pages"]
-
-                # determine the iterable size (number of page in document)
-                size = min(maxPages,20)
-                
-                # we temporarily save png files (as .ppm) in the folder: "joblib_pngs". This saves memory and allows multiprocess
-                # convert_from_path is a multiprocess function, but there are no improvements for thread_count > 4
-                
-                li = convert_from_path('temp.pdf', dpi = 500, first_page=0, last_page = size,
-                                        output_folder='joblib_pngs', thread_count=4,
-                                        paths_only = True)
-                
-                Parallel(n_jobs=-1)(delayed(to_png)(li, "joblib_pngs/"+base_file,idx) for idx in range(size))
-                    
-                for idx in range(0,size):                       
-                    # write the png name for exportation
-                    export_file_name_local = "joblib_pngs/{}-p{}.png".format(base_file, idx)
-                    export_file_name_s3 = "{}-p{}.png".format(base_file, idx)
-
-                    with open(export_file_name_local, 'rb') as data:
-                        s3_pointer.upload_fileobj(data, s3_bucket, export_png + base_file + '/' + export_file_name_s3)
-                    os.remove(export_file_name_local)
-                    os.remove(li[idx])
-
-
-                print('\tSaved png files for -> %s' % base_file)
-
-            except PDFPageCountError:
-                print('\tEncountered PDFPageCounterError when trying to convert to PNG for -> %s' % base_file)
-
-            except PDFInfoNotInstalledError:
-                print('\tUnable to get page count, may be a bug in the libpoppler library for PNG.')
-
-    
-            os.remove('temp.pdf')
+        print('\nRendering PNGs for %d FOCUS report filings' % len(pending_pdfs))
+        rasterizeFilings(pending_pdfs, sink, export_png, dpi=png_dpi, grayscale=png_grayscale, 
+                         top_k=ocr_top_pages or 3)
   
-    return broker_dealers_list      
+    return broker_dealers_list
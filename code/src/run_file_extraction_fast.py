@@ -15,14 +15,13 @@ from the SEC. We execute the following local scripts:
 # LIBRARY/PACKAGE IMPORTS
 ##################################
 
-import os
-import json
 import datetime
 import numpy as np
 import time
 
 from pdf2image import convert_from_path, pdfinfo_from_path
 from ExtractBrokerDealers import dealerData
+from CIKStore import openStore, saveStore
 from FocusReportExtract import searchURL, edgarParse, fileExtract, mergePdfs
 from FocusReportSlicing import selectPages, extractSubset, brokerFilter
 
@@ -43,12 +42,11 @@ def main_p1(s3_bucket, s3_pointer, s3_session, temp_folder, input_raw, export_pd
     if len(parse_years) == 0:
         parse_years = np.arange(1993, datetime.datetime.today().year+1)   
         
-    s3_pointer.download_file(s3_bucket, temp_folder + 'CIKandDealers.json', 'temp.json')
-    with open('temp.json', 'r') as f: old_cik2brokers = json.loads(f.read())
+    cik_store = openStore(s3_bucket, s3_pointer, temp_folder)
 
     # re-assign contents with new additional information 
-    cik2brokers = dealerData(years=parse_years,company_email=company_email, cik2brokers=old_cik2brokers)   
-    os.remove('temp.json')
+    cik_store = dealerData(years=parse_years, company_email=company_email, cik_store=cik_store)   
+    saveStore(cik_store, s3_bucket, s3_pointer, temp_folder)
    
     
     # ==============================================================================
@@ -57,7 +55,7 @@ def main_p1(s3_bucket, s3_pointer, s3_session, temp_folder, input_raw, export_pd
     
     print('\n========\nStep 2: Gathering X-17A-5 Filings\n========\n')
 
-    broker_dealers_list = cik2brokers['broker-dealers'].keys()
+    broker_dealers_list = cik_store.keys()
           
           
     # ==============================================================================
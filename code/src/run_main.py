@@ -17,6 +17,7 @@ import sys
 import time
 import numpy as np
 from GLOBAL import GlobVars
+from RateLimit import sec_limiter, textract_limiter
 import os
 
 from run_file_extraction import main_p1
@@ -47,6 +48,40 @@ class Parameters:
     #                   stream=True, allow_redirects=True))
     company_email = 'mathias.andler@ny.frb.org'
     
+    # SECRequests.py -> global ceiling on the number of requests per second made to the SEC
+    #                   across all crawler stages (SEC fair-access policy allows at most 10)
+    sec_request_rate = 10
+    
+    # TextractPoller.py -> global ceiling on the number of Textract API calls per second (job submissions,
+    #                      status checks and result pages), shared such that requests are not throttled
+    textract_request_rate = 5
+    
+    # TextractGateway.py -> number of HTTP connections pooled by the shared Textract client, and number of
+    #                       attempts (adaptive retry mode) made by botocore for each throttled call
+    textract_max_pool_connections = 50
+    textract_max_attempts = 10
+    
+    # RateLimit.py -> hard cap on the number of concurrent Textract jobs, the number of jobs in flight adapts
+    #                 (AIMD) below it. Base on us-east-2 is 100, but our limit has been increased to 300 by 
+    #                 asking AWS help desk
+    textract_max_in_flight = 300
+    
+    # OCRTextract.py -> if True, Textract result pages are fetched lazily and no longer requested once the balance
+    #                   sheet is found (fewer API calls, bytes and memory), such jobs are not stored in the Textract
+    #                   cache. If False every job is read (and cached) in full before parsing
+    textract_early_stop = True
+    
+    # OCRTextract.py -> if True, jobs stopped early are read to the end in the background such that they are still
+    #                   stored in the Textract cache (same API calls as textract_early_stop = False, lower latency)
+    textract_cache_partial = False
+    
+    # TextractNotify.py -> if None every in-flight Textract job is polled for completion, otherwise Textract 
+    #                      publishes completion to an SNS topic subscribed by an SQS queue e.g.
+    #                      {'topic_arn': 'arn:aws:sns:us-east-1:123456789012:AmazonTextract-X17A5',
+    #                       'role_arn': 'arn:aws:iam::123456789012:role/TextractSNSPublish',
+    #                       'queue_url': 'https://sqs.us-east-1.amazonaws.com/123456789012/X17A5-textract'}
+    textract_notify = None
+    
     # ExtractBrokerDealers.py -> help determine the interval range for which 
     #                            we look back historically for broker dealers, 
     #                            default is an empty list 
@@ -72,6 +107,29 @@ class Parameters:
     #              job_rerun > 5: if broker dealer list and parse years are unchanged, this will NOT run Textract again
                       
     job_rerun = 1
+    
+    # FocusReportExtract.py -> determines how X-17A-5 filings are discovered for each broker-dealer
+    #                          'index' builds the filing list from the quarterly EDGAR form indexes (default)
+    #                          'browse' scrapes the EDGAR search page for each CIK (legacy behavior)
+    discovery_mode = 'index'
+    
+    # FocusReportSlicing.py -> number of pages sent to Textract per filing, pages are ranked from the pdf
+    #                          text layer by their likelihood of holding the balance sheet (filings without
+    #                          a text layer fall back to the first 20 pages), None keeps the first 20 pages
+    ocr_top_pages = 3
+    
+    # OCRTextLayer.py -> if True, balance sheets of born-digital filings are read from the pdf text layer 
+    #                    (locally, in parallel), and only the remaining filings are sent to AWS Textract
+    text_layer = True
+    
+    # OCRBackend.py -> OCR engine used for filings not read from the text layer, 'textract' (AWS Textract, see
+    #                  TextractBackend) or 'tesseract' (local engine, for offline or bulk re-processing runs)
+    ocr_backend = 'textract'
+    
+    # PageRaster.py -> resolution (and color) of the PNG images rendered for each sliced filing,
+    #                  None skips rendering PNGs (the newest version of this code only uses PDFs)
+    png_dpi = None
+    png_grayscale = True
 
     # define proxy for external connections. If working on the NIT use:
     # fed_proxy = "http://p1proxy.frb.org:8080"
@@ -88,10 +146,15 @@ if __name__ == "__main__":
     os.environ['http_proxy'] = Parameters.fed_proxy
     os.environ['https_proxy'] = Parameters.fed_proxy
     
+    # global request-rate ceiling shared by every SEC request
+    sec_limiter.set_rate(Parameters.sec_request_rate)
+    textract_limiter.set_rate(Parameters.textract_request_rate)
+    GlobVars.textract.configure(Parameters.textract_max_pool_connections, Parameters.textract_max_attempts)
+    
     
     # creating empty folders for local storage. This could also be done with gitignore files
     li_dir = ['joblib_pngs','unstructured_asset', 'structured_liable','unstructured_liable',
-          'split_assets', 'structured_asset', 'split_liabilities']
+          'split_assets', 'structured_asset', 'split_liabilities', 'form_idx_cache']
 
     for dir_name in li_dir:
         try:
@@ -107,7 +170,8 @@ if __name__ == "__main__":
         Parameters.bucket, GlobVars.s3_pointer, GlobVars.s3_session, 
         GlobVars.temp_folder, GlobVars.input_folder_raw, GlobVars.temp_folder_pdf_slice, 
         GlobVars.temp_folder_png_slice, Parameters.parse_years, Parameters.broker_dealers_list,
-        Parameters.job_rerun, Parameters.company_email
+        Parameters.job_rerun, Parameters.company_email, Parameters.discovery_mode,
+        Parameters.ocr_top_pages, Parameters.png_dpi, Parameters.png_grayscale
            )
      
     # responsible for extracting balance-sheet figures by OCR via AWS Textract
@@ -116,7 +180,8 @@ if __name__ == "__main__":
         GlobVars.temp_folder, GlobVars.temp_folder_pdf_slice, GlobVars.temp_folder_png_slice, 
         GlobVars.temp_folder_raw_pdf, GlobVars.temp_folder_raw_png, GlobVars.textract, 
         GlobVars.temp_folder_clean_pdf, GlobVars.temp_folder_clean_png, Parameters.job_rerun,
-        bk_list
+        bk_list, Parameters.text_layer, Parameters.ocr_backend, Parameters.textract_notify,
+        Parameters.textract_max_in_flight, Parameters.textract_early_stop, Parameters.textract_cache_partial
            )
     
     # responsible for cleaning up block error
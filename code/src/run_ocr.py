@@ -19,9 +19,15 @@ import os
 import json
 import numpy as np
 import pandas as pd
-import time
-from OCRTextract import textractParse, textractParse_pdfs_parallel, startJob
+from OCRTextract import textractParse, startJob, documentParse, textract_poller, waitCacheWrites
+from OCRTextLayer import textLayerParse_parallel
+from OCRBackend import TextractBackend, TesseractBackend
+from TextractCache import TextractCache
+from TextractScheduler import JobScheduler
+from TextractNotify import SQSChannel, NotificationListener
 from OCRClean import clean_wrapper
+from StorageSink import S3Sink
+from RateLimit import AIMDController
 
 from run_file_extraction import brokerFilter
 
@@ -32,7 +38,9 @@ from run_file_extraction import brokerFilter
 
 def main_p2(s3_bucket, s3_pointer, s3_session, temp_folder, input_pdf, input_png, 
             out_folder_raw_pdf, out_folder_raw_png, textract_obj, out_folder_clean_pdf, 
-            out_folder_clean_png, rerun_job, broker_dealers):
+            out_folder_clean_png, rerun_job, broker_dealers, text_layer=True,
+            ocr_backend='textract', textract_notify=None, max_in_flight=300,
+            textract_early_stop=True, textract_cache_partial=False):
     
     print('\n============\nStep 4 & 5: Performing OCR via AWS Textract and Cleaning Operations\n============\n')
     
@@ -109,176 +117,216 @@ def main_p2(s3_bucket, s3_pointer, s3_session, temp_folder, input_pdf, input_png
     else:
         job_ids = {}
     
-    # number of concurrent jobs sent to Textract services. 
-    # Base on us-east-2 is 100, but our limit has been increased to 300 by asking AWS help desk
-    num_concurr_jobs = 100
-    
     # if retry_errors is True, the code will try running Textract on X17A files where it failed before
     retry_errors = False
     
-    for c_min in range(0,len(textract_files), num_concurr_jobs):
-        print('Running Textract from: ' + str(c_min) + ' -' + str(c_min + num_concurr_jobs))
+    # ---------------------------------------------------------------------------
+    # Read filings locally (text layer and/or local OCR backend) across all cores
+    # ---------------------------------------------------------------------------
+    
+    pending = []
+    for pdf_paths in textract_files:
+        basefile = pdf_paths.split('/')[-1].split('-subset')[0]
+        
+        # same check as below to determine if Textract has already been run for this file
+        already_done = out_folder_raw_pdf + basefile + '.csv' in output_pdf_csvs
+        if not retry_errors:
+            already_done = already_done or (basefile in error_dictionary.keys())
+        
+        if not ((already_done) and (rerun_job > 4)):
+            pending.append(pdf_paths)
+    
+    # results of filings read locally, these filings are not sent to Textract
+    local_results = {}
+    sink = S3Sink(s3_bucket, s3_pointer)
+    
+    # Textract is only used when the text layer is missing or the balance sheet fails validation
+    if text_layer:
+        print('Reading %d filings from their text layer' % len(pending))
+        local_results.update(textLayerParse_parallel(pending, sink))
+        print('%d filings read from text layer\n' % len(local_results))
+    
+    # filings sent to the OCR backend (not read from the text layer)
+    remaining = [pdf_paths for pdf_paths in pending 
+                 if pdf_paths.split('/')[-1].split('-subset')[0] not in local_results]
+    print('%d filings have already been Textracted, %d sent to the %s backend\n' % (
+        number_files - len(pending), len(remaining), ocr_backend))
+    
+    # if ocr_backend is 'tesseract' all remaining filings are read by the local OCR engine (offline runs)
+    if ocr_backend == 'tesseract':
+        backend = TesseractBackend(sink)
+    
+    # otherwise the remaining filings are read by AWS Textract, such that filings whose pdf (and feature set) 
+    # were already read are parsed from the content-addressed cache (parser changes re-run without new OCR)
+    else:
+        def subset_pages(pdf_paths):
+            # page count recorded when the filing was sliced, used to pace the status checks of its job
+            try:
+                return int(sink.metadata(pdf_paths).get('subset-pages', 1))
+            except Exception:
+                return 1
+        
+        # if textract_notify is given Textract publishes job completion to SNS (drained from SQS), such that
+        # jobs are resolved when they finish without polling (jobs left silent are polled as a fallback)
+        if textract_notify is not None:
+            channel = SQSChannel(textract_notify['topic_arn'], textract_notify['role_arn'], textract_notify['queue_url'])
+            poller = NotificationListener(channel, fallback=textract_poller)
+        else:
+            channel, poller = None, textract_poller
+        
+        # the number of Textract jobs in flight grows while submissions succeed and is cut when AWS reports
+        # the concurrency limit exceeded (never above max_in_flight, e.g. our raised account limit)
+        controller = AIMDController(initial=min(100, max_in_flight), cap=max_in_flight)
         
-        c_max = min(len(textract_files),c_min + num_concurr_jobs )
-        for counter in range(c_min, c_max):
-            pdf_paths = textract_files[counter]
+        # the scheduler keeps that many Textract jobs in flight, refilling a slot as soon as the poller reports
+        # any job finished, and job state is kept in textract_jobs.json such that a crashed run resumes its jobs
+        scheduler = JobScheduler(submit=lambda key: startJob(s3_bucket, key, channel, retry=False), poller=poller,
+                                 state_path='textract_jobs.json', pages=subset_pages, controller=controller)
+        
+        backend = TextractBackend(scheduler, TextractCache(sink, temp_folder + 'textract-cache/'),
+                                  early_stop=textract_early_stop, cache_partial=textract_cache_partial)
+    
+    def harvest():
+        # filings read locally are processed first (no OCR needed)
+        for pdf_paths in pending:
+            if pdf_paths.split('/')[-1].split('-subset')[0] in local_results:
+                yield pdf_paths, None
+        
+        # filings read by the OCR backend are processed as they are read (Textract jobs in completion order,
+        # result pages are fetched while the balance sheet is searched for)
+        yield from backend.iterAnalyze(remaining)
+    
+    for counter, (pdf_paths, document) in enumerate(harvest()):
+        
+        # baseFile name to name export .csv file e.g. 1224385-2004-03-01.csv
+        basefile = pdf_paths.split('/')[-1].split('-subset')[0]
+        fileName = basefile + '.csv'
+        print('\nPerforming OCR for %s (%d out of %s)' % (fileName,counter,len(pending)))
+        
+        # files already Textracted were filtered above (if rerun_job is < 5 (True) we re-run Textract again)
+        # we extract the parsed data from the local read or the document read by the OCR backend
+        png_paths = input_png + basefile + '/'
+        if basefile in local_results:
+            pdf_df, png_df, forms_data, text_data, error = local_results[basefile]
+        elif document is None:
+            pdf_df, png_df, forms_data, text_data, error = (None, None, None, None, backend.errors[pdf_paths])
+        else:
+            try:
+                pdf_df, png_df, forms_data, text_data, error = documentParse(document)
+            except Exception as e:
+                pdf_df, png_df, forms_data, text_data, error = (None, None, None, None, str(e))
+        
+        # job IDs of filings read by Textract (used by run_ocr_blocks.py)
+        if backend.job_ids.get(pdf_paths) is not None:
+            job_ids[basefile] = backend.job_ids[pdf_paths]
+
+        # if no error is reported we save FORMS, TEXT, DataFrame
+        if error is None:
+
+            # store accompanying information for JSONs
+            forms_dictionary[basefile] = forms_data
+            text_dictionary[basefile]  = text_data
+
+            # writing data table to .csv file
+            pdf_df.to_csv(fileName, index=False)
+            with open(fileName, 'rb') as data:
+                s3_pointer.put_object(Bucket=s3_bucket, Key=out_folder_raw_pdf + fileName, Body=data)
+
+            # writing data frame to .csv file extracted from PNG
+            if png_df is not None:
+                png_df.to_csv(fileName, index=False)
+                with open(fileName, 'rb') as data:
+                    s3_pointer.put_object(Bucket=s3_bucket, Key=out_folder_raw_png + fileName, Body=data)
+
+            print('--------------------------------------------------------------------')
+            print('\tSaved %s file to s3 bucket' % fileName)
+
+            # ==============================================================================
+            #               STEP 5 (Perform Cleaning Operations on Textract Table)
+            # ==============================================================================
+
+            if pdf_df is not None:
+                print('\tWorking on PDF balance-sheet')
+                # perform cleaning operations on read balance sheets for PDF and PNGs
+
+                # adding following try structure. In rare cases clean_wrapper has an error due to invalid cleaning of pdf dataframe                               that raises an error (for dataframe '1139137-2006-02-28.csv')
+                try:
+                    pdf_df_clean, prior_pdf_scaler, prior_pdf_cik = clean_wrapper(pdf_df, text_dictionary, basefile, fileName,
+                                                                                  prior_pdf_scaler, prior_pdf_cik)
+
+                    # export contents to the s3 directory
+                    pdf_df_clean.to_csv(fileName, index=False)
+                    with open(fileName, 'rb') as data:
+                        s3_pointer.put_object(Bucket=s3_bucket, Key=out_folder_clean_pdf + fileName, Body=data)
 
-            basefile = pdf_paths.split('/')[-1].split('-subset')[0]
-            fileName = basefile + '.csv'
-            
-            #job_ids[basefile] = str(counter)
-            
-            if counter%40 == 0:
-                print(counter)
-               
-            # determines if Textract has already been run for this file
-            if retry_errors:
-                already_done = out_folder_raw_pdf + fileName in output_pdf_csvs
-            else:
-                already_done = (out_folder_raw_pdf + fileName in output_pdf_csvs) or (basefile in error_dictionary.keys())
-                                                
-            if (already_done) and (rerun_job > 4):
-                print('\t%s has already been Textracted, we pass ' % fileName)
-            else:
-                # while True structure is to wait until we're able to send a new textract job
-                while True:
-                    try:
-                        job_ids[basefile] = startJob(s3_bucket, pdf_paths)
-                        break
-                    except Exception as e:
-                        print(e)
-                        time.sleep(10)
-       
-        with open('job_ids.json', 'w') as file: 
-            json.dump(job_ids,file)
-            file.close()
-            
-        for counter in range(c_min,c_max):
-            pdf_paths = textract_files[counter]
-            
-            # baseFile name to name export .csv file e.g. 1224385-2004-03-01.csv
-            basefile = pdf_paths.split('/')[-1].split('-subset')[0]
-            fileName = basefile + '.csv'
-            print('\nPerforming OCR for %s (%d out of %s)' % (fileName,counter,number_files))
-
-            # if file is not found in output directory we extract the balance sheet
-            # WE LOOK TO AVOID RE-RUNNING OLD TEXTRACT PARSES TO SAVE TIME, but if 
-            # rerun_job is < 5 (True) we re-run Textract again
-            if retry_errors:
-                already_done = out_folder_raw_pdf + fileName in output_pdf_csvs
-            else:
-                already_done = (out_folder_raw_pdf + fileName in output_pdf_csvs) or (basefile in error_dictionary.keys())
-
-            if (already_done) and (rerun_job > 4):
-                print('\t%s has been downloaded' % fileName)
-       
-            else:
-                # run Textract OCR job and extract the parsed data 
-
-                png_paths = input_png + basefile + '/'
-                pdf_df, png_df, forms_data, text_data, error = textractParse_pdfs_parallel(pdf_paths, s3_bucket, job_ids[basefile])
-            
-                if error is not(None):
-                    if 'Block' in error:
-                        print('Going too fast, waiting 20s')
-                        time.sleep(20)
-                        pdf_df, png_df, forms_data, text_data, error = textractParse_pdfs_parallel(pdf_paths, s3_bucket, job_ids[basefile])
+                except Exception as e:
+                    error_dictionary[basefile] = str(e)
 
-                # if no error is reported we save FORMS, TEXT, DataFrame
-                if error is None:
+            if png_df is not None:
+                print('\tWorking on PNG balance-sheet')
+                png_df_clean, prior_png_scaler, prior_png_cik = clean_wrapper(png_df, text_dictionary, basefile, fileName,
+                                                                              prior_png_scaler, prior_png_cik)
 
-                    # store accompanying information for JSONs
-                    forms_dictionary[basefile] = forms_data
-                    text_dictionary[basefile]  = text_data
+                png_df_clean.to_csv(fileName, index=False)
+                with open(fileName, 'rb') as data:
+                    s3_pointer.put_object(Bucket=s3_bucket, Key=out_folder_clean_png + fileName, Body=data)
 
-                    # writing data table to .csv file
-                    pdf_df.to_csv(fileName, index=False)
-                    with open(fileName, 'rb') as data:
-                        s3_pointer.put_object(Bucket=s3_bucket, Key=out_folder_raw_pdf + fileName, Body=data)
-
-                    # writing data frame to .csv file extracted from PNG
-                    if png_df is not None:
-                        png_df.to_csv(fileName, index=False)
-                        with open(fileName, 'rb') as data:
-                            s3_pointer.put_object(Bucket=s3_bucket, Key=out_folder_raw_png + fileName, Body=data)
-
-                    print('--------------------------------------------------------------------')
-                    print('\tSaved %s file to s3 bucket' % fileName)
-
-                    # ==============================================================================
-                    #               STEP 5 (Perform Cleaning Operations on Textract Table)
-                    # ==============================================================================
-
-                    if pdf_df is not None:
-                        print('\tWorking on PDF balance-sheet')
-                        # perform cleaning operations on read balance sheets for PDF and PNGs
-
-                        # adding following try structure. In rare cases clean_wrapper has an error due to invalid cleaning of pdf dataframe                               that raises an error (for dataframe '1139137-2006-02-28.csv')
-                        try:
-                            pdf_df_clean, prior_pdf_scaler, prior_pdf_cik = clean_wrapper(pdf_df, text_dictionary, basefile, fileName,
-                                                                                          prior_pdf_scaler, prior_pdf_cik)
-
-                            # export contents to the s3 directory
-                            pdf_df_clean.to_csv(fileName, index=False)
-                            with open(fileName, 'rb') as data:
-                                s3_pointer.put_object(Bucket=s3_bucket, Key=out_folder_clean_pdf + fileName, Body=data)
-
-                        except Exception as e:
-                            error_dictionary[basefile] = str(e)
-
-                    if png_df is not None:
-                        print('\tWorking on PNG balance-sheet')
-                        png_df_clean, prior_png_scaler, prior_png_cik = clean_wrapper(png_df, text_dictionary, basefile, fileName,
-                                                                                      prior_png_scaler, prior_png_cik)
-
-                        png_df_clean.to_csv(fileName, index=False)
-                        with open(fileName, 'rb') as data:
-                            s3_pointer.put_object(Bucket=s3_bucket, Key=out_folder_clean_png + fileName, Body=data)
-
-                    # remove local file after it has been created
-                    if os.path.isfile(fileName):
-                        os.remove(fileName)
-                        print('--------------------------------------------------------------------\n')
-
-                else:
-                    print('\tError with Textract : '+ error)
-                    error_dictionary[basefile] = error
-                    
-                if counter%200 == 0:
-                    print('Intermediate saving of errors ')
-                    with open('X17A5-FORMS.json', 'w') as file: 
-                        json.dump(forms_dictionary, file)
-                        file.close()
-
-                    # save contents to AWS S3 bucket
-                    with open('X17A5-FORMS.json', 'rb') as data: 
-                        s3_pointer.upload_fileobj(data, s3_bucket, temp_folder + 'X17A5-FORMS.json')
-                    os.remove('X17A5-FORMS.json')
-
-                    # write to a JSON file for TEXT 
-                    with open('X17A5-TEXT.json', 'w') as file: 
-                        json.dump(text_dictionary, file)
-                        file.close()
-
-                    # save contents to AWS S3 bucket
-                    with open('X17A5-TEXT.json', 'rb') as data: 
-                        s3_pointer.upload_fileobj(data, s3_bucket, temp_folder + 'X17A5-TEXT.json')
-                    os.remove('X17A5-TEXT.json')
-
-                    # write to a JSON file for FORMS 
-                    with open('ERROR-TEXTRACT.json', 'w') as file: 
-                        json.dump(error_dictionary, file)
-                        file.close()
-
-                    # save contents to AWS S3 bucket
-                    with open('ERROR-TEXTRACT.json', 'rb') as data: 
-                        s3_pointer.upload_fileobj(data, s3_bucket, temp_folder + 'ERROR-TEXTRACT.json')
-                    os.remove('ERROR-TEXTRACT.json')
-          
+            # remove local file after it has been created
+            if os.path.isfile(fileName):
+                os.remove(fileName)
+                print('--------------------------------------------------------------------\n')
+
+        else:
+            print('\tError with Textract : '+ error)
+            error_dictionary[basefile] = error
+            
+        if counter%200 == 0:
+            print('Intermediate saving of errors ')
+            with open('job_ids.json', 'w') as file: 
+                json.dump(job_ids,file)
+                file.close()
+
+            with open('X17A5-FORMS.json', 'w') as file: 
+                json.dump(forms_dictionary, file)
+                file.close()
+
+            # save contents to AWS S3 bucket
+            with open('X17A5-FORMS.json', 'rb') as data: 
+                s3_pointer.upload_fileobj(data, s3_bucket, temp_folder + 'X17A5-FORMS.json')
+            os.remove('X17A5-FORMS.json')
+
+            # write to a JSON file for TEXT 
+            with open('X17A5-TEXT.json', 'w') as file: 
+                json.dump(text_dictionary, file)
+                file.close()
+
+            # save contents to AWS S3 bucket
+            with open('X17A5-TEXT.json', 'rb') as data: 
+                s3_pointer.upload_fileobj(data, s3_bucket, temp_folder + 'X17A5-TEXT.json')
+            os.remove('X17A5-TEXT.json')
+
+            # write to a JSON file for FORMS 
+            with open('ERROR-TEXTRACT.json', 'w') as file: 
+                json.dump(error_dictionary, file)
+                file.close()
+
+            # save contents to AWS S3 bucket
+            with open('ERROR-TEXTRACT.json', 'rb') as data: 
+                s3_pointer.upload_fileobj(data, s3_bucket, temp_folder + 'ERROR-TEXTRACT.json')
+            os.remove('ERROR-TEXTRACT.json')
+      
     # ---------------------------------------------------------------------------
     # Save JSON files for updated figures (FORM, TEXT, ERROR)
     # ---------------------------------------------------------------------------
     
+    # jobs read partially (early stop) are still being read to the end and cached
+    waitCacheWrites()
+    
+    # job IDs of every Textract job harvested (used by run_ocr_blocks.py)
+    with open('job_ids.json', 'w') as file: 
+        json.dump(job_ids,file)
+        file.close()
+    
     # write to a JSON file for FORMS 
     with open('X17A5-FORMS.json', 'w') as file: 
         json.dump(forms_dictionary, file)
@@ -308,5 +356,9 @@ def main_p2(s3_bucket, s3_pointer, s3_session, temp_folder, input_pdf, input_png
     with open('ERROR-TEXTRACT.json', 'rb') as data: 
         s3_pointer.upload_fileobj(data, s3_bucket, temp_folder + 'ERROR-TEXTRACT.json')
     os.remove('ERROR-TEXTRACT.json')
+    
+    # Textract call counts, latencies and billed pages for this run (textract_obj is the Textract gateway)
+    textract_obj.report()
+    backend.report()
           
 
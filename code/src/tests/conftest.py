@@ -0,0 +1,5 @@
+import os
+import sys
+
+# modules under code/src are imported as top-level scripts (e.g. from RateLimit import TokenBucket)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
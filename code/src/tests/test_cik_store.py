@@ -0,0 +1,27 @@
+from CIKStore import CIKStore
+
+
+def test_resolved_names_are_fresh(tmp_path):
+    store = CIKStore(str(tmp_path / 'dealers.db'))
+    store['1904'] = 'ABRAHAM SECURITIES CORPORATION'
+
+    assert store['1904'] == 'ABRAHAM SECURITIES CORPORATION'
+    assert store.stale(['1904']) == []
+
+
+def test_failed_lookups_stay_stale(tmp_path):
+    store = CIKStore(str(tmp_path / 'dealers.db'))
+    store['887767'] = None
+
+    assert '887767' in store
+    assert store.stale(['887767']) == ['887767']
+
+
+def test_failed_refresh_keeps_previous_name(tmp_path):
+    store = CIKStore(str(tmp_path / 'dealers.db'), ttl=0)
+    store['1904'] = 'ABRAHAM SECURITIES CORPORATION'
+    store['1904'] = None
+
+    assert store['1904'] == 'ABRAHAM SECURITIES CORPORATION'
+    assert store.stale(['1904']) == ['1904']
+    assert store.name_history('1904') == ['ABRAHAM SECURITIES CORPORATION']
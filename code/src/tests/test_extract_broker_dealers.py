@@ -0,0 +1,94 @@
+import json
+import asyncio
+
+import pytest
+import pandas as pd
+
+pytest.importorskip('aiohttp')
+pytest.importorskip('bs4')
+
+import ExtractBrokerDealers
+from CIKStore import CIKStore
+from ExtractBrokerDealers import companyNames, companyNamesAsync, formIndex
+
+
+class FakeClient:
+    """
+    SECClient stand-in answering every CIK with an EDGAR search page holding its company name
+    """
+    timeout = 60
+
+    def __init__(self, names):
+        self.names = names
+
+    async def get_async(self, session, url, company_email, headers=None):
+        cik = url.split('CIK=')[1].split('&')[0]
+        if cik not in self.names:
+            return 404, 'not found'
+        return 200, '<span class="companyName">%s/BD CIK#: %s</span>' % (self.names[cik], cik)
+
+
+def test_company_names_are_deduplicated_and_resolved():
+    client = FakeClient({'1904': 'ABN AMRO', '887767': 'GOLDMAN SACHS'})
+
+    cik2name = companyNames(['1904', '887767', '1904', '42'], 'test@example.com', client=client)
+
+    assert cik2name == {'1904': 'ABN AMRO', '887767': 'GOLDMAN SACHS', '42': None}
+
+
+def test_company_names_from_a_running_event_loop():
+    client = FakeClient({'1904': 'ABN AMRO'})
+
+    # e.g. a Jupyter notebook, where asyncio.run cannot be called from the loop thread
+    async def notebook():
+        return companyNames(['1904'], 'test@example.com', client=client)
+
+    assert asyncio.run(notebook()) == {'1904': 'ABN AMRO'}
+
+
+def test_company_names_from_a_running_event_loop_into_a_cik_store(tmp_path):
+    client = FakeClient({'1904': 'ABN AMRO', '887767': 'GOLDMAN SACHS'})
+    store = CIKStore(str(tmp_path / 'dealers.db'))
+
+    # the SQLite connection of the store belongs to the thread running the event loop
+    async def notebook():
+        return companyNames(['1904', '887767', '42'], 'test@example.com', cik2name=store, client=client)
+
+    assert asyncio.run(notebook()) is store
+    assert store['1904'] == 'ABN AMRO'
+    assert store['887767'] == 'GOLDMAN SACHS'
+    assert store.stale(['1904', '887767', '42']) == ['42']
+
+
+def test_company_names_coroutine_can_be_awaited():
+    client = FakeClient({'1904': 'ABN AMRO'})
+
+    cik2name = asyncio.run(companyNamesAsync(['1904'], 'test@example.com', cik2name={'1': 'X'}, client=client))
+
+    assert cik2name == {'1': 'X', '1904': 'ABN AMRO'}
+
+
+class NotModified:
+    status_code = 304
+    headers = {}
+
+
+def test_form_index_marks_a_quarter_closed_on_not_modified(monkeypatch, tmp_path):
+    cache_folder = str(tmp_path) + '/'
+    pd.DataFrame({'CIK': ['1904']}).to_csv(cache_folder + '2020-QTR1.csv.gz', index=False, compression='gzip')
+    with open(cache_folder + '2020-QTR1.json', 'w') as f:
+        json.dump({'ETag': '"abc"', 'Last-Modified': None, 'Closed': False}, f)
+
+    requested = []
+    def secGet(url, company_email, headers=None, stream=False):
+        requested.append(headers)
+        return NotModified()
+    monkeypatch.setattr(ExtractBrokerDealers, 'secGet', secGet)
+
+    # the quarter was cached while open, it is requested once more and then read from the cache
+    assert list(formIndex('2020/QTR1', 'test@example.com', cache_folder=cache_folder)['CIK']) == ['1904']
+    assert list(formIndex('2020/QTR1', 'test@example.com', cache_folder=cache_folder)['CIK']) == ['1904']
+
+    assert requested == [{'If-None-Match': '"abc"'}]
+    with open(cache_folder + '2020-QTR1.json') as f:
+        assert json.load(f) == {'ETag': '"abc"', 'Last-Modified': None, 'Closed': True}
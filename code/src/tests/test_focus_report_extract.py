@@ -0,0 +1,95 @@
+import os
+
+import pytest
+
+pytest.importorskip('bs4')
+pytest.importorskip('pikepdf')
+
+import FocusReportExtract
+from FocusReportExtract import parseFilingTable, edgarParse
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures', 'edgar')
+ARCHIVE = 'https://www.sec.gov/Archives/edgar/data/782124/%s-index.htm'
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), 'r') as f: return f.read()
+
+
+class Response:
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.status_code = status_code
+
+
+def fake_edgar(monkeypatch, pages):
+    """
+    Serves saved browse-edgar pages keyed by their start= offset, returns the list of requested URLs
+    """
+    requested = []
+
+    def secGet(url, company_email):
+        requested.append(url)
+        start = int(url.split('&start=')[1].split('&')[0])
+        return Response(fixture(pages[start]))
+
+    monkeypatch.setattr(FocusReportExtract, 'secGet', secGet)
+    return requested
+
+
+def test_parse_single_page():
+    filing_dates, archives, has_next = parseFilingTable(fixture('single_page.html'))
+
+    assert filing_dates == ['2021-03-01', '2020-02-28', '2019-03-01']
+    assert archives == [ARCHIVE % '0000782124-21-000001', ARCHIVE % '0000782124-20-000001',
+                        ARCHIVE % '0000782124-19-000002']
+    assert not has_next
+
+
+def test_edgar_parse_single_page(monkeypatch):
+    requested = fake_edgar(monkeypatch, {0: 'single_page.html'})
+
+    filing_dates, archives = edgarParse('https://www.sec.gov/cgi-bin/browse-edgar?CIK=782124', 'test@example.com')
+
+    assert list(filing_dates) == ['2021-03-01', '2020-02-28', '2019-03-01']
+    assert len(archives) == 3
+    assert len(requested) == 1
+
+
+def test_edgar_parse_follows_pagination_until_empty_page(monkeypatch):
+    requested = fake_edgar(monkeypatch, {0: 'page_1.html', 2: 'page_2.html', 4: 'page_3.html'})
+
+    filing_dates, archives = edgarParse('https://www.sec.gov/cgi-bin/browse-edgar?CIK=782124',
+                                        'test@example.com', count=2)
+
+    assert list(filing_dates) == ['2021-03-01', '2020-02-28', '2019-03-01', '2018-03-01']
+    assert archives == [ARCHIVE % '0000782124-21-000001', ARCHIVE % '0000782124-20-000001',
+                        ARCHIVE % '0000782124-19-000002', ARCHIVE % '0000782124-18-000003']
+    assert [url.split('?')[1] for url in requested] == ['CIK=782124&start=0&count=2',
+                                                        'CIK=782124&start=2&count=2',
+                                                        'CIK=782124&start=4&count=2']
+
+
+def test_edgar_parse_follows_pagination_past_rows_without_filing_link(monkeypatch):
+    requested = fake_edgar(monkeypatch, {0: 'page_1_missing_link.html', 2: 'page_2.html', 4: 'page_3.html'})
+
+    filing_dates, archives = edgarParse('https://www.sec.gov/cgi-bin/browse-edgar?CIK=782124',
+                                        'test@example.com', count=2)
+
+    # the first page is full but only one of its rows has a filing link
+    assert list(filing_dates) == ['2021-03-01', '2019-03-01', '2018-03-01']
+    assert len(archives) == 3
+    assert len(requested) == 3
+
+
+def test_rows_without_filing_link_keep_dates_aligned():
+    filing_dates, archives, has_next = parseFilingTable(fixture('missing_link.html'))
+
+    # the paper filing of 1997 has no documents link and is left out together with its date
+    assert filing_dates == ['2021-03-01', '1996-02-28']
+    assert archives == [ARCHIVE % '0000782124-21-000001', ARCHIVE % '0000782124-96-000004']
+
+
+def test_edgar_parse_without_filings(monkeypatch):
+    fake_edgar(monkeypatch, {0: 'page_3.html'})
+    assert edgarParse('https://www.sec.gov/cgi-bin/browse-edgar?CIK=782124', 'test@example.com') is None
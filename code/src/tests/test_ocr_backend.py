@@ -0,0 +1,112 @@
+from concurrent.futures import Future
+
+import pytest
+
+pytest.importorskip('trp')
+pytest.importorskip('minecart')
+pytest.importorskip('fitz')
+
+import OCRTextract
+from OCRBackend import TextractBackend
+
+
+class Finished:
+    """
+    Tracker for which every job has already succeeded, counting the status checks made
+    """
+    def __init__(self):
+        self.tracked = []
+
+    def track(self, job_id, pages=1, callback=None):
+        self.tracked.append(job_id)
+        future = Future()
+        future.set_result('SUCCEEDED')
+        return future
+
+
+class Scheduler:
+    """
+    JobScheduler stand-in yielding every key with a fixed (job_id, status)
+    """
+    controller = None
+
+    def __init__(self, jobs):
+        self.jobs = jobs
+        self.poller = Finished()
+        self.submitted = []
+
+    def run(self, keys):
+        for key in keys:
+            self.submitted.append(key)
+            yield (key,) + self.jobs[key]
+
+
+class DictCache:
+    def __init__(self, responses=None):
+        self.responses = dict(responses or {})
+
+    def digests(self, keys):
+        return {key: 'digest-' + key for key in keys}
+
+    def __contains__(self, digest):
+        return digest in self.responses
+
+    def get(self, digest):
+        return self.responses.get(digest)
+
+    def put(self, digest, response):
+        self.responses[digest] = response
+
+
+def result_pages(n_pages):
+    pages = []
+    for page in range(1, n_pages + 1):
+        response = {'JobStatus': 'SUCCEEDED', 'DocumentMetadata': {'Pages': n_pages},
+                    'Blocks': [{'BlockType': 'PAGE', 'Id': 'page-%d' % page, 'Page': page}]}
+        if page < n_pages: response['NextToken'] = 'token-%d' % page
+        pages.append(response)
+    return pages
+
+
+def test_textract_backend_reads_cache_and_jobs(monkeypatch):
+    pages = result_pages(2)
+    calls = []
+
+    def call(api, retry=True, **kwargs):
+        calls.append((kwargs['JobId'], kwargs.get('NextToken')))
+        return pages[0] if 'NextToken' not in kwargs else pages[1]
+    monkeypatch.setattr(OCRTextract.textract_gateway, 'call', call)
+
+    scheduler = Scheduler({'b.pdf': ('job-b', 'SUCCEEDED'), 'c.pdf': (None, 'FAILED'),
+                           'd.pdf': ('job-d', 'FAILED')})
+    cache = DictCache({'digest-a.pdf': result_pages(1)})
+    backend = TextractBackend(scheduler, cache)
+
+    documents = backend.analyzeMany(['a.pdf', 'b.pdf', 'c.pdf', 'd.pdf'])
+
+    # cached documents are read without a job, the others are read through the scheduler
+    assert scheduler.submitted == ['b.pdf', 'c.pdf', 'd.pdf']
+    assert len(documents['a.pdf'].pages) == 1
+    assert len(documents['b.pdf'].pages) == 2
+    assert documents['c.pdf'] is None and documents['d.pdf'] is None
+    assert backend.errors == {'c.pdf': 'Could not start Textract job, JOB FAILED',
+                              'd.pdf': 'Could not parse, JOB FAILED'}
+    assert backend.job_ids == {'b.pdf': 'job-b', 'c.pdf': None, 'd.pdf': 'job-d'}
+
+    # results are fetched once through the tracker the job was scheduled with, and the job is cached
+    assert calls == [('job-b', None), ('job-b', 'token-1')]
+    assert scheduler.poller.tracked == ['job-b']
+    assert cache.responses['digest-b.pdf'] == pages
+
+
+def test_textract_backend_logs_textract_errors(monkeypatch):
+    from TextractGateway import TextractError
+
+    def call(api, retry=True, **kwargs):
+        raise TextractError(api, 'InvalidJobIdException', 'job expired')
+    monkeypatch.setattr(OCRTextract.textract_gateway, 'call', call)
+
+    backend = TextractBackend(Scheduler({'a.pdf': ('job-a', 'SUCCEEDED')}))
+
+    assert list(backend.iterAnalyze(['a.pdf'])) == [('a.pdf', None)]
+    assert 'InvalidJobIdException' in backend.errors['a.pdf']
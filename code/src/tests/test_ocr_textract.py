@@ -0,0 +1,104 @@
+from concurrent.futures import Future
+
+import pytest
+
+pytest.importorskip('trp')
+pytest.importorskip('minecart')
+
+import OCRTextract
+
+
+class DictCache:
+    def __init__(self):
+        self.responses = {}
+
+    def get(self, digest):
+        return self.responses.get(digest)
+
+    def put(self, digest, response):
+        self.responses[digest] = response
+
+
+class Finished:
+    """
+    Tracker for which every job has already succeeded
+    """
+    def track(self, job_id, pages=1, callback=None):
+        future = Future()
+        future.set_result('SUCCEEDED')
+        return future
+
+
+def result_pages(n_pages):
+    pages = []
+    for page in range(1, n_pages + 1):
+        response = {'JobStatus': 'SUCCEEDED', 'DocumentMetadata': {'Pages': n_pages},
+                    'Blocks': [{'BlockType': 'PAGE', 'Id': 'page-%d' % page, 'Page': page}]}
+        if page < n_pages: response['NextToken'] = 'token-%d' % page
+        pages.append(response)
+    return pages
+
+
+def stopped_early(monkeypatch, pages):
+    """
+    Serves the given result pages through the gateway, with a balance sheet search that stops after the first
+    document page, returns the list of requested NextTokens
+    """
+    calls = []
+
+    def call(api, retry=True, **kwargs):
+        calls.append(kwargs.get('NextToken'))
+        return pages[0] if 'NextToken' not in kwargs else pages[int(kwargs['NextToken'].split('-')[1])]
+    monkeypatch.setattr(OCRTextract.textract_gateway, 'call', call)
+
+    def readTable(document):
+        next(iter(document.pages))
+        return None
+    monkeypatch.setattr(OCRTextract, 'readTable', readTable)
+
+    return calls
+
+
+def test_early_stop_skips_remaining_pages(monkeypatch):
+    pages = result_pages(4)
+    calls = stopped_early(monkeypatch, pages)
+
+    cache = DictCache()
+    result = OCRTextract.textractParse_pdfs_parallel('pdf/1904-2020-02-26-subset.pdf', 'bucket', 'job-0',
+                                                     cache, 'digest', early_stop=True, tracker=Finished())
+    OCRTextract.waitCacheWrites()
+
+    # the first document page ends with the second result page, jobs read partially are not cached such
+    # that no further result page is requested
+    assert result[-1] == 'No Balance Sheet found, or parsing error'
+    assert cache.responses == {}
+    assert calls == [None, 'token-1']
+
+
+def test_early_stop_caches_the_full_response_if_asked(monkeypatch):
+    pages = result_pages(3)
+    calls = stopped_early(monkeypatch, pages)
+
+    cache = DictCache()
+    result = OCRTextract.textractParse_pdfs_parallel('pdf/1904-2020-02-26-subset.pdf', 'bucket', 'job-0',
+                                                     cache, 'digest', early_stop=True, tracker=Finished(),
+                                                     cache_partial=True)
+    OCRTextract.waitCacheWrites()
+
+    assert result[-1] == 'No Balance Sheet found, or parsing error'
+    assert cache.responses == {'digest': pages}
+    assert calls == [None, 'token-1', 'token-2']
+
+
+def test_textract_errors_are_returned_as_filing_errors(monkeypatch):
+    from TextractGateway import TextractError
+
+    def call(api, retry=True, **kwargs):
+        raise TextractError(api, 'InvalidJobIdException', 'job expired')
+    monkeypatch.setattr(OCRTextract.textract_gateway, 'call', call)
+
+    for early_stop in (True, False):
+        result = OCRTextract.textractParse_pdfs_parallel('pdf/1904-2020-02-26-subset.pdf', 'bucket', 'job-0',
+                                                         early_stop=early_stop, tracker=Finished())
+        assert result[:4] == (None, None, None, None)
+        assert 'InvalidJobIdException' in result[4]
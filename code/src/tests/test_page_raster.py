@@ -0,0 +1,49 @@
+import pytest
+
+fitz = pytest.importorskip('fitz')
+pytest.importorskip('pikepdf')
+
+from PageRaster import renderCandidates, rasterizeFilings, pngKey
+from StorageSink import LocalSink
+
+
+def filing_pdf(texts:list) -> bytes:
+    doc = fitz.open()
+    for text in texts:
+        page = doc.newPage()
+        page.insertText((72, 72), text)
+    return doc.write()
+
+
+def balance_sheet_filing(n_pages:int, balance_sheet:int) -> bytes:
+    filler = 'Annual audited report, independent auditor opinion and related disclosures. ' * 4
+    texts = [filler] * n_pages
+    texts[balance_sheet] = ('Statement of Financial Condition\nCash $ 1,000\nTotal assets $ 5,000\n'
+                            'Total liabilities $ 3,000\n' + filler)
+    return filing_pdf(texts)
+
+
+def test_window_subsets_render_only_candidates():
+    content = balance_sheet_filing(20, balance_sheet=7)
+    images = renderCandidates(content, n_selected=20, top_k=1, dpi=36)
+
+    assert [page for page, _ in images] == [7]
+    assert images[0][1].startswith(b'\x89PNG')
+
+
+def test_ranked_subsets_are_rendered_in_full():
+    content = balance_sheet_filing(3, balance_sheet=1)
+    images = renderCandidates(content, n_selected=3, top_k=3, dpi=36)
+
+    assert [page for page, _ in images] == [0, 1, 2]
+
+
+def test_rasterize_reads_selected_pages_from_metadata(tmp_path):
+    sink = LocalSink(str(tmp_path))
+    path = 'pdf/1904-2020-02-26-subset.pdf'
+    sink.put(path, balance_sheet_filing(20, balance_sheet=12),
+             metadata={'pages': 40, 'subset-pages': 20, 'selected': ','.join(str(p) for p in range(20))})
+
+    assert rasterizeFilings([path], sink, 'png/', dpi=36, top_k=1, render_workers=1) == [(path, 'rendered')]
+    assert sink.exists(pngKey(path, 'png/', 12))
+    assert not sink.exists(pngKey(path, 'png/', 0))
@@ -0,0 +1,18 @@
+from RateLimit import AIMDController
+
+
+def test_aimd_report_formats_metrics(capsys):
+    controller = AIMDController(initial=4, cap=8, cooldown=0)
+    for _ in range(3): controller.success()
+    controller.throttle()
+
+    controller.report()
+    out = capsys.readouterr().out
+
+    assert 'Concurrent jobs: 2 (peak 4), 3 submitted' in out
+    assert 'throttle rate 25.0%' in out
+
+
+def test_aimd_report_without_submissions(capsys):
+    AIMDController().report()
+    assert 'throttle rate 0.0%' in capsys.readouterr().out
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('aiohttp')
+pytest.importorskip('requests')
+
+from RateLimit import TokenBucket
+from SECRequests import SECClient
+
+
+class FakeResponse:
+    def __init__(self, status, text):
+        self.status = status
+        self.headers = {}
+        self.body = text
+
+    async def text(self):
+        return self.body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class FakeSession:
+    """
+    aiohttp session stand-in answering with the given (status, text) pairs in order
+    """
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requested = []
+
+    def get(self, url, headers=None, allow_redirects=True):
+        self.requested.append((url, headers))
+        return FakeResponse(*self.responses.pop(0))
+
+
+def client():
+    return SECClient(limiter=TokenBucket(rate=1000), backoff=0)
+
+
+def test_async_requests_are_retried_and_counted():
+    sec = client()
+    session = FakeSession([(429, 'slow down'), (503, 'unavailable'), (200, '<html>ok</html>')])
+
+    status, text = asyncio.run(sec.get_async(session, 'https://www.sec.gov/', 'test@example.com'))
+
+    assert (status, text) == (200, '<html>ok</html>')
+    assert session.requested[0][1] == {'User-Agent': 'Company Name test@example.com'}
+
+    report = sec.report()
+    assert report['requests'] == 3
+    assert report['retries'] == 2
+    assert report['errors'] == 2
+    assert report['bytes'] == len('slow down') + len('unavailable') + len('<html>ok</html>')
+
+
+def test_async_client_errors_are_not_retried():
+    sec = client()
+    session = FakeSession([(404, 'not found')])
+
+    assert asyncio.run(sec.get_async(session, 'https://www.sec.gov/', 'test@example.com')) == (404, 'not found')
+    assert sec.report()['requests'] == 1
@@ -0,0 +1,50 @@
+import io
+import time
+
+import pytest
+
+pikepdf = pytest.importorskip('pikepdf')
+pytest.importorskip('fitz')
+pytest.importorskip('trp')
+
+from FocusReportSlicing import sliceBuffer, subsetWriter, subsetKey
+from StorageSink import LocalSink
+from TextractCache import TextractCache
+
+
+def blank_pdf(n_pages:int) -> bytes:
+    pdf = pikepdf.Pdf.new()
+    for _ in range(n_pages): pdf.add_blank_page()
+
+    buffer = io.BytesIO()
+    pdf.save(buffer)
+    return buffer.getvalue()
+
+
+def test_slicing_is_deterministic():
+    content = blank_pdf(30)
+    first, n_pages, selected = sliceBuffer(content, range(20))
+
+    # qpdf derives the trailer /ID from the current time unless it is fixed, re-slicing later must give the same bytes
+    time.sleep(1.1)
+    second, _, _ = sliceBuffer(content, range(20))
+
+    assert first == second
+    assert n_pages == 30 and selected == list(range(20))
+
+
+def test_digests_use_subset_metadata(tmp_path, monkeypatch):
+    sink = LocalSink(str(tmp_path))
+    filing = {'key': 'input/X-17A-5/1904-2020-02-26.pdf'}
+    subsetWriter(sink, 'pdf/', pages=range(20))(filing, blank_pdf(25))
+
+    key = subsetKey(filing['key'], 'pdf/')
+    cache = TextractCache(sink, 'temp/textract-cache/')
+    expected = cache.digest(sink.get(key))
+
+    # the cache key comes from the metadata written at slicing time, the subset is not read back
+    def no_read(path):
+        raise AssertionError('%s was read' % path)
+    monkeypatch.setattr(sink, 'get', no_read)
+
+    assert cache.digests([key]) == {key: expected}
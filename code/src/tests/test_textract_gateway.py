@@ -0,0 +1,42 @@
+import pytest
+
+pytest.importorskip('boto3')
+
+from botocore.exceptions import ClientError
+
+from RateLimit import TokenBucket
+from TextractGateway import TextractGateway, TextractError, TextractThrottled, TextractUnavailable
+
+
+class FailingClient:
+    def __init__(self, code):
+        self.code = code
+
+    def get_document_analysis(self, **kwargs):
+        raise ClientError({'Error': {'Code': self.code, 'Message': 'failed'}}, 'GetDocumentAnalysis')
+
+
+def gateway(code):
+    gateway = TextractGateway(limiter=TokenBucket(rate=1000), max_wait=0)
+    gateway.client_ = gateway.single_client_ = FailingClient(code)
+    return gateway
+
+
+@pytest.mark.parametrize('code, error, counter', [
+    ('ProvisionedThroughputExceededException', TextractThrottled, 'throttled'),
+    ('ThrottlingException', TextractThrottled, 'throttled'),
+    ('InternalServerError', TextractUnavailable, 'transient'),
+    ('ServiceUnavailableException', TextractUnavailable, 'transient'),
+    ('InvalidJobIdException', TextractError, 'errors'),
+])
+def test_errors_are_classified(code, error, counter):
+    textract = gateway(code)
+    with pytest.raises(error) as raised:
+        textract.call('get_document_analysis', JobId='job-0')
+
+    assert type(raised.value) is error
+    assert raised.value.code == code
+
+    metric = textract.summary()['get_document_analysis']
+    assert metric[counter] == 1
+    assert sum(metric[name] for name in ('errors', 'throttled', 'transient')) == 1
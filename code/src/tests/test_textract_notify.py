@@ -0,0 +1,74 @@
+import itertools
+
+import pytest
+
+pytest.importorskip('boto3')
+
+from TextractNotify import LocalChannel, NotificationListener
+from TextractPoller import JobPoller
+from TextractScheduler import JobScheduler
+
+
+def fake_textract(channel):
+    """
+    Returns a submit function starting fake jobs that complete immediately
+    on the channel, and the list of status checks made by the fallback poller
+    """
+    ids = itertools.count()
+    checks = []
+
+    def submit(key):
+        job_id = 'job-%d' % next(ids)
+        channel.publish(job_id, 'SUCCEEDED')
+        return job_id
+
+    def check(job_id):
+        checks.append(job_id)
+        return 'SUCCEEDED'
+
+    return submit, JobPoller(check=check), checks
+
+
+def test_jobs_resolve_from_notifications(tmp_path):
+    channel = LocalChannel()
+    submit, fallback, checks = fake_textract(channel)
+    listener = NotificationListener(channel, fallback=fallback, wait=1)
+
+    scheduler = JobScheduler(submit=submit, poller=listener, state_path=str(tmp_path / 'jobs.json'),
+                             max_in_flight=2)
+    keys = ['filing-%d.pdf' % i for i in range(5)]
+    harvested = list(scheduler.run(keys))
+
+    assert sorted(key for key, _, _ in harvested) == keys
+    assert all(status == 'SUCCEEDED' for _, _, status in harvested)
+
+    # every job resolved from its notification, none was polled
+    assert checks == []
+    assert scheduler.state == {}
+
+
+def test_results_of_notified_jobs_are_fetched_without_polling(tmp_path, monkeypatch):
+    OCRTextract = pytest.importorskip('OCRTextract')
+
+    channel = LocalChannel()
+    submit, fallback, checks = fake_textract(channel)
+    listener = NotificationListener(channel, fallback=fallback, wait=1)
+
+    # the shared poller must not be asked about jobs the listener resolved
+    def no_poll(job_id, pages=1, callback=None):
+        raise AssertionError('job %s was polled' % job_id)
+    monkeypatch.setattr(OCRTextract.textract_poller, 'track', no_poll)
+
+    calls = []
+    def call(api, retry=True, **kwargs):
+        calls.append((api, kwargs))
+        return {'JobStatus': 'SUCCEEDED', 'Blocks': []}
+    monkeypatch.setattr(OCRTextract.textract_gateway, 'call', call)
+
+    scheduler = JobScheduler(submit=submit, poller=listener, state_path=str(tmp_path / 'jobs.json'))
+    for key, job_id, status in scheduler.run(['filing.pdf']):
+        responses = list(OCRTextract.iterJobResults(job_id, tracker=listener))
+
+    assert responses == [{'JobStatus': 'SUCCEEDED', 'Blocks': []}]
+    assert calls == [('get_document_analysis', {'JobId': 'job-0'})]
+    assert checks == []